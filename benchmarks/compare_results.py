@@ -0,0 +1,51 @@
+import sys
+import json
+import argparse
+
+
+def collect_metrics(results: dict) -> dict:
+	"""
+	Flattens benchmark results into comparable metrics, all of them higher is better.
+
+	:param results: dict, results written by run_benchmarks.py.
+	:returns: dict, metric name to value.
+	"""
+	metrics = {}
+	for result in results.get('ingestion', []):
+		metrics[f"process_text {result['layout']} {result['pages']} pages (pages/s)"] = result['pages_per_second']
+	for result in results.get('extraction', []):
+		name = f"get_extracted_data {result['mode']}" + (f" x{result['max_concurrency']}" if result['max_concurrency'] else "")
+		metrics[f"{name} (calls/s)"] = 1 / result['seconds']['median']
+	for result in results.get('storage', []):
+		metrics[f"{result['storer']} (rows/s)"] = result['rows_per_second']
+
+	return metrics
+
+
+def main():
+	"""
+	Compares two benchmark result files and reports the metrics that regressed beyond a threshold.
+	"""
+	parser = argparse.ArgumentParser(description="Compares the results of two benchmark runs.")
+	parser.add_argument('baseline', help="Results of the reference commit.")
+	parser.add_argument('current', help="Results of the commit under test.")
+	parser.add_argument('--threshold', type=float, default=0.1, help="Relative slowdown reported as a regression.")
+	args = parser.parse_args()
+
+	with open(args.baseline) as f:
+		baseline = collect_metrics(json.load(f))
+	with open(args.current) as f:
+		current = collect_metrics(json.load(f))
+
+	regressions = 0
+	for name in sorted(baseline.keys() & current.keys()):
+		change = current[name] / baseline[name] - 1
+		regressed = change < -args.threshold
+		regressions += regressed
+		print(f"{'REGRESSION ' if regressed else ''}{name}: {baseline[name]:.2f} -> {current[name]:.2f} ({change:+.1%})")
+
+	sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,148 @@
+import os
+import gzip
+import fitz
+import time
+import random
+import threading
+from unittest.mock import MagicMock
+from google.cloud.bigquery import DatasetReference, Table
+
+
+# Words used to fill the generated papers
+WORDS = (
+	"model data results method analysis network learning performance training dataset approach "
+	"proposed experiments accuracy evaluation baseline feature structure sample system error "
+	"parameter distribution signal process measurement theory observed significant increase"
+).split()
+
+
+def make_sentence(generator: random.Random, words: int = 14) -> str:
+	"""
+	Builds a random sentence.
+
+	:param generator: random.Random, generator of the words.
+	:param words: int, number of words of the sentence.
+	:returns: str, sentence ending with a period.
+	"""
+	sentence = " ".join(generator.choice(WORDS) for _ in range(words))
+	return sentence[0].upper() + sentence[1:] + "."
+
+
+def generate_pdf(file_path: str, pages: int, layout: str = 'prose', seed: int = 0) -> str:
+	"""
+	Generates a research paper like PDF file.
+
+	:param file_path: str, path of the PDF file to write.
+	:param pages: int, number of pages.
+	:param layout: str, 'prose' for paragraphs only, or 'lists' for pages mostly made of numbered
+		and bulleted list items wrapping over several lines, some of them continuing on the next page.
+	:param seed: int, seed of the generated text.
+	:returns: str, path of the PDF file.
+	"""
+	generator = random.Random(seed)
+	pdf = fitz.open()
+	lines_per_page = 52
+
+	for page_number in range(pages):
+		page = pdf.new_page()
+		if page_number == 0:
+			page.insert_text((72, 60), "A Generated Paper For Benchmarking", fontsize=16, fontname='hebo')
+
+		lines, item_number = [], 1
+		while len(lines) < lines_per_page:
+			if layout == 'lists' and generator.random() < 0.8:
+				marker = f"{item_number}." if generator.random() < 0.5 else "-"
+				item_number += 1
+				lines.append(f"{marker} {make_sentence(generator, 8)}")
+				# Continuation lines of the item, the last item of a page continues on the next one
+				lines.extend("   " + make_sentence(generator, 9) for _ in range(generator.randint(1, 3)))
+			else:
+				lines.append(make_sentence(generator))
+
+		# Inserting the whole page at once is much faster than line by line
+		page.insert_text((72, 90), lines[:lines_per_page], fontsize=10, lineheight=1.25)
+
+	pdf.save(file_path)
+	pdf.close()
+
+	return file_path
+
+
+class FakeBigQueryClient:
+	"""
+	In-memory stand-in for the BigQuery client, accepting every row without network access.
+	"""
+
+	def __init__(self, project: str = 'benchmark_project', insert_latency: float = 0.0, load_latency: float = 0.0) -> None:
+		"""
+		Initializes the fake client.
+
+		:param project: str, Google Cloud project ID.
+		:param insert_latency: float, seconds each insert request takes, simulating the network round trip.
+		:param load_latency: float, seconds each load job takes, whatever its size.
+		"""
+		self.project = project
+		self.insert_latency = insert_latency
+		self.load_latency = load_latency
+		self.rows = []
+		self.insert_requests = 0
+		self.load_jobs = 0
+		self.tables = {}
+		self.lock = threading.Lock()
+
+
+	def dataset(self, dataset_id: str) -> DatasetReference:
+		return DatasetReference(self.project, dataset_id)
+
+
+	def create_table(self, table, exists_ok: bool = False):
+		with self.lock:
+			self.tables.setdefault(table.table_id, table)
+		return table
+
+
+	def get_table(self, table_ref) -> Table:
+		return self.tables[table_ref.table_id]
+
+
+	def insert_rows_json(self, table, rows: list) -> list:
+		if self.insert_latency:
+			time.sleep(self.insert_latency)
+
+		with self.lock:
+			self.rows.extend(rows)
+			self.insert_requests += 1
+
+		return []
+
+
+	def load_table_from_file(self, file_obj, destination, rewind: bool = False, job_config=None) -> MagicMock:
+		if rewind:
+			file_obj.seek(0)
+		rows = gzip.decompress(file_obj.read()).splitlines()
+		if self.load_latency:
+			time.sleep(self.load_latency)
+
+		with self.lock:
+			self.rows.extend(rows)
+			self.load_jobs += 1
+
+		return MagicMock(job_id=f"job_{self.load_jobs}", errors=None)
+
+
+def generate_corpus(directory: str, page_counts: tuple, layouts: tuple = ('prose', 'lists')) -> dict:
+	"""
+	Generates one PDF file per page count and layout.
+
+	:param directory: str, directory where the files are written.
+	:param page_counts: tuple of int, number of pages of each file.
+	:param layouts: tuple of str, layouts of the files.
+	:returns: dict, (layout, pages) to path of the PDF file.
+	"""
+	corpus = {}
+	for layout in layouts:
+		for pages in page_counts:
+			file_path = os.path.join(directory, f"{layout}_{pages}.pdf")
+			corpus[(layout, pages)] = generate_pdf(file_path, pages, layout=layout, seed=pages)
+
+	return corpus
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.data_storer import DataStorer, BufferedDataStorer, BackfillDataStorer
+from src.document_ingestor import DocumentIngestor
+from src.information_extractor import InformationExtractor
+from src.llm_backends import SyntheticLLM
+from fixtures import FakeBigQueryClient, generate_corpus, generate_pdf
+
+
+def summarize(samples: list) -> dict:
+	"""
+	Summarizes the timings of repeated runs.
+
+	:param samples: list of float, duration of each run in seconds.
+	:returns: dict, mean, median, 95th percentile, minimum and maximum in seconds.
+	"""
+	ordered = sorted(samples)
+	return {
+		'runs': len(ordered),
+		'mean': statistics.mean(ordered),
+		'median': statistics.median(ordered),
+		'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+		'min': ordered[0],
+		'max': ordered[-1]
+	}
+
+
+def benchmark_ingestion(corpus: dict, repeat: int) -> list:
+	"""
+	Measures the throughput of DocumentIngestor.process_text on every generated PDF.
+
+	:param corpus: dict, (layout, pages) to path of the PDF file.
+	:param repeat: int, number of runs per file.
+	:returns: list of dict, results per file.
+	"""
+	results = []
+	for (layout, pages), file_path in sorted(corpus.items()):
+		samples, characters = [], 0
+		for _ in range(repeat):
+			start = time.perf_counter()
+			characters = len(DocumentIngestor(file_path).process_text())
+			samples.append(time.perf_counter() - start)
+
+		timings = summarize(samples)
+		results.append({
+			'layout': layout,
+			'pages': pages,
+			'characters': characters,
+			'seconds': timings,
+			'pages_per_second': pages / timings['median'],
+			'characters_per_second': characters / timings['median']
+		})
+		logging.info(f"process_text {layout} {pages} pages: {results[-1]['pages_per_second']:.1f} pages/s")
+
+	return results
+
+
+def benchmark_extraction(raw_text: str, repeat: int, latency: float, concurrency_levels: tuple) -> list:
+	"""
+	Measures the latency of get_extracted_data, and of its concurrent version, against a synthetic LLM.
+
+	:param raw_text: str, text of the paper to extract.
+	:param repeat: int, number of runs per mode.
+	:param latency: float, latency in seconds of each synthetic LLM call.
+	:param concurrency_levels: tuple of int, concurrency limits of the asynchronous runs.
+	:returns: list of dict, results per mode.
+	"""
+	results = []
+	modes = [('sequential', None), ('combined', None)] + [('concurrent', level) for level in concurrency_levels]
+
+	for mode, concurrency in modes:
+		samples = []
+		for run in range(repeat):
+			# A new seed per run keeps every prompt a first call, so all runs draw the same latency
+			extractor = InformationExtractor(raw_text, None, llm=SyntheticLLM(latency_mean=latency, seed=run))
+			start = time.perf_counter()
+			if mode == 'concurrent':
+				asyncio.run(extractor.aget_extracted_data(max_concurrency=concurrency))
+			else:
+				extractor.get_extracted_data(combined=mode == 'combined')
+			samples.append(time.perf_counter() - start)
+
+		results.append({'mode': mode, 'max_concurrency': concurrency, 'llm_latency': latency, 'seconds': summarize(samples)})
+		logging.info(f"get_extracted_data {mode} {concurrency or ''}: {results[-1]['seconds']['median'] * 1000:.1f} ms")
+
+	return results
+
+
+def benchmark_storage(rows: int, repeat: int, insert_latency: float, load_latency: float) -> list:
+	"""
+	Measures the rows per second of DataStorer, BufferedDataStorer and BackfillDataStorer against a fake BigQuery client.
+
+	:param rows: int, number of rows stored per run.
+	:param repeat: int, number of runs per storer.
+	:param insert_latency: float, seconds each insert request takes.
+	:param load_latency: float, seconds each load job takes.
+	:returns: list of dict, results per storer.
+	"""
+	extracted_data = {
+		'utc_timestamp': '2025/01/01 00:00:00',
+		'title': "Title",
+		'authors': "Jane Doe",
+		'publication_date': '2024/01/01',
+		'abstract': "Abstract " * 50,
+		'findings': "Findings " * 50,
+		'methodology': "Methodology " * 50,
+		'summary': "Summary " * 50,
+		'keywords': ['keyword1', 'keyword2']
+	}
+
+	results = []
+	for name in ('DataStorer', 'BufferedDataStorer', 'BackfillDataStorer'):
+		samples, requests, load_jobs = [], 0, 0
+		for _ in range(repeat):
+			client = FakeBigQueryClient(insert_latency=insert_latency, load_latency=load_latency)
+			if name == 'DataStorer':
+				storer = DataStorer('benchmark_project', 'benchmark_dataset', 'benchmark_table', client=client)
+			elif name == 'BufferedDataStorer':
+				storer = BufferedDataStorer('benchmark_project', 'benchmark_dataset', 'benchmark_table', client=client)
+			else:
+				storer = BackfillDataStorer('benchmark_project', 'benchmark_dataset', 'benchmark_table', client=client)
+
+			start = time.perf_counter()
+			for _ in range(rows):
+				storer.store_data(extracted_data)
+			storer.close()
+			samples.append(time.perf_counter() - start)
+			requests, load_jobs = client.insert_requests, client.load_jobs
+
+		timings = summarize(samples)
+		results.append({
+			'storer': name,
+			'rows': rows,
+			'insert_requests': requests,
+			'load_jobs': load_jobs,
+			'insert_latency': insert_latency,
+			'load_latency': load_latency,
+			'seconds': timings,
+			'rows_per_second': rows / timings['median']
+		})
+		logging.info(f"{name}: {results[-1]['rows_per_second']:.0f} rows/s")
+
+	return results
+
+
+def get_commit() -> str:
+	"""
+	Returns the commit of the benchmarked code.
+
+	:returns: str, hash of the current commit, or None outside a git repository.
+	"""
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__))
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def main():
+	"""
+	Runs the benchmarks and writes their results as JSON.
+	"""
+	parser = argparse.ArgumentParser(description="Benchmarks the ingestion, extraction and storage stages of the pipeline.")
+	parser.add_argument('--output', default='benchmark_results.json', help="JSON file where results are written.")
+	parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000], help="Page counts of the generated PDFs.")
+	parser.add_argument('--repeat', type=int, default=3, help="Number of runs of each measurement.")
+	parser.add_argument('--llm-latency', type=float, default=0.05, help="Latency in seconds of each synthetic LLM call.")
+	parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 8], help="Concurrency limits of the asynchronous extraction.")
+	parser.add_argument('--rows', type=int, default=1000, help="Number of rows stored per run.")
+	parser.add_argument('--insert-latency', type=float, default=0.005, help="Latency in seconds of each fake BigQuery insert request.")
+	parser.add_argument('--load-latency', type=float, default=0.5, help="Latency in seconds of each fake BigQuery load job.")
+	args = parser.parse_args()
+
+	logging.basicConfig(level=logging.INFO)
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		corpus = generate_corpus(temp_dir, tuple(args.pages))
+		ingestion = benchmark_ingestion(corpus, args.repeat)
+
+		raw_text = DocumentIngestor(generate_pdf(os.path.join(temp_dir, 'paper.pdf'), 10)).process_text()
+		extraction = benchmark_extraction(raw_text, args.repeat, args.llm_latency, tuple(args.concurrency))
+
+	storage = benchmark_storage(args.rows, args.repeat, args.insert_latency, args.load_latency)
+
+	results = {
+		'commit': get_commit(),
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'cpu_count': os.cpu_count(),
+		'arguments': vars(args),
+		'ingestion': ingestion,
+		'extraction': extraction,
+		'storage': storage
+	}
+
+	with open(args.output, 'w') as f:
+		json.dump(results, f, indent=2)
+	logging.info(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+	main()
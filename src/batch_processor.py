@@ -0,0 +1,297 @@
+import os
+import glob
+import time
+import logging
+from typing import TYPE_CHECKING, List
+from concurrent.futures import ProcessPoolExecutor
+from src.document_ledger import DocumentLedger
+from src.document_ingestor import DocumentIngestor
+from src.streaming_pipeline import PipelineStage, StreamingPipeline
+
+# The flow pulls in the LLM and BigQuery stacks, only needed once documents are extracted
+if TYPE_CHECKING:
+	from src.text_processing_flow import TextProcessingFlow
+
+
+def ingest_file(file_path: str) -> dict:
+	"""
+	Extracts the text, section index and metadata of a PDF file. Defined at module level so it can be
+	sent to worker processes.
+
+	:param file_path: str, path to the PDF file.
+	:returns: dict, with 'pdf_content', 'sections' and 'metadata'.
+	"""
+	return DocumentIngestor(file_path).ingest()
+
+
+class BatchProcessor:
+	"""
+	Processes many research papers at once, streaming them through three stages connected by bounded
+	queues. Text extraction, which is CPU-bound, runs in a pool of processes, while information extraction
+	and storage, which are I/O-bound, run in their own threads. Every stage works on different papers at the
+	same time, and a full queue pauses the stage feeding it, so that fast PDF parsing does not pile up text
+	in memory while the LLM is the bottleneck.
+	"""
+
+	def __init__(
+		self,
+		text_processing_flow: 'TextProcessingFlow',
+		ingest_workers: int = None,
+		io_workers: int = 4,
+		ledger: DocumentLedger = None,
+		extract_workers: int = None,
+		store_workers: int = None,
+		queue_size: int = 8
+	) -> None:
+		"""
+		Initializes the batch processor.
+
+		:param text_processing_flow: TextProcessingFlow, flow used to extract and store each document.
+		:param ingest_workers: int, number of processes extracting text from PDFs, defaults to the number of CPUs.
+		:param io_workers: int, number of threads of the LLM and storage stages when not given individually.
+		:param ledger: DocumentLedger, optional record of processed documents, only new or changed ones are processed.
+		:param extract_workers: int, number of threads running the LLM stage, defaults to io_workers.
+		:param store_workers: int, number of threads running the storage stage, defaults to io_workers.
+		:param queue_size: int, maximum number of documents waiting in front of each stage.
+		"""
+		self.text_processing_flow = text_processing_flow
+		self.ingest_workers = ingest_workers or os.cpu_count() or 1
+		self.io_workers = io_workers
+		self.extract_workers = extract_workers or io_workers
+		self.store_workers = store_workers or io_workers
+		self.queue_size = queue_size
+		self.ledger = ledger
+
+		# Pool of the ingestion stage, only open during a run
+		self.ingest_pool = None
+
+
+	@staticmethod
+	def collect_files(source: str) -> List[str]:
+		"""
+		Lists the PDF files to be processed from a directory, a glob pattern or a manifest file
+		containing one path per line.
+
+		:param source: str, directory, glob pattern or manifest file.
+		:returns: list of str, paths to the PDF files.
+		"""
+		if os.path.isdir(source):
+			file_paths = glob.glob(os.path.join(source, '**', '*.pdf'), recursive=True)
+
+		elif os.path.isfile(source) and not source.endswith('.pdf'):
+			base_dir = os.path.dirname(os.path.abspath(source))
+			with open(source) as f:
+				lines = [line.strip() for line in f]
+			file_paths = [
+				os.path.join(base_dir, line) for line in lines
+				if line and not line.startswith('#')
+			]
+
+		else:
+			file_paths = glob.glob(source, recursive=True)
+
+		return sorted(path for path in file_paths if path.endswith('.pdf'))
+
+
+	def ingest_document(self, document: dict) -> dict:
+		"""
+		Pipeline stage extracting the text of a document in a worker process, then starting its workflow
+		up to the extraction.
+
+		:param document: dict, with the 'file_path' of the document and its 'content_hash' if already computed.
+		:returns: dict, document as described by TextProcessingFlow.get_document, with a 'skipped' reason when
+			the workflow needs no extraction nor storage.
+		"""
+		try:
+			ingested = self.ingest_pool.submit(ingest_file, document['file_path']).result()
+		except Exception as e:
+			raise RuntimeError(f"Failed to process text from PDF file: {e}") from e
+
+		document = self.text_processing_flow.start_document(document['file_path'], content_hash=document.get('content_hash'), **ingested)
+
+		# Documents already stored, or reusing the data of a near-duplicate, finish before their extraction
+		if not document['next'] and document['values'].get('stored'):
+			duplicate_of = document['values'].get('duplicate_of')
+			document['skipped'] = f"near-duplicate of {duplicate_of}" if duplicate_of else "already stored"
+
+		return document
+
+
+	def extract_document(self, document: dict) -> dict:
+		"""
+		Pipeline stage running the workflow of a document up to its storage, documents resumed after
+		their extraction are passed on.
+
+		:param document: dict, document as described by TextProcessingFlow.get_document.
+		:returns: dict, document waiting before its storage, or finished.
+		"""
+		while document['next'] and 'store_information' not in document['next']:
+			document = self.text_processing_flow.resume_document(document)
+
+		return document
+
+
+	def store_document(self, document: dict) -> dict:
+		"""
+		Pipeline stage running the workflow of a document to its end.
+
+		:param document: dict, document as described by TextProcessingFlow.get_document.
+		:returns: dict, finished document.
+		"""
+		while document['next']:
+			document = self.text_processing_flow.resume_document(document)
+
+		return document
+
+
+	@staticmethod
+	def get_outcome(file_path: str, final_state: dict) -> dict:
+		"""
+		Tells whether a document went through the whole workflow.
+
+		:param file_path: str, path to the PDF file.
+		:param final_state: dict, final state of the workflow of the document.
+		:returns: dict, outcome of the document.
+		"""
+		from src.information_extractor import ExtractionFailure
+
+		failures = ExtractionFailure.find(final_state.get('extracted_data'))
+		if failures:
+			return {'file_path': file_path, 'status': 'failed', 'error': '; '.join(str(failure) for failure in failures)}
+		if not final_state.get('extracted_data'):
+			return {'file_path': file_path, 'status': 'failed', 'error': "Failed to extract data from text"}
+		if not final_state.get('stored'):
+			return {'file_path': file_path, 'status': 'failed', 'error': "Failed to store data in BigQuery"}
+
+		return {'file_path': file_path, 'status': 'succeeded', 'error': None}
+
+
+	def flush_rows(self, results: list, configs: dict) -> None:
+		"""
+		Flushes the rows buffered by the storer, then fails the documents whose rows were rejected by the
+		table, during the run or by this flush, or could not be inserted because the flush failed. Their
+		workflow is marked as not stored, so that reruns store their data again.
+
+		:param results: list of dict, outcome of each document, updated in place.
+		:param configs: dict, path to the PDF file to the configuration of the workflow of its document.
+		"""
+		data_storer = self.text_processing_flow.data_storer
+		if data_storer is None or not hasattr(data_storer, 'flush'):
+			return
+
+		errors = {}
+		try:
+			data_storer.flush()
+		except Exception as e:
+			logging.error(f"Failed to flush buffered rows: {e}")
+			errors.update((key, f"Failed to store data in BigQuery: {e}") for key in data_storer.get_pending_keys())
+
+		for rejected_row in data_storer.take_rejected_rows():
+			reasons = '; '.join(error.get('message', '') for error in rejected_row.get('errors', []))
+			errors.setdefault(rejected_row.get('key'), f"BigQuery rejected the extracted data: {reasons}")
+
+		for result in results:
+			if result['status'] == 'succeeded' and result['file_path'] in errors:
+				result.update(status='failed', error=errors[result['file_path']])
+				try:
+					self.text_processing_flow.mark_not_stored(configs[result['file_path']])
+				except Exception as e:
+					logging.error(f"Failed to reset the checkpoint of {result['file_path']}: {e}")
+
+
+	def run(self, source: str) -> dict:
+		"""
+		Processes every PDF file found in the source.
+
+		:param source: str, directory, glob pattern or manifest file.
+		:returns: dict, report with the outcome of each document and the total throughput. Documents skipped by the
+			ledger, already stored or reusing the data of a near-duplicate are counted as skipped, not as succeeded.
+		"""
+		file_paths = self.collect_files(source)
+		logging.info(f"Found {len(file_paths)} PDF files.")
+
+		# Leave out the documents already processed according to the ledger
+		content_hashes = {}
+		if self.ledger is not None:
+			pending_file_paths = []
+			for file_path in file_paths:
+				needs_processing, content_hashes[file_path] = self.ledger.needs_processing(file_path)
+				if needs_processing:
+					pending_file_paths.append(file_path)
+			skipped = len(file_paths) - len(pending_file_paths)
+			file_paths = pending_file_paths
+			logging.info(f"Skipping {skipped} PDF files already processed, {len(file_paths)} left to process.")
+		else:
+			skipped = 0
+
+		results = []
+		configs = {}
+		start_time = time.perf_counter()
+
+		stages = [
+			PipelineStage('ingest', self.ingest_document, workers=self.ingest_workers),
+			PipelineStage('extract', self.extract_document, workers=self.extract_workers),
+			PipelineStage('store', self.store_document, workers=self.store_workers)
+		]
+		# Documents already stored or reusing the data of a near-duplicate are finished before the last stage
+		pipeline = StreamingPipeline(stages, queue_size=self.queue_size, is_finished=lambda document: not document['next'])
+
+		self.ingest_pool = ProcessPoolExecutor(max_workers=self.ingest_workers)
+		try:
+			# The content hashes computed by the ledger identify the documents without reading them again
+			items = ({'file_path': file_path, 'content_hash': content_hashes.get(file_path)} for file_path in file_paths)
+			for document, error in pipeline.run(items):
+				if error is not None:
+					results.append({'file_path': document['file_path'], 'status': 'failed', 'error': str(error)})
+				elif document.get('skipped'):
+					results.append({'file_path': document['file_path'], 'status': 'skipped', 'error': None, 'reason': document['skipped']})
+				else:
+					results.append(self.get_outcome(document['file_path'], document['values']))
+					configs[document['file_path']] = document['config']
+
+				# Log the timings and token usage of the document as a JSON line and free its state
+				self.text_processing_flow.finish_document(document['file_path'], document.get('config'))
+		finally:
+			self.ingest_pool.shutdown()
+			self.ingest_pool = None
+
+		# Make sure buffered rows reach the table before recording documents as stored
+		self.flush_rows(results, configs)
+
+		elapsed_seconds = time.perf_counter() - start_time
+		stage_stats = {stage.name: stage.get_stats(elapsed_seconds) for stage in stages}
+
+		for result in results:
+			if result['status'] == 'succeeded':
+				logging.info(f"Processed {result['file_path']}")
+			elif result['status'] == 'skipped':
+				logging.info(f"Skipped {result['file_path']}, {result['reason']}")
+			else:
+				logging.error(f"Failed to process {result['file_path']}: {result['error']}")
+
+			if self.ledger is not None:
+				status = 'failed' if result['status'] == 'failed' else 'stored'
+				self.ledger.record(result['file_path'], content_hashes.get(result['file_path']), status)
+
+		# Documents skipped by the ledger or by the workflow are not counted in the throughput
+		succeeded = sum(result['status'] == 'succeeded' for result in results)
+		failed = sum(result['status'] == 'failed' for result in results)
+		skipped += len(results) - succeeded - failed
+		report = {
+			'results': sorted(results, key=lambda result: result['file_path']),
+			'succeeded': succeeded,
+			'failed': failed,
+			'skipped': skipped,
+			'elapsed_seconds': elapsed_seconds,
+			'papers_per_second': (succeeded + failed) / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+			'stages': stage_stats,
+			# Time the storer spent inserting buffered rows, which the store stage only buffers
+			'flush_seconds': getattr(self.text_processing_flow.data_storer, 'flush_seconds', None)
+		}
+		logging.info(
+			f"Processed {succeeded + failed} papers in {elapsed_seconds:.2f}s "
+			f"({report['papers_per_second']:.2f} papers/s): {succeeded} succeeded, {failed} failed, {skipped} skipped."
+		)
+		logging.info("Stage utilization: " + ", ".join(f"{name} {stats['utilization']:.0%}" for name, stats in stage_stats.items()))
+
+		return report
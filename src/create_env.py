@@ -1,36 +1,57 @@
-import os
-import json
-import configparser
-
-def load_config() -> None:
-	"""
-	Loads configuration settings from config.ini..
-	Sets the required environment variables for the application.
-	"""
-	#---------------------------
-	# Config Parser
-	#---------------------------
-	config = configparser.ConfigParser()
-	conf = config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
-	assert len(conf) != 0, 'Config file not found'
-
-	#---------------------------
-	# Credentials
-	#---------------------------
-	os.environ['OPENAI_API_KEY'] = config.get('CREDENTIALS', 'OPENAI_API_KEY')
-	os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.path.abspath(config.get('CREDENTIALS', 'GOOGLE_APPLICATION_CREDENTIALS'))
-
-
-	#---------------------------
-	# Dataset
-	#---------------------------
-	os.environ['FILE_PATH'] = os.path.abspath(config.get('DATASET', 'FILE_PATH'))
-
-	#---------------------------
-	# Storage
-	#---------------------------
-	with open(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')) as f:
-		os.environ['PROJECT_ID'] = json.load(f)['project_id']
-
-	os.environ['DATASET_ID'] = config.get('STORAGE', 'DATASET_ID')
-	os.environ['TABLE_ID'] = config.get('STORAGE', 'TABLE_ID')
+import os
+import json
+import configparser
+
+def load_config() -> None:
+	"""
+	Loads configuration settings from config.ini..
+	Sets the required environment variables for the application.
+	"""
+	#---------------------------
+	# Config Parser
+	#---------------------------
+	config = configparser.ConfigParser()
+	conf = config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
+	assert len(conf) != 0, 'Config file not found'
+
+	#---------------------------
+	# Credentials
+	#---------------------------
+	os.environ['OPENAI_API_KEY'] = config.get('CREDENTIALS', 'OPENAI_API_KEY')
+	os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.path.abspath(config.get('CREDENTIALS', 'GOOGLE_APPLICATION_CREDENTIALS'))
+
+
+	#---------------------------
+	# Dataset
+	#---------------------------
+	os.environ['FILE_PATH'] = os.path.abspath(config.get('DATASET', 'FILE_PATH'))
+
+	#---------------------------
+	# Storage
+	#---------------------------
+	with open(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')) as f:
+		os.environ['PROJECT_ID'] = json.load(f)['project_id']
+
+	os.environ['DATASET_ID'] = config.get('STORAGE', 'DATASET_ID')
+	os.environ['TABLE_ID'] = config.get('STORAGE', 'TABLE_ID')
+
+	# Local sinks are optional, BigQuery is used by default
+	if config.has_option('STORAGE', 'BACKEND'):
+		os.environ['STORAGE_BACKEND'] = config.get('STORAGE', 'BACKEND')
+	if config.has_option('STORAGE', 'OUTPUT_PATH'):
+		os.environ['STORAGE_OUTPUT_PATH'] = os.path.abspath(config.get('STORAGE', 'OUTPUT_PATH'))
+
+	#---------------------------
+	# Pipeline (optional)
+	#---------------------------
+	for option in ('CHECKPOINT_PATH', 'LEDGER_PATH', 'METRICS_PATH', 'CACHE_PATH', 'LLM_CASSETTE_PATH', 'DEDUP_PATH', 'SEARCH_INDEX_PATH', 'EMBEDDING_INDEX_PATH'):
+		if config.has_option('PIPELINE', option):
+			os.environ[option] = os.path.abspath(config.get('PIPELINE', option))
+
+	for option in (
+		'COMBINED_EXTRACTION', 'EXTRACTION_CONCURRENCY', 'CACHE_MAX_ENTRIES', 'CACHE_TTL_SECONDS', 'CHUNK_TOKENS',
+		'METADATA_THRESHOLD', 'PAGE_WORKERS', 'REQUESTS_PER_MINUTE', 'TOKENS_PER_MINUTE', 'LLM_BACKEND', 'DEDUP_THRESHOLD',
+		'INGEST_WORKERS', 'EXTRACT_WORKERS', 'STORE_WORKERS', 'QUEUE_SIZE'
+	):
+		if config.has_option('PIPELINE', option):
+			os.environ[option] = config.get('PIPELINE', option)
@@ -1,71 +1,585 @@
-from typing import List
-from google.cloud.bigquery import Client, SchemaField, Table
-
-class DataStorer:
-	"""
-	Loads extracted data into a BigQuery table.
-	"""
-
-	def __init__(self, project_id: str, dataset_id: str, table_id: str) -> None:
-		"""
-		Initializes the DataStorage with BigQuery configurations.
-
-		:param: project_id: str, Google Cloud project ID.
-		:param: dataset_id: str, BigQuery dataset ID.
-		:param: table_id: str, BigQuery table ID.
-		"""
-		self.project_id = project_id
-		self.dataset_id = dataset_id
-		self.table_id = table_id
-		self.client = Client()
-
-
-	def create_schema(self) -> List:
-		"""
-		Creates a schema for the BigQuery table.
-
-		:returns: list of SchemaField objects defining the table schema.
-		"""
-		schema = [
-			SchemaField('utc_timestamp', 'TIMESTAMP'),
-			SchemaField('title', 'STRING'),
-			SchemaField('authors', 'STRING'),
-			SchemaField('publication_date', 'DATETIME'),
-			SchemaField('abstract', 'STRING'),
-			SchemaField('findings', 'STRING'),
-			SchemaField('methodology', 'STRING'),
-			SchemaField('summary', 'STRING'),
-			SchemaField('keywords', 'STRING', mode='REPEATED')
-		]
-
-		return schema
-
-
-	def store_data(self, extracted_data: dict) -> None:
-		"""
-		Stores extracted data into the BigQuery table.
-
-		:param: extracted_data: dict, extracted data to be stored into the table.
-		"""
-		table_ref = self.client.dataset(self.dataset_id).table(self.table_id)
-		table = Table(table_ref, schema=self.create_schema())
-		self.client.create_table(table, exists_ok=True)
-
-		rows_to_insert = [
-			{
-				u'utc_timestamp': extracted_data['utc_timestamp'],
-				u'title': extracted_data['title'],
-				u'authors': extracted_data['authors'],
-				u'publication_date': extracted_data['publication_date'],
-				u'abstract': extracted_data['abstract'],
-				u'findings': extracted_data['findings'],
-				u'methodology': extracted_data['methodology'],
-				u'summary': extracted_data['summary'],
-				u'keywords': extracted_data['keywords']
-			}
-		]
-
-		# Insert rows into the BigQuery table and handle potential errors
-		errors = self.client.insert_rows_json(table, rows_to_insert)
-		if errors:
-			print("Encountered errors while inserting rows: {}".format(errors))
+import gzip
+import json
+import time
+import atexit
+import logging
+import datetime
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import List
+from google.api_core.exceptions import GoogleAPICallError
+from google.cloud.bigquery import Client, LoadJobConfig, SchemaField, SourceFormat, Table, WriteDisposition
+from google.cloud.bigquery.format_options import ParquetOptions
+from src.extraction_result import ExtractionResult
+
+
+class StorageBackend(ABC):
+	"""
+	Interface of the sinks where extracted data is stored. Every backend stores rows following
+	the schema of create_schema and reports the rows it rejected.
+	"""
+
+	@staticmethod
+	def create_schema() -> List:
+		"""
+		Creates a schema for the BigQuery table.
+
+		:returns: list of SchemaField objects defining the table schema.
+		"""
+		schema = [
+			SchemaField('utc_timestamp', 'TIMESTAMP'),
+			SchemaField('title', 'STRING'),
+			SchemaField('authors', 'STRING'),
+			SchemaField('publication_date', 'DATETIME'),
+			SchemaField('date_precision', 'STRING'),
+			SchemaField('abstract', 'STRING'),
+			SchemaField('findings', 'STRING'),
+			SchemaField('methodology', 'STRING'),
+			SchemaField('summary', 'STRING'),
+			SchemaField('keywords', 'STRING', mode='REPEATED')
+		]
+
+		return schema
+
+
+	@classmethod
+	def build_row(cls, extracted_data: dict) -> dict:
+		"""
+		Builds the row to be inserted from the extracted data.
+
+		:param: extracted_data: dict, extracted data to be stored into the table.
+		:returns: dict, row matching the table schema.
+		"""
+		return {
+			u'utc_timestamp': extracted_data['utc_timestamp'],
+			u'title': extracted_data['title'],
+			u'authors': extracted_data['authors'],
+			u'publication_date': extracted_data['publication_date'],
+			u'date_precision': extracted_data.get('date_precision'),
+			u'abstract': extracted_data['abstract'],
+			u'findings': extracted_data['findings'],
+			u'methodology': extracted_data['methodology'],
+			u'summary': extracted_data['summary'],
+			u'keywords': extracted_data['keywords']
+		}
+
+
+	@classmethod
+	def convert_row(cls, row: dict) -> dict:
+		"""
+		Converts a row to the types of the schema, as BigQuery would.
+
+		:param row: dict, row built from the extracted data.
+		:returns: dict, row with timestamps and dates parsed and repeated fields as lists.
+		:raises ValueError: if a value does not match its type.
+		"""
+		converted = {}
+		for field in cls.create_schema():
+			value = row.get(field.name)
+
+			if value is None or value == "":
+				converted[field.name] = [] if field.mode == 'REPEATED' else None
+			elif field.mode == 'REPEATED':
+				# Parsed as the answers of the extraction are, so that both agree on separators and labels
+				converted[field.name] = ExtractionResult.parse_keywords(value)
+			elif field.field_type == 'TIMESTAMP':
+				converted[field.name] = datetime.datetime.strptime(value, "%Y/%m/%d %H:%M:%S").replace(tzinfo=datetime.timezone.utc)
+			elif field.field_type == 'DATETIME':
+				converted[field.name] = datetime.datetime.strptime(value, "%Y/%m/%d")
+			else:
+				converted[field.name] = str(value)
+
+		return converted
+
+
+	def validate_row(self, row: dict, key: str = None) -> List[dict]:
+		"""
+		Checks that a row matches the schema before it is sent, so that no request is spent on a row
+		the table would reject.
+
+		:param row: dict, row built from the extracted data.
+		:param key: str, optional identifier of the document of the row.
+		:returns: list of dict, the row with its error and key if it does not match the schema, empty otherwise.
+		"""
+		try:
+			self.convert_row(row)
+		except (TypeError, ValueError) as e:
+			logging.error(f"Failed to store row ('{row.get('title')}'): {e}")
+			return [{'row': row, 'errors': [{'reason': 'invalid', 'message': str(e)}], 'key': key}]
+
+		return []
+
+
+	def serialize_row(self, row: dict) -> dict:
+		"""
+		Converts a row to JSON values in the formats of BigQuery, such as ISO dates.
+
+		:param row: dict, row built from the extracted data.
+		:returns: dict, row ready to be inserted as JSON.
+		:raises ValueError: if a value does not match its type.
+		"""
+		return {
+			name: value.isoformat() if isinstance(value, datetime.date) else value
+			for name, value in self.convert_row(row).items()
+		}
+
+
+	@abstractmethod
+	def store_data(self, extracted_data: dict, key: str = None) -> List[dict]:
+		"""
+		Stores extracted data, possibly buffering it until the next flush.
+
+		:param: extracted_data: dict, extracted data to be stored.
+		:param: key: str, optional identifier of the document, such as its path, attached to its rejected rows.
+		:returns: list of dict, rejected rows of the document with their errors.
+		"""
+
+
+	def take_rejected_rows(self) -> List[dict]:
+		"""
+		Returns the rows rejected by the flushes since the last call, each one with the key of its
+		document, as a buffered row is only known to be rejected once it is written.
+
+		:returns: list of dict, rejected rows with their errors and keys.
+		"""
+		return []
+
+
+	def get_pending_keys(self) -> List[str]:
+		"""
+		Lists the keys of the documents whose rows are buffered and not written yet.
+
+		:returns: list of str, keys of the buffered rows.
+		"""
+		return []
+
+
+	def flush(self) -> List[dict]:
+		"""
+		Writes the buffered rows, if the backend buffers any.
+
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		return []
+
+
+	def close(self) -> List[dict]:
+		"""
+		Flushes the remaining rows and releases the resources of the backend.
+
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		return self.flush()
+
+
+	def __enter__(self) -> 'StorageBackend':
+		return self
+
+
+	def __exit__(self, exc_type, exc_value, traceback) -> None:
+		self.close()
+
+
+class DataStorer(StorageBackend):
+	"""
+	Loads extracted data into a BigQuery table.
+	"""
+
+	def __init__(self, project_id: str, dataset_id: str, table_id: str, client: Client = None) -> None:
+		"""
+		Initializes the DataStorage with BigQuery configurations.
+
+		:param: project_id: str, Google Cloud project ID.
+		:param: dataset_id: str, BigQuery dataset ID.
+		:param: table_id: str, BigQuery table ID.
+		:param: client: Client, optional BigQuery client shared with other storers, a new one is created when not given.
+		"""
+		self.project_id = project_id
+		self.dataset_id = dataset_id
+		self.table_id = table_id
+		self.client = client or Client()
+
+		# Table checked on the first insert, then reused for the lifetime of the storer
+		self.table = None
+
+
+	def get_table(self) -> Table:
+		"""
+		Creates the BigQuery table if it does not exist yet.
+
+		:returns: Table, table where the data is stored.
+		"""
+		table_ref = self.client.dataset(self.dataset_id).table(self.table_id)
+		table = Table(table_ref, schema=self.create_schema())
+		self.client.create_table(table, exists_ok=True)
+
+		return table
+
+
+	def report_errors(self, rows: List[dict], errors: List[dict]) -> List[dict]:
+		"""
+		Logs the errors returned by BigQuery for each rejected row.
+
+		:param: rows: list of dict, rows sent in the insert request.
+		:param: errors: list of dict, errors returned by BigQuery, each one with the index of its row.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		failed_rows = []
+		for error in errors:
+			row = rows[error['index']]
+			logging.error(f"Failed to insert row {error['index']} ('{row.get('title')}'): {error['errors']}")
+			failed_rows.append({'row': row, 'errors': error['errors']})
+
+		return failed_rows
+
+
+	def store_data(self, extracted_data: dict, key: str = None) -> List[dict]:
+		"""
+		Stores extracted data into the BigQuery table.
+
+		:param: extracted_data: dict, extracted data to be stored into the table.
+		:param: key: str, optional identifier of the document, such as its path, attached to its rejected rows.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		rows_to_insert = [self.build_row(extracted_data)]
+		failed_rows = self.validate_row(rows_to_insert[0], key=key)
+		if failed_rows:
+			return failed_rows
+
+		if self.table is None:
+			self.table = self.get_table()
+
+		# Insert rows into the BigQuery table and handle potential errors
+		errors = self.client.insert_rows_json(self.table, [self.serialize_row(row) for row in rows_to_insert])
+
+		return [{**failed_row, 'key': key} for failed_row in self.report_errors(rows_to_insert, errors)]
+
+
+class BufferedDataStorer(DataStorer):
+	"""
+	Loads extracted data into a BigQuery table in bulk. Rows are kept in memory and inserted
+	with a single request once a row count, size or time threshold is reached, and when closed.
+	The time threshold is also checked by a timer, so that the last rows of a run do not wait
+	for another row to be flushed.
+	"""
+
+	def __init__(self, project_id: str, dataset_id: str, table_id: str, max_rows: int = 500, max_bytes: int = 5_000_000, max_interval: float = 60.0, client: Client = None) -> None:
+		"""
+		Initializes the buffered writer with BigQuery configurations and flush thresholds.
+
+		:param: project_id: str, Google Cloud project ID.
+		:param: dataset_id: str, BigQuery dataset ID.
+		:param: table_id: str, BigQuery table ID.
+		:param: max_rows: int, number of buffered rows that triggers a flush.
+		:param: max_bytes: int, size in bytes of the buffered rows that triggers a flush.
+		:param: max_interval: float, seconds since the last flush after which a new row triggers a flush, and longest
+			time a row waits in the buffer.
+		:param: client: Client, optional BigQuery client shared with other storers, a new one is created when not given.
+		"""
+		super().__init__(project_id=project_id, dataset_id=dataset_id, table_id=table_id, client=client)
+		self.max_rows = max_rows
+		self.max_bytes = max_bytes
+		self.max_interval = max_interval
+
+		self.rows = []
+		self.buffer_bytes = 0
+		self.last_flush = time.monotonic()
+		self.lock = threading.RLock()
+
+		# Key of the document of each buffered row, and rows rejected by flushes until they are taken
+		self.row_keys = []
+		self.rejected_rows = []
+
+		# Time spent inserting the buffered rows, summed over every flush
+		self.flush_seconds = 0.0
+
+		# Timer flushing the buffer max_interval after its first row, started when a row enters an empty buffer
+		self.flush_timer = None
+
+		# Make sure buffered rows are not lost when the interpreter exits
+		atexit.register(self.close)
+
+
+	def store_data(self, extracted_data: dict, key: str = None) -> List[dict]:
+		"""
+		Adds extracted data to the buffer, flushing it if any threshold is reached. Rows of other
+		documents rejected by that flush are not returned, see take_rejected_rows.
+
+		:param: extracted_data: dict, extracted data to be stored into the table.
+		:param: key: str, optional identifier of the document, such as its path, attached to its rejected rows.
+		:returns: list of dict, the row of the document with its errors if it does not match the schema or was rejected by a flush.
+		"""
+		row = self.build_row(extracted_data)
+		failed_rows = self.validate_row(row, key=key)
+		if failed_rows:
+			return failed_rows
+
+		with self.lock:
+			self.rows.append(row)
+			self.row_keys.append(key)
+			self.buffer_bytes += len(json.dumps(row, default=str))
+			if self.flush_timer is None:
+				self.start_flush_timer()
+
+			if (
+				len(self.rows) >= self.max_rows
+				or self.buffer_bytes >= self.max_bytes
+				or time.monotonic() - self.last_flush >= self.max_interval
+			):
+				return [failed_row for failed_row in self.flush() if failed_row['row'] is row]
+
+		return []
+
+
+	def flush(self) -> List[dict]:
+		"""
+		Inserts every buffered row with a single request. Rejected rows are also kept until
+		taken by take_rejected_rows, so that each document learns the outcome of its own row.
+
+		:returns: list of dict, rejected rows with their errors and the keys of their documents.
+		"""
+		with self.lock:
+			if self.flush_timer is not None:
+				self.flush_timer.cancel()
+				self.flush_timer = None
+
+			if not self.rows:
+				return []
+
+			rows_to_insert, row_keys = self.rows, self.row_keys
+			self.rows, self.row_keys = [], []
+			self.buffer_bytes = 0
+			self.last_flush = time.monotonic()
+
+			start_time = time.perf_counter()
+			try:
+				if self.table is None:
+					self.table = self.get_table()
+				failed_rows = self.insert_rows(rows_to_insert)
+
+			except Exception:
+				# Keep the rows so that a later flush can retry them, at the latest after max_interval
+				self.rows = rows_to_insert + self.rows
+				self.row_keys = row_keys + self.row_keys
+				self.buffer_bytes = sum(len(json.dumps(row, default=str)) for row in self.rows)
+				if self.flush_timer is None:
+					self.start_flush_timer()
+				raise
+
+			finally:
+				self.flush_seconds += time.perf_counter() - start_time
+
+			# Rejected rows are the buffered row objects, which identify their documents
+			keys = {id(row): key for row, key in zip(rows_to_insert, row_keys)}
+			failed_rows = [{**failed_row, 'key': keys.get(id(failed_row['row']))} for failed_row in failed_rows]
+			self.rejected_rows.extend(failed_rows)
+
+		return failed_rows
+
+
+	def start_flush_timer(self) -> None:
+		"""
+		Schedules a flush of the buffer in max_interval seconds, run by a daemon thread.
+		"""
+		self.flush_timer = threading.Timer(self.max_interval, self.flush_on_timer)
+		self.flush_timer.daemon = True
+		self.flush_timer.start()
+
+
+	def flush_on_timer(self) -> None:
+		"""
+		Flushes the buffer when its timer expires. Rejected rows are kept for take_rejected_rows, and
+		rows that could not be inserted stay buffered for the next flush.
+		"""
+		with self.lock:
+			# A flush since the timer started cancelled it, the rows buffered since have their own timer
+			if self.flush_timer is not threading.current_thread():
+				return
+			self.flush_timer = None
+
+			try:
+				self.flush()
+			except Exception as e:
+				logging.error(f"Failed to flush buffered rows: {e}")
+
+
+	def take_rejected_rows(self) -> List[dict]:
+		with self.lock:
+			rejected_rows, self.rejected_rows = self.rejected_rows, []
+
+		return rejected_rows
+
+
+	def get_pending_keys(self) -> List[str]:
+		with self.lock:
+			return list(self.row_keys)
+
+
+	def insert_rows(self, rows: List[dict]) -> List[dict]:
+		"""
+		Inserts a batch of rows with a single streaming request.
+
+		:param: rows: list of dict, rows to be inserted.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		errors = self.client.insert_rows_json(self.table, [self.serialize_row(row) for row in rows])
+		logging.info(f"Inserted {len(rows) - len(errors)} of {len(rows)} rows into BigQuery.")
+
+		return self.report_errors(rows, errors)
+
+
+	def close(self) -> List[dict]:
+		"""
+		Flushes the remaining rows and stops the flush timer.
+
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		atexit.unregister(self.close)
+
+		return self.flush()
+
+
+class BackfillDataStorer(BufferedDataStorer):
+	"""
+	Loads extracted data into a BigQuery table for backfills of many papers. Large batches are
+	staged to a compressed newline delimited JSON or Parquet file and submitted as one load job,
+	which is free and faster than streaming them, while small batches are still streamed.
+	"""
+
+	def __init__(self, project_id: str, dataset_id: str, table_id: str, max_rows: int = 10000, max_bytes: int = 100_000_000, max_interval: float = 600.0, load_min_rows: int = 1000, staging_format: str = 'ndjson', staging_dir: str = None, client: Client = None) -> None:
+		"""
+		Initializes the backfill writer with BigQuery configurations, flush thresholds and staging options.
+
+		:param: project_id: str, Google Cloud project ID.
+		:param: dataset_id: str, BigQuery dataset ID.
+		:param: table_id: str, BigQuery table ID.
+		:param: max_rows: int, number of buffered rows that triggers a flush.
+		:param: max_bytes: int, size in bytes of the buffered rows that triggers a flush.
+		:param: max_interval: float, seconds since the last flush after which a new row triggers a flush.
+		:param: load_min_rows: int, smallest batch submitted as a load job, smaller ones are streamed.
+		:param: staging_format: str, 'ndjson' for gzip compressed newline delimited JSON, or 'parquet', which needs pyarrow.
+		:param: staging_dir: str, directory of the staged files, the system temporary directory when not given.
+		:param: client: Client, optional BigQuery client shared with other storers, a new one is created when not given.
+		"""
+		if staging_format not in ('ndjson', 'parquet'):
+			raise ValueError(f"Unknown staging format: {staging_format}")
+
+		super().__init__(project_id=project_id, dataset_id=dataset_id, table_id=table_id, max_rows=max_rows, max_bytes=max_bytes, max_interval=max_interval, client=client)
+		self.load_min_rows = load_min_rows
+		self.staging_format = staging_format
+		self.staging_dir = staging_dir
+
+
+	def get_table(self) -> Table:
+		"""
+		Creates the BigQuery table if it does not exist yet, and checks that its schema matches
+		the one of the rows, as a load job would otherwise fail for the whole batch.
+
+		:returns: Table, table where the data is stored.
+		:raises ValueError: if columns of the table are missing or have another type or mode.
+		"""
+		table_ref = super().get_table().reference
+		table = self.client.get_table(table_ref)
+
+		columns = {field.name: field for field in table.schema}
+		mismatches = []
+		for field in self.create_schema():
+			column = columns.get(field.name)
+			if column is None:
+				mismatches.append(f"{field.name} is missing")
+			elif (column.field_type, column.mode) != (field.field_type, field.mode):
+				mismatches.append(f"{field.name} is {column.mode} {column.field_type} instead of {field.mode} {field.field_type}")
+
+		if mismatches:
+			raise ValueError(f"Schema of table {self.dataset_id}.{self.table_id} does not match: {', '.join(mismatches)}")
+
+		return table
+
+
+	def insert_rows(self, rows: List[dict]) -> List[dict]:
+		"""
+		Streams a small batch of rows, or loads a large one with a load job.
+
+		:param: rows: list of dict, rows to be inserted.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		if len(rows) < self.load_min_rows:
+			return super().insert_rows(rows)
+
+		return self.load_rows(rows)
+
+
+	def load_rows(self, rows: List[dict]) -> List[dict]:
+		"""
+		Stages a batch of rows to a file and loads it into the table with one load job. Rows not
+		matching the schema are rejected before staging, the others are rejected together if the job fails.
+
+		:param: rows: list of dict, rows to be loaded.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		failed_rows, valid_rows, converted_rows = [], [], []
+		for row in rows:
+			try:
+				converted_rows.append(self.convert_row(row))
+				valid_rows.append(row)
+			except (TypeError, ValueError) as e:
+				logging.error(f"Failed to stage row ('{row.get('title')}'): {e}")
+				failed_rows.append({'row': row, 'errors': [{'reason': 'invalid', 'message': str(e)}]})
+
+		if not converted_rows:
+			return failed_rows
+
+		with tempfile.TemporaryFile(dir=self.staging_dir) as staged_file:
+			self.stage_rows(converted_rows, staged_file)
+			job = self.client.load_table_from_file(staged_file, self.table, rewind=True, job_config=self.create_job_config())
+
+		try:
+			job.result()
+		except GoogleAPICallError as e:
+			errors = job.errors or [{'reason': 'invalid', 'message': str(e)}]
+			logging.error(f"Load job {job.job_id} of {len(valid_rows)} rows failed: {errors}")
+			return failed_rows + [{'row': row, 'errors': errors} for row in valid_rows]
+
+		logging.info(f"Loaded {len(valid_rows)} of {len(rows)} rows into BigQuery with load job {job.job_id}.")
+
+		return failed_rows
+
+
+	def stage_rows(self, rows: List[dict], staged_file) -> None:
+		"""
+		Writes converted rows to the staged file in the staging format.
+
+		:param: rows: list of dict, rows converted to the types of the schema.
+		:param: staged_file: file object, binary file the rows are written to.
+		"""
+		if self.staging_format == 'parquet':
+			# Imported here as pyarrow is an optional dependency
+			import pyarrow
+			import pyarrow.parquet
+			from src.storage_backends import ParquetStorer
+
+			pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows, schema=ParquetStorer.create_arrow_schema()), staged_file)
+			return
+
+		with gzip.GzipFile(fileobj=staged_file, mode='wb') as compressed_file:
+			for row in rows:
+				compressed_file.write((json.dumps(row, default=lambda value: value.isoformat()) + "\n").encode('utf-8'))
+
+
+	def create_job_config(self) -> LoadJobConfig:
+		"""
+		Creates the configuration of the load jobs, appending the staged rows to the table.
+
+		:returns: LoadJobConfig, configuration of the load jobs.
+		"""
+		job_config = LoadJobConfig(write_disposition=WriteDisposition.WRITE_APPEND)
+		if self.staging_format == 'parquet':
+			job_config.source_format = SourceFormat.PARQUET
+			job_config.parquet_options = ParquetOptions()
+			job_config.parquet_options.enable_list_inference = True
+		else:
+			job_config.source_format = SourceFormat.NEWLINE_DELIMITED_JSON
+			job_config.schema = self.create_schema()
+
+		return job_config
@@ -1,68 +1,445 @@
-import re
-import fitz
-
-class DocumentIngestor:
-	"""
-	Class responsible for extracting text from PDF documents.
-	"""
-	def __init__(self, file_path: str) -> None:
-		"""
-		Initialize with the path to a PDF file.
-
-		:param file_path: str, path to the PDF file to be processed
-		"""
-		if file_path.endswith('.pdf'):
-			self.file_path = file_path
-		else:
-			raise ValueError("Provided file is not a PDF.")
-
-
-	def __process_lists(self, text: str) -> str:
-		"""
-		Processes text to ensure list items are combined with their accompanying content
-		on the same line. This function detects lines starting with a numbered pattern or a bullet point and appends
-		their content if the subsequent line is meant to continue the item.
-
-		:param: text: str, raw text containing numbered lists.
-		:returns: str, formatted text with numbered list items and content on a single line.
-		"""
-		lines = text.split('\n')
-		list_item_pattern = re.compile(r'^(?:\d+[\s)*\.\-•●]*|[*•●-]+|[○]+)')
-
-		combined_lines = []
-		i = 0
-		while i < len(lines):
-			line = lines[i].strip()
-			if list_item_pattern.match(line):
-				# If next line continues the content of a list item, combine them
-				while i + 1 < len(lines) and not list_item_pattern.match(lines[i + 1].strip()):
-					line += " " + lines[i + 1].strip()
-					i += 1
-			combined_lines.append(line)
-			i += 1
-		
-		# Ensure lines are separated properly
-		return "\n".join(combined_lines).strip()
-
-
-	def process_text(self) -> str:
-		"""
-		Processes text from each page of the PDF.
-
-		:return: str, string containing the processed text.
-		"""
-		try:
-			with fitz.open(self.file_path) as pdf:
-				text = ""
-
-				# Extract text from a page and join into one single string
-				for page_number in range(pdf.page_count):
-					page = pdf.load_page(page_number)
-					text += page.get_text('text')
-				
-			text = self.__process_lists(text)
-			
-			return text
-
-		except Exception as e:
-			raise Exception(f"Error while reading PDF file: {e}")
+import re
+import fitz
+import hashlib
+import logging
+from collections import Counter
+from typing import Iterable, Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+def read_page(page) -> tuple:
+	"""
+	Reads the raw text of a page together with the font of its lines, parsing the page only once.
+
+	:param page: fitz.Page, page of the PDF.
+	:returns: tuple, raw text of the page and its non-empty lines, each one a list of (text, size, flags) spans.
+	"""
+	textpage = page.get_textpage()
+	lines = []
+	for block in page.get_text('dict', textpage=textpage)['blocks']:
+		for line in block.get('lines', []):
+			spans = [(span['text'], span['size'], span['flags']) for span in line['spans'] if span['text'].strip()]
+			if spans:
+				lines.append(spans)
+
+	return page.get_text('text', textpage=textpage), lines
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[tuple]:
+	"""
+	Extracts the raw text and the lines of a range of pages. Defined at module level so it can be sent to
+	worker processes, each one opening the document itself since fitz documents cannot be shared.
+
+	:param file_path: str, path to the PDF file.
+	:param start: int, first page of the range.
+	:param end: int, page after the last page of the range.
+	:returns: list of tuple, raw text and lines of each page in the range, as returned by read_page.
+	"""
+	with fitz.open(file_path) as pdf:
+		return [read_page(pdf.load_page(page_number)) for page_number in range(start, end)]
+
+
+class DocumentIngestor:
+	"""
+	Class responsible for extracting text from PDF documents.
+	"""
+
+	# Confidence given to the bibliographic metadata found in each source
+	METADATA_CONFIDENCE = {
+		'xmp': 0.85,
+		'xmp_date': 0.9,
+		'info': 0.7,
+		'info_date': 0.4,
+		'first_page': 0.6
+	}
+
+	# Titles that PDF producers write as placeholders
+	PLACEHOLDER_TITLE_PATTERN = re.compile(r'^(?:untitled|microsoft word\b)|\.(?:docx?|tex|pdf|dvi)$', re.IGNORECASE)
+
+	# Lines starting a numbered or bulleted list item
+	LIST_ITEM_PATTERN = re.compile(r'^(?:\d+[\s)*\.\-•●]*|[*•●-]+|[○]+)')
+
+	# Marker passed along the stream of lines at the end of every page
+	PAGE_BREAK = None
+
+
+	def __init__(self, file_path: str, workers: int = 1, min_pages_per_worker: int = 50) -> None:
+		"""
+		Initialize with the path to a PDF file.
+
+		:param file_path: str, path to the PDF file to be processed
+		:param workers: int, number of processes extracting page text in parallel, 1 extracts pages sequentially
+		:param min_pages_per_worker: int, minimum number of pages given to each process, smaller documents use fewer processes
+		"""
+		if file_path.endswith('.pdf'):
+			self.file_path = file_path
+		else:
+			raise ValueError("Provided file is not a PDF.")
+
+		self.workers = workers
+		self.min_pages_per_worker = min_pages_per_worker
+
+		# Number of pages, lines of each page with their font, and information dictionary and XMP
+		# metadata, known once the text has been read
+		self.page_count = 0
+		self.page_lines = None
+		self.info = None
+		self.xmp = None
+
+
+	def get_content_hash(self) -> str:
+		"""
+		Computes the SHA-256 hash of the PDF file, identifying the document regardless of its path.
+
+		:returns: str, hexadecimal hash of the file content.
+		"""
+		digest = hashlib.sha256()
+		with open(self.file_path, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				digest.update(block)
+
+		return digest.hexdigest()
+
+
+	def __iter_pages(self) -> Iterator[str]:
+		"""
+		Reads the text of the PDF one page at a time. Large documents are split into page ranges
+		extracted by a pool of processes, whose results are yielded in page order.
+
+		The lines of each page and the metadata of the document are kept for detect_headings and
+		extract_metadata, so that the document is only opened and parsed once.
+
+		:returns: iterator of str, raw text of each page.
+		"""
+		self.page_lines = []
+		with fitz.open(self.file_path) as pdf:
+			page_count = pdf.page_count
+			self.page_count = page_count
+			self.info = pdf.metadata or {}
+			self.xmp = pdf.get_xml_metadata() or ''
+			workers = min(self.workers, page_count // self.min_pages_per_worker)
+
+			# Small documents are not worth the cost of starting processes
+			if workers <= 1:
+				for page_number in range(page_count):
+					page_text, lines = read_page(pdf.load_page(page_number))
+					self.page_lines.append(lines)
+					yield page_text
+				return
+
+		bounds = [page_count * i // workers for i in range(workers + 1)]
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			for pages in pool.map(extract_page_range, [self.file_path] * workers, bounds[:-1], bounds[1:]):
+				for page_text, lines in pages:
+					self.page_lines.append(lines)
+					yield page_text
+
+
+	def __iter_lines(self, pages: Iterable[str]) -> Iterator[str]:
+		"""
+		Splits the text of the pages into lines, joining lines cut across a page boundary.
+		A PAGE_BREAK marker follows the complete lines of each page.
+
+		:param: pages: iterable of str, raw text of each page.
+		:returns: iterator of str, lines of the document.
+		"""
+		partial = ""
+		for page_text in pages:
+			lines = page_text.split('\n')
+			lines[0] = partial + lines[0]
+			partial = lines.pop()
+			yield from lines
+			yield self.PAGE_BREAK
+
+		yield partial
+
+
+	def __process_lists(self, lines: Iterable[str]) -> Iterator[str]:
+		"""
+		Processes lines to ensure list items are combined with their accompanying content
+		on the same line. This function detects lines starting with a numbered pattern or a bullet point and appends
+		their content if the subsequent line is meant to continue the item. Lines are processed as a stream,
+		so list items continuing on the next page are combined as well.
+
+		:param: lines: iterable of str, raw lines containing numbered lists, with PAGE_BREAK markers.
+		:returns: iterator of str, lines with numbered list items and content on a single line, with PAGE_BREAK markers.
+		"""
+		pending = None
+		pending_is_item = False
+
+		for line in lines:
+			if line is self.PAGE_BREAK:
+				yield self.PAGE_BREAK
+				continue
+
+			line = line.strip()
+			is_item = self.LIST_ITEM_PATTERN.match(line) is not None
+
+			# If the line continues the content of a list item, combine them
+			if pending is not None and pending_is_item and not is_item:
+				pending.append(line)
+				continue
+
+			if pending is not None:
+				yield " ".join(pending)
+			pending, pending_is_item = [line], is_item
+
+		if pending is not None:
+			yield " ".join(pending)
+
+
+	def iter_processed_pages(self) -> Iterator[str]:
+		"""
+		Processes text from the PDF lazily, yielding the processed text as each page is read so that
+		later stages can start before the whole document is parsed. Joining every yielded piece gives
+		the processed text, except for the final stripping of surrounding whitespace. A list item
+		continuing on the next page is yielded with that page.
+
+		:returns: iterator of str, processed text of each page, followed by the text left after the last page.
+		"""
+		try:
+			is_first_line = True
+			piece = []
+			for line in self.__process_lists(self.__iter_lines(self.__iter_pages())):
+				if line is self.PAGE_BREAK:
+					yield "".join(piece)
+					piece = []
+					continue
+
+				# Ensure lines are separated properly
+				piece.append(line if is_first_line else "\n" + line)
+				is_first_line = False
+
+			yield "".join(piece)
+
+		except Exception as e:
+			raise Exception(f"Error while reading PDF file: {e}")
+
+
+	def process_text(self) -> str:
+		"""
+		Processes text from each page of the PDF.
+
+		:return: str, string containing the processed text.
+		"""
+		return "".join(self.iter_processed_pages()).strip()
+
+
+	def __normalize_heading(self, heading: str) -> str:
+		"""
+		Normalizes a heading into a section name, removing numbering and trailing punctuation.
+
+		:param: heading: str, heading as found in the document.
+		:returns: str, lowercase section name.
+		"""
+		heading = re.sub(r'^(?:\d+(?:\.\d+)*|[IVXLC]+)[.)]?\s+', '', heading.strip())
+		return re.sub(r'\s+', ' ', heading).strip(' .:').lower()
+
+
+	def __read_document(self) -> None:
+		"""
+		Reads the pages of the document unless its text has already been read, keeping its lines and metadata.
+		"""
+		if self.page_lines is None:
+			for _ in self.__iter_pages():
+				pass
+
+
+	def detect_headings(self) -> list:
+		"""
+		Detects section headings from the font metadata of the PDF, as read with its text. A line is a
+		heading when it is short and either all its spans are bold or its font is noticeably larger than the body text.
+
+		:returns: list of str, headings in document order.
+		"""
+		self.__read_document()
+		lines = [spans for page_lines in self.page_lines for spans in page_lines]
+		if not lines:
+			return []
+
+		# The body font size is the one used by most characters
+		sizes = Counter()
+		for spans in lines:
+			for text, size, _ in spans:
+				sizes[round(size, 1)] += len(text)
+		body_size = sizes.most_common(1)[0][0]
+
+		headings = []
+		for spans in lines:
+			text = ' '.join(span[0].strip() for span in spans)
+			if len(text) > 80 or not re.search(r'[A-Za-z]{3}', text):
+				continue
+
+			is_bold = all(flags & 16 for _, _, flags in spans)
+			is_larger = min(size for _, size, _ in spans) >= body_size * 1.15
+			if is_bold or is_larger:
+				headings.append(text)
+
+		return headings
+
+
+	def build_section_index(self, text: str) -> dict:
+		"""
+		Builds an index of the sections of the document, mapping each section name to the offsets of its
+		text within the processed text. The text before the first heading is indexed as 'front matter'.
+
+		:param: text: str, processed text of the document, as returned by process_text.
+		:returns: dict, section name to (start, end) offsets.
+		"""
+		try:
+			headings = self.detect_headings()
+		except Exception as e:
+			raise Exception(f"Error while reading PDF file: {e}")
+
+		# Locate each heading in the processed text, in document order
+		starts = []
+		position = 0
+		for heading in headings:
+			start = text.find(heading, position)
+			if start != -1 and (start == 0 or text[start - 1] == '\n'):
+				starts.append((start, self.__normalize_heading(heading)))
+				position = start + len(heading)
+
+		# A heading opening the document is the title of the paper, part of the front matter
+		if starts and starts[0][0] == 0:
+			starts = starts[1:]
+
+		sections = {}
+		if starts and starts[0][0] > 0:
+			sections['front matter'] = (0, starts[0][0])
+
+		for i, (start, name) in enumerate(starts):
+			end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+			if name and name not in sections:
+				sections[name] = (start, end)
+
+		return sections
+
+
+	def __parse_date(self, value: str) -> tuple:
+		"""
+		Parses a date written as in PDF or XMP metadata.
+
+		:param: value: str, date such as "D:20230115120000", "2023-01-15", "2023-01" or "2023".
+		:returns: tuple, date formatted as YYYY/MM/DD, YYYY/MM or YYYY depending on its precision and whether
+			it was complete, or None if not a date.
+		"""
+		match = re.match(r'^(?:D:)?(\d{4})(?:-?(\d{2}))?(?:-?(\d{2}))?', value.strip())
+		if not match:
+			return None
+
+		year, month, day = match.groups()
+		if month is not None and not 1 <= int(month) <= 12:
+			return None
+		if day is not None and not 1 <= int(day) <= 31:
+			return None
+
+		return '/'.join(part for part in (year, month, day) if part is not None), day is not None
+
+
+	def __read_xmp(self, xml: str) -> dict:
+		"""
+		Reads title, creators and publication date from an XMP packet.
+
+		:param: xml: str, XMP metadata of the PDF.
+		:returns: dict, values found, keyed by 'title', 'authors' and 'publication_date'.
+		"""
+		values = {}
+		try:
+			root = ElementTree.fromstring(xml)
+		except ElementTree.ParseError:
+			return values
+
+		for element in root.iter():
+			namespace, _, name = element.tag.rpartition('}')
+			items = [item.text.strip() for item in element.iter() if item.tag.endswith('}li') and item.text and item.text.strip()]
+
+			if 'purl.org/dc' in namespace and name == 'title' and items:
+				values['title'] = items[0]
+			elif 'purl.org/dc' in namespace and name == 'creator' and items:
+				values['authors'] = ', '.join(items)
+			elif 'prismstandard.org' in namespace and name in ('publicationDate', 'coverDate') and element.text:
+				values.setdefault('publication_date', element.text.strip())
+
+		return values
+
+
+	def extract_metadata(self) -> dict:
+		"""
+		Extracts title, authors and publication date without any LLM, from the XMP metadata, the
+		document information dictionary and the largest-font spans of the first page, as read with its
+		text. Each value comes with a confidence score; values found in several sources get a higher score.
+
+		:returns: dict, field name to {'value': str, 'confidence': float}.
+		"""
+		candidates = {'title': [], 'authors': [], 'publication_date': []}
+
+		self.__read_document()
+		info = self.info
+		xmp = self.__read_xmp(self.xmp)
+
+		# Title candidate from the largest spans of the first page
+		first_page_title = ''
+		spans = [span for spans in self.page_lines[0] for span in spans] if self.page_lines else []
+		if spans:
+			sizes = Counter()
+			for text, size, _ in spans:
+				sizes[round(size, 1)] += len(text)
+			body_size = sizes.most_common(1)[0][0]
+			max_size = max(size for _, size, _ in spans)
+			if max_size >= body_size * 1.2:
+				first_page_title = ' '.join(text.strip() for text, size, _ in spans if size == max_size)
+
+		confidence = self.METADATA_CONFIDENCE
+		for title, score in ((xmp.get('title', ''), confidence['xmp']), (info.get('title', ''), confidence['info']), (first_page_title, confidence['first_page'])):
+			title = re.sub(r'\s+', ' ', title).strip()
+			if len(title) >= 4 and not self.PLACEHOLDER_TITLE_PATTERN.search(title):
+				candidates['title'].append((title, score))
+
+		for authors, score in ((xmp.get('authors', ''), confidence['xmp']), (info.get('author', ''), confidence['info'])):
+			authors = ', '.join(author.strip() for author in re.split(r'\s*[;,]\s*|\s+and\s+', authors) if author.strip())
+			if authors:
+				candidates['authors'].append((authors, score))
+
+		for date, score in ((xmp.get('publication_date', ''), confidence['xmp_date']), (info.get('creationDate', ''), confidence['info_date'])):
+			parsed = self.__parse_date(date) if date else None
+			if parsed:
+				# Dates without a day are less reliable
+				candidates['publication_date'].append((parsed[0], score if parsed[1] else score * 0.7))
+
+		metadata = {}
+		for field, values in candidates.items():
+			if not values:
+				continue
+
+			value, score = max(values, key=lambda candidate: candidate[1])
+			# Agreement between independent sources raises the confidence
+			agreeing = sum(candidate[0].lower() == value.lower() for candidate in values)
+			score = min(0.99, score + 0.1 * (agreeing - 1))
+			metadata[field] = {'value': value, 'confidence': round(score, 2)}
+
+		return metadata
+
+
+	def ingest(self) -> dict:
+		"""
+		Processes the text of the PDF together with its section index and bibliographic metadata.
+		Failing to index sections or read metadata is not an error, they are left empty instead.
+
+		:returns: dict, with 'pdf_content', 'sections', 'metadata' and 'page_count'.
+		"""
+		pdf_content = self.process_text()
+
+		try:
+			sections = self.build_section_index(pdf_content)
+		except Exception as e:
+			logging.warning(f"Failed to index sections of PDF file: {e}")
+			sections = {}
+
+		try:
+			metadata = self.extract_metadata()
+		except Exception as e:
+			logging.warning(f"Failed to read metadata of PDF file: {e}")
+			metadata = {}
+
+		return {'pdf_content': pdf_content, 'sections': sections, 'metadata': metadata, 'page_count': self.page_count}
@@ -0,0 +1,94 @@
+import os
+import time
+import sqlite3
+import threading
+from src.document_ingestor import DocumentIngestor
+
+
+class DocumentLedger:
+	"""
+	Local record of the PDF files already processed, used to only send new or changed
+	documents through the pipeline.
+	"""
+
+	def __init__(self, db_path: str, pipeline_version: str = '1') -> None:
+		"""
+		Initializes the ledger, creating the database if needed.
+
+		:param db_path: str, path to the SQLite database file.
+		:param pipeline_version: str, version of the pipeline, documents processed by another version are processed again.
+		"""
+		self.db_path = db_path
+		self.pipeline_version = pipeline_version
+
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(db_path, check_same_thread=False)
+		with self.connection:
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS documents ("
+				"file_path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, content_hash TEXT NOT NULL, "
+				"pipeline_version TEXT NOT NULL, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+			)
+			self.connection.execute("CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)")
+
+
+	def needs_processing(self, file_path: str) -> tuple:
+		"""
+		Checks whether a document has to go through the pipeline. The size and modification time of the
+		file are checked first, and the content is only hashed when they differ from the ledger.
+
+		:param file_path: str, path to the PDF file.
+		:returns: tuple, whether the document needs processing and its content hash if it was computed.
+		"""
+		file_path = os.path.abspath(file_path)
+		stat = os.stat(file_path)
+
+		with self.lock:
+			row = self.connection.execute(
+				"SELECT size, mtime, pipeline_version, status FROM documents WHERE file_path = ?", (file_path,)
+			).fetchone()
+
+		if row == (stat.st_size, stat.st_mtime, self.pipeline_version, 'stored'):
+			return False, None
+
+		# The file is new or was touched, compare its content with the documents already stored
+		content_hash = DocumentIngestor(file_path).get_content_hash()
+		with self.lock:
+			stored = self.connection.execute(
+				"SELECT 1 FROM documents WHERE content_hash = ? AND pipeline_version = ? AND status = 'stored'",
+				(content_hash, self.pipeline_version)
+			).fetchone()
+
+		if stored:
+			self.record(file_path, content_hash, 'stored')
+			return False, content_hash
+
+		return True, content_hash
+
+
+	def record(self, file_path: str, content_hash: str, status: str) -> None:
+		"""
+		Records the outcome of a document.
+
+		:param file_path: str, path to the PDF file.
+		:param content_hash: str, hash of the file content, computed if not given.
+		:param status: str, outcome of the document, 'stored' or 'failed'.
+		"""
+		file_path = os.path.abspath(file_path)
+		stat = os.stat(file_path)
+		if content_hash is None:
+			content_hash = DocumentIngestor(file_path).get_content_hash()
+
+		with self.lock, self.connection:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO documents (file_path, size, mtime, content_hash, pipeline_version, status, updated_at) "
+				"VALUES (?, ?, ?, ?, ?, ?, ?)",
+				(file_path, stat.st_size, stat.st_mtime, content_hash, self.pipeline_version, status, time.time())
+			)
+
+
+	def close(self) -> None:
+		"""
+		Closes the connection to the database.
+		"""
+		self.connection.close()
@@ -0,0 +1,251 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+
+class DuplicateDetector:
+	"""
+	Finds papers whose text is nearly the same as a paper already stored, such as the preprint and
+	camera-ready versions of the same work, so that their extraction can be reused. Each text is
+	summarized by a MinHash signature of its word shingles, and a locality-sensitive hashing index
+	persisted in SQLite finds the candidates sharing a band of their signature, which are then kept
+	when their estimated Jaccard similarity reaches the threshold. Papers found to be near-duplicates
+	are linked to the paper whose data they reuse.
+	"""
+
+	# Prime larger than every 32-bit shingle hash, so that permutations never overflow 64 bits
+	MERSENNE_PRIME = (1 << 61) - 1
+	WORD_PATTERN = re.compile(r'\w+')
+	BLOCK_SIZE = 4096
+
+	# Weights of the probabilities of missing a near-duplicate and of comparing a paper below the threshold
+	# when choosing the bands. Candidates are checked against the threshold on their whole signature,
+	# so a false positive only costs a comparison while a false negative repeats an extraction.
+	FALSE_NEGATIVE_WEIGHT = 0.8
+	FALSE_POSITIVE_WEIGHT = 0.2
+
+
+	def __init__(self, db_path: str, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+		"""
+		Initializes the detector, creating the database if needed.
+
+		:param db_path: str, path to the SQLite database file.
+		:param threshold: float, minimum estimated Jaccard similarity of two papers flagged as near-duplicates.
+		:param num_perm: int, number of hash permutations of the signatures.
+		:param shingle_size: int, number of consecutive words of each shingle.
+		:param seed: int, seed of the permutations, signatures are only comparable under the same seed.
+		"""
+		self.db_path = db_path
+		self.threshold = threshold
+		self.num_perm = num_perm
+		self.shingle_size = shingle_size
+		self.bands, self.rows_per_band = self.get_band_layout(threshold, num_perm)
+
+		generator = np.random.RandomState(seed)
+		self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+		self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(db_path, check_same_thread=False)
+		with self.connection:
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS documents ("
+				"file_path TEXT PRIMARY KEY, signature BLOB NOT NULL, extracted_data TEXT NOT NULL, updated_at REAL NOT NULL)"
+			)
+			self.connection.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket TEXT NOT NULL, file_path TEXT NOT NULL)")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS bands_file_path ON bands (file_path)")
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS links ("
+				"file_path TEXT PRIMARY KEY, duplicate_of TEXT NOT NULL, similarity REAL NOT NULL, linked_at REAL NOT NULL)"
+			)
+			self.connection.execute("CREATE TABLE IF NOT EXISTS layout (bands INTEGER NOT NULL, rows_per_band INTEGER NOT NULL)")
+
+		self.rebuild_bands()
+
+
+	@classmethod
+	def get_band_layout(cls, threshold: float, num_perm: int, steps: int = 200) -> tuple:
+		"""
+		Splits the signature into the bands minimizing the weighted probabilities of false positives, papers
+		below the threshold sharing a band, and of false negatives, papers above it sharing none, each
+		integrated over the similarities on its side of the threshold. Bands may leave rows of the signature out.
+
+		:param threshold: float, Jaccard similarity targeted by the index.
+		:param num_perm: int, number of hash permutations of the signatures.
+		:param steps: int, number of similarities each probability is integrated over.
+		:returns: tuple, number of bands and number of rows per band.
+		"""
+		# Midpoints of the similarities below and above the threshold
+		below = (np.arange(steps) + 0.5) / steps * threshold
+		above = threshold + (np.arange(steps) + 0.5) / steps * (1 - threshold)
+
+		best_layout, best_error = None, None
+		for bands in range(1, num_perm + 1):
+			for rows in range(1, num_perm // bands + 1):
+				false_positives = np.mean(1 - (1 - below ** rows) ** bands) * threshold
+				false_negatives = np.mean((1 - above ** rows) ** bands) * (1 - threshold)
+				error = cls.FALSE_POSITIVE_WEIGHT * false_positives + cls.FALSE_NEGATIVE_WEIGHT * false_negatives
+				if best_error is None or error < best_error:
+					best_layout, best_error = (bands, rows), error
+
+		return best_layout
+
+
+	def rebuild_bands(self) -> None:
+		"""
+		Recomputes the buckets of every indexed paper from its signature when the index was built with
+		other bands, such as under another threshold.
+		"""
+		with self.lock, self.connection:
+			layout = self.connection.execute("SELECT bands, rows_per_band FROM layout").fetchone()
+			if layout == (self.bands, self.rows_per_band):
+				return
+
+			self.connection.execute("DELETE FROM bands")
+			for file_path, signature in self.connection.execute("SELECT file_path, signature FROM documents").fetchall():
+				self.connection.executemany(
+					"INSERT INTO bands (band, bucket, file_path) VALUES (?, ?, ?)",
+					[(band, bucket, file_path) for band, bucket in enumerate(self.get_buckets(np.frombuffer(signature, dtype=np.uint64)))]
+				)
+			self.connection.execute("DELETE FROM layout")
+			self.connection.execute("INSERT INTO layout (bands, rows_per_band) VALUES (?, ?)", (self.bands, self.rows_per_band))
+
+
+	def get_shingles(self, text: str) -> np.ndarray:
+		"""
+		Hashes the shingles of consecutive words of a text, ignoring case and punctuation.
+
+		:param text: str, text of the paper.
+		:returns: numpy.ndarray, distinct 32-bit hashes of the shingles.
+		"""
+		words = self.WORD_PATTERN.findall(text.lower())
+		shingles = {
+			' '.join(words[i:i + self.shingle_size])
+			for i in range(max(1, len(words) - self.shingle_size + 1))
+		}
+
+		return np.array(
+			[int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little') for shingle in shingles],
+			dtype=np.uint64
+		)
+
+
+	def get_signature(self, text: str) -> np.ndarray:
+		"""
+		Computes the MinHash signature of a text.
+
+		:param text: str, text of the paper.
+		:returns: numpy.ndarray, minimum of each permutation over the shingles of the text.
+		"""
+		shingles = self.get_shingles(text)
+		signature = np.full(self.num_perm, self.MERSENNE_PRIME, dtype=np.uint64)
+
+		# Permute the shingles by blocks, long papers have too many of them to permute at once
+		for start in range(0, len(shingles), self.BLOCK_SIZE):
+			permutations = (np.outer(shingles[start:start + self.BLOCK_SIZE], self.a) + self.b) % np.uint64(self.MERSENNE_PRIME)
+			signature = np.minimum(signature, permutations.min(axis=0))
+
+		return signature
+
+
+	def get_buckets(self, signature: np.ndarray) -> list:
+		"""
+		Hashes each band of a signature into the bucket it falls in.
+
+		:param signature: numpy.ndarray, MinHash signature.
+		:returns: list of str, bucket of each band.
+		"""
+		return [
+			hashlib.blake2b(signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes(), digest_size=8).hexdigest()
+			for band in range(self.bands)
+		]
+
+
+	def find_duplicate(self, file_path: str, text: str) -> tuple:
+		"""
+		Finds the most similar paper already stored, if it is a near-duplicate of the text.
+		Earlier versions of the same file are ignored, their changes need a new extraction.
+
+		:param file_path: str, path to the PDF file of the text.
+		:param text: str, text of the paper.
+		:returns: tuple, path, extracted data and estimated similarity of the duplicate, or None.
+		"""
+		signature = self.get_signature(text)
+		buckets = self.get_buckets(signature)
+
+		with self.lock:
+			candidates = self.connection.execute(
+				"SELECT DISTINCT documents.file_path, documents.signature, documents.extracted_data FROM bands "
+				"JOIN documents ON documents.file_path = bands.file_path "
+				f"WHERE bands.file_path != ? AND ({' OR '.join(['(band = ? AND bucket = ?)'] * self.bands)})",
+				[file_path] + [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+			).fetchall()
+
+		duplicate = None
+		for candidate_path, candidate_signature, extracted_data in candidates:
+			similarity = float(np.mean(np.frombuffer(candidate_signature, dtype=np.uint64) == signature))
+			if similarity >= self.threshold and (duplicate is None or similarity > duplicate[2]):
+				duplicate = (candidate_path, json.loads(extracted_data), similarity)
+
+		return duplicate
+
+
+	def add(self, file_path: str, text: str, extracted_data: dict) -> None:
+		"""
+		Indexes a stored paper with its extracted data, replacing a previous version of the same file.
+
+		:param file_path: str, path to the PDF file.
+		:param text: str, text of the paper.
+		:param extracted_data: dict, data extracted from the paper.
+		"""
+		signature = self.get_signature(text)
+		buckets = self.get_buckets(signature)
+
+		with self.lock, self.connection:
+			self.connection.execute("DELETE FROM bands WHERE file_path = ?", (file_path,))
+			self.connection.execute(
+				"INSERT OR REPLACE INTO documents (file_path, signature, extracted_data, updated_at) VALUES (?, ?, ?, ?)",
+				(file_path, signature.tobytes(), json.dumps(extracted_data, default=str), time.time())
+			)
+			self.connection.executemany(
+				"INSERT INTO bands (band, bucket, file_path) VALUES (?, ?, ?)",
+				[(band, bucket, file_path) for band, bucket in enumerate(buckets)]
+			)
+
+
+	def link(self, file_path: str, duplicate_of: str, similarity: float) -> None:
+		"""
+		Records that a paper is a near-duplicate of a stored paper, whose extracted data it reuses.
+
+		:param file_path: str, path to the PDF file of the near-duplicate.
+		:param duplicate_of: str, path to the PDF file of the stored paper.
+		:param similarity: float, estimated Jaccard similarity of the papers.
+		"""
+		with self.lock, self.connection:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO links (file_path, duplicate_of, similarity, linked_at) VALUES (?, ?, ?, ?)",
+				(file_path, duplicate_of, similarity, time.time())
+			)
+
+
+	def get_link(self, file_path: str) -> tuple:
+		"""
+		Returns the stored paper a near-duplicate was linked to.
+
+		:param file_path: str, path to the PDF file of the near-duplicate.
+		:returns: tuple, path to the PDF file of the stored paper and estimated similarity, or None if not linked.
+		"""
+		with self.lock:
+			return self.connection.execute("SELECT duplicate_of, similarity FROM links WHERE file_path = ?", (file_path,)).fetchone()
+
+
+	def close(self) -> None:
+		"""
+		Closes the connection to the database.
+		"""
+		self.connection.close()
@@ -0,0 +1,311 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import List
+import numpy as np
+
+
+class Embedder(ABC):
+	"""
+	Interface of the models turning texts into vectors for the embedding index.
+	"""
+
+	# Number of dimensions of the vectors
+	dimensions = None
+
+
+	@abstractmethod
+	def embed(self, texts: List[str]) -> np.ndarray:
+		"""
+		Embeds texts.
+
+		:param texts: list of str, texts to be embedded.
+		:returns: numpy.ndarray, float32 matrix with one row per text.
+		"""
+
+
+class HashingEmbedder(Embedder):
+	"""
+	Offline embedder hashing the words and word pairs of a text into a fixed number of dimensions,
+	weighted by their sublinear term frequency. It needs no training nor network access, and texts
+	sharing many terms get close vectors.
+	"""
+
+	WORD_PATTERN = re.compile(r'\w+')
+
+
+	def __init__(self, dimensions: int = 512) -> None:
+		"""
+		Initializes the embedder.
+
+		:param dimensions: int, number of dimensions of the vectors.
+		"""
+		self.dimensions = dimensions
+
+
+	def embed(self, texts: List[str]) -> np.ndarray:
+		vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+
+		for row, text in enumerate(texts):
+			words = self.WORD_PATTERN.findall(text.lower())
+			counts = {}
+			for term in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+				counts[term] = counts.get(term, 0) + 1
+
+			for term, count in counts.items():
+				digest = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+				# The sign bit spreads the collisions of different terms around zero
+				sign = 1.0 if digest >> 63 else -1.0
+				vectors[row, digest % self.dimensions] += sign * (1.0 + np.log(count))
+
+		return vectors
+
+
+class LangChainEmbedder(Embedder):
+	"""
+	Embedder backed by a LangChain embeddings model, such as OpenAIEmbeddings.
+	"""
+
+	def __init__(self, embeddings, dimensions: int) -> None:
+		"""
+		Initializes the embedder.
+
+		:param embeddings: langchain_core.embeddings.Embeddings, model embedding the texts.
+		:param dimensions: int, number of dimensions of the vectors of the model.
+		"""
+		self.embeddings = embeddings
+		self.dimensions = dimensions
+
+
+	def embed(self, texts: List[str]) -> np.ndarray:
+		return np.array(self.embeddings.embed_documents(texts), dtype=np.float32).reshape(len(texts), self.dimensions)
+
+
+class EmbeddingIndex:
+	"""
+	Local index of paper vectors answering "papers like this one" queries. Normalized vectors are
+	appended to a float32 file read through a memory map, so that millions of papers are searched
+	block by block without loading them into Python objects, and a SQLite table maps each row to its
+	paper. Indexing a paper again only marks its previous row as deleted, and compaction rewrites
+	the file without the deleted rows once they make up a large part of it.
+	"""
+
+	# Rows scored at once, bounding the memory used by a search
+	BLOCK_ROWS = 65536
+
+
+	def __init__(self, directory: str, dimensions: int = None, compact_ratio: float = 0.25) -> None:
+		"""
+		Initializes the index, creating its files if needed.
+
+		:param directory: str, directory of the vector file and the id map.
+		:param dimensions: int, number of dimensions of the vectors, those of the existing index or 512 when not given.
+		:param compact_ratio: float, fraction of deleted rows above which the index is compacted when a paper is added.
+		:raises ValueError: if the existing index was built with another number of dimensions.
+		"""
+		self.directory = directory
+		self.compact_ratio = compact_ratio
+		self.vectors_path = os.path.join(directory, 'vectors.f32')
+		os.makedirs(directory, exist_ok=True)
+
+		self.lock = threading.RLock()
+		self.connection = sqlite3.connect(os.path.join(directory, 'ids.sqlite'), check_same_thread=False)
+		with self.connection:
+			self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, file_path TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS rows_file_path ON rows (file_path) WHERE deleted = 0")
+			self.connection.execute("INSERT OR IGNORE INTO settings (name, value) VALUES ('dimensions', ?)", (str(dimensions or 512),))
+
+		self.dimensions = int(self.connection.execute("SELECT value FROM settings WHERE name = 'dimensions'").fetchone()[0])
+		if dimensions is not None and dimensions != self.dimensions:
+			raise ValueError(f"Embedding index {directory} has {self.dimensions} dimensions, not {dimensions}.")
+
+		# Rows written to the vector file, a partial row left by a crash is ignored and overwritten
+		self.row_count = self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+		with open(self.vectors_path, 'ab') as f:
+			f.truncate(self.row_count * self.dimensions * 4)
+
+		# Deleted rows are kept in memory as one flag per row, masking them out of every search
+		self.deleted = np.zeros(max(1024, self.row_count), dtype=bool)
+		self.deleted[self.fetch_rows("SELECT row FROM rows WHERE deleted = 1")] = True
+		self.deleted_count = int(self.deleted.sum())
+
+		# Number of compactions, which renumber the rows
+		self.generation = 0
+
+
+	def fetch_rows(self, query: str, parameters: tuple = ()) -> np.ndarray:
+		"""
+		Runs a query selecting row numbers.
+
+		:param query: str, SQL query selecting a single column of row numbers.
+		:param parameters: tuple, parameters of the query.
+		:returns: numpy.ndarray, selected row numbers.
+		"""
+		return np.fromiter((row for row, in self.connection.execute(query, parameters)), dtype=np.int64)
+
+
+	def get_vectors(self) -> np.ndarray:
+		"""
+		Maps the vector file into memory, its pages are only read when scored.
+
+		:returns: numpy.ndarray, read-only float32 matrix with one row per indexed vector.
+		"""
+		if self.row_count == 0:
+			return np.zeros((0, self.dimensions), dtype=np.float32)
+
+		return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.row_count, self.dimensions))
+
+
+	def add(self, file_path: str, vector: np.ndarray) -> None:
+		"""
+		Appends the vector of a paper, replacing a previous version of the same file.
+
+		:param file_path: str, path to the PDF file.
+		:param vector: numpy.ndarray, vector of the paper.
+		"""
+		vector = np.asarray(vector, dtype=np.float32).reshape(self.dimensions)
+		norm = np.linalg.norm(vector)
+		if norm > 0:
+			vector = vector / norm
+
+		with self.lock:
+			with open(self.vectors_path, 'ab') as f:
+				f.write(vector.tobytes())
+
+			try:
+				with self.connection:
+					replaced_rows = self.fetch_rows("SELECT row FROM rows WHERE file_path = ? AND deleted = 0", (file_path,))
+					self.connection.execute("UPDATE rows SET deleted = 1 WHERE file_path = ? AND deleted = 0", (file_path,))
+					self.connection.execute("INSERT INTO rows (row, file_path) VALUES (?, ?)", (self.row_count, file_path))
+			except Exception:
+				# Drop the vector so that the next one is written at the right row
+				with open(self.vectors_path, 'ab') as f:
+					f.truncate(self.row_count * self.dimensions * 4)
+				raise
+
+			if self.row_count >= len(self.deleted):
+				self.deleted = np.concatenate([self.deleted, np.zeros(len(self.deleted), dtype=bool)])
+			self.deleted[replaced_rows] = True
+			self.deleted_count += len(replaced_rows)
+			self.row_count += 1
+
+			if self.deleted_count > self.compact_ratio * self.row_count:
+				self.compact()
+
+
+	def get_vector(self, file_path: str) -> np.ndarray:
+		"""
+		Returns the vector of an indexed paper.
+
+		:param file_path: str, path to the PDF file.
+		:returns: numpy.ndarray, vector of the paper, or None if it is not indexed.
+		"""
+		with self.lock:
+			row = self.connection.execute("SELECT row FROM rows WHERE file_path = ? AND deleted = 0", (file_path,)).fetchone()
+			if row is None:
+				return None
+
+			return np.array(self.get_vectors()[row[0]])
+
+
+	def search(self, vector: np.ndarray, k: int = 10, exclude: str = None) -> List[tuple]:
+		"""
+		Finds the papers whose vectors have the highest cosine similarity with a vector.
+
+		:param vector: numpy.ndarray, vector searched.
+		:param k: int, number of papers returned.
+		:param exclude: str, optional path of a paper left out of the results, such as the one searched.
+		:returns: list of tuple, path and cosine similarity of each paper, most similar first.
+		"""
+		query = np.asarray(vector, dtype=np.float32).reshape(self.dimensions)
+		norm = np.linalg.norm(query)
+		if norm > 0:
+			query = query / norm
+
+		if k <= 0:
+			return []
+
+		with self.lock:
+			generation = self.generation
+			vectors = self.get_vectors()
+			excluded = self.deleted[:len(vectors)].copy()
+			excluded[self.fetch_rows("SELECT row FROM rows WHERE file_path = ? AND deleted = 0", (exclude,))] = True
+
+		# Keep the k best rows of each block, then the k best of those
+		candidate_rows, candidate_scores = [], []
+		for start in range(0, len(vectors), self.BLOCK_ROWS):
+			scores = vectors[start:start + self.BLOCK_ROWS] @ query
+			scores[excluded[start:start + len(scores)]] = -np.inf
+
+			best = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+			candidate_rows.append(best + start)
+			candidate_scores.append(scores[best])
+
+		if not candidate_rows:
+			return []
+
+		rows, scores = np.concatenate(candidate_rows), np.concatenate(candidate_scores)
+		order = np.argsort(-scores, kind='stable')[:k]
+		rows, scores = rows[order], scores[order]
+		rows, scores = rows[np.isfinite(scores)], scores[np.isfinite(scores)]
+
+		with self.lock:
+			# The rows were scored in a file since compacted, their numbers now point to other papers
+			if self.generation != generation:
+				return self.search(vector, k=k, exclude=exclude)
+
+			file_paths = dict(self.connection.execute(
+				f"SELECT row, file_path FROM rows WHERE row IN ({', '.join('?' * len(rows))})", [int(row) for row in rows]
+			).fetchall())
+
+		return [(file_paths[int(row)], float(score)) for row, score in zip(rows, scores)]
+
+
+	def compact(self) -> None:
+		"""
+		Rewrites the vector file without the deleted rows and renumbers the remaining ones.
+		"""
+		with self.lock:
+			vectors = self.get_vectors()
+			alive_rows = np.flatnonzero(~self.deleted[:self.row_count])
+
+			# Copy block by block, then swap the files so that readers never see a partial index
+			with open(f"{self.vectors_path}.tmp", 'wb') as f:
+				for start in range(0, len(alive_rows), self.BLOCK_ROWS):
+					f.write(np.ascontiguousarray(vectors[alive_rows[start:start + self.BLOCK_ROWS]]).tobytes())
+			del vectors
+
+			with self.connection:
+				self.connection.execute(
+					"CREATE TEMP TABLE compacted AS "
+					"SELECT ROW_NUMBER() OVER (ORDER BY row) - 1 AS row, file_path FROM rows WHERE deleted = 0"
+				)
+				self.connection.execute("DELETE FROM rows")
+				self.connection.execute("INSERT INTO rows (row, file_path) SELECT row, file_path FROM compacted")
+				self.connection.execute("DROP TABLE compacted")
+				os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+
+			self.row_count = len(alive_rows)
+			self.deleted = np.zeros(max(1024, self.row_count), dtype=bool)
+			self.deleted_count = 0
+			self.generation += 1
+
+
+	def count(self) -> int:
+		"""
+		Counts the indexed papers.
+
+		:returns: int, number of papers.
+		"""
+		return self.row_count - self.deleted_count
+
+
+	def close(self) -> None:
+		"""
+		Closes the connection to the id map.
+		"""
+		self.connection.close()
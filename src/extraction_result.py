@@ -0,0 +1,226 @@
+import re
+import json
+import logging
+import datetime
+from typing import List
+from dataclasses import dataclass
+
+
+@dataclass
+class ExtractionResult:
+	"""
+	Typed record of the data extracted from a paper, normalized to the types of the table schema:
+	keywords and authors are parsed into lists, and publication dates into dates whose precision
+	is kept, as answers such as "March 2023" name a month rather than a day. Values that are not
+	answers, such as an ExtractionFailure, are kept as they are.
+	"""
+	__slots__ = (
+		'utc_timestamp', 'title', 'authors', 'publication_date', 'date_precision',
+		'abstract', 'findings', 'methodology', 'summary', 'keywords'
+	)
+
+	utc_timestamp: datetime.datetime
+	title: str
+	authors: List[str]
+	publication_date: datetime.date
+	date_precision: str
+	abstract: str
+	findings: str
+	methodology: str
+	summary: str
+	keywords: List[str]
+
+	# Formats of the dates in extracted data, as expected by StorageBackend.convert_row
+	TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+	DATE_FORMAT = "%Y/%m/%d"
+
+	TEXT_FIELDS = ('title', 'abstract', 'findings', 'methodology', 'summary')
+	MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+
+	# Dates found in answers, most precise first, with the precision of each pattern
+	MONTH_NAME = r'(?P<month_name>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+	DATE_PATTERNS = (
+		(re.compile(r'\b(?P<year>\d{4})[/\-.](?P<month>\d{1,2})[/\-.](?P<day>\d{1,2})\b'), 'day'),
+		(re.compile(r'\b(?P<day>\d{1,2})(?:st|nd|rd|th)?\s+' + MONTH_NAME + r',?\s+(?P<year>\d{4})\b', re.IGNORECASE), 'day'),
+		(re.compile(r'\b' + MONTH_NAME + r'\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b', re.IGNORECASE), 'day'),
+		(re.compile(r'\b' + MONTH_NAME + r',?\s+(?P<year>\d{4})\b', re.IGNORECASE), 'month'),
+		(re.compile(r'\b(?P<year>\d{4})[/\-.](?P<month>\d{1,2})\b'), 'month'),
+		(re.compile(r'\b(?P<year>1[89]\d{2}|2\d{3})\b'), 'year')
+	)
+
+	# Separators of the items of list answers, and the labels and markers around them
+	KEYWORD_SEPARATORS = re.compile(r'[,;\n]')
+	# A comma followed by initials or a suffix, as in "Smith, J." or "John Smith, Jr.", is part of a name
+	NAME_END = r'\s*(?:,|\n|&|\band\b|$)'
+	NAME_CONTINUATION = r'\s*(?:(?:[A-Z]\.?[\s-]?){1,3}|(?:Jr|Sr|II|III|IV)\.?)' + NAME_END
+	AUTHOR_SEPARATORS = re.compile(r';|\n|,(?!' + NAME_CONTINUATION + r')|\s+and\s+|\s*&\s*')
+	LABEL_PATTERN = re.compile(r'^\s*(?:keywords?|index terms|authors?)\s*:\s*', re.IGNORECASE)
+	ITEM_MARKERS = re.compile(r'^(?:[-*•]|\d+[.)])\s*')
+	AFFILIATION_MARKERS = re.compile(r'[\d*†‡,]+$')
+	# Final period of a name, unless it ends an initial or a suffix
+	NAME_PERIOD = re.compile(r'(?<=[a-z]{2})\.$')
+
+
+	@classmethod
+	def from_dict(cls, extracted_data: dict) -> 'ExtractionResult':
+		"""
+		Normalizes extracted data, such as the answers of the LLM.
+
+		:param extracted_data: dict, extracted data, field name to value.
+		:returns: ExtractionResult, normalized record.
+		"""
+		publication_date, date_precision = extracted_data.get('publication_date'), None
+		if isinstance(publication_date, str):
+			publication_date, date_precision = cls.parse_date(publication_date)
+
+		utc_timestamp = extracted_data.get('utc_timestamp')
+		if isinstance(utc_timestamp, str):
+			utc_timestamp = datetime.datetime.strptime(utc_timestamp, cls.TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+		return cls(
+			utc_timestamp=utc_timestamp,
+			authors=cls.parse_authors(extracted_data.get('authors')),
+			publication_date=publication_date,
+			date_precision=date_precision,
+			keywords=cls.parse_keywords(extracted_data.get('keywords')),
+			**{field: cls.parse_text(extracted_data.get(field)) for field in cls.TEXT_FIELDS}
+		)
+
+
+	@staticmethod
+	def parse_text(value):
+		"""
+		Strips the whitespace and quotes around a text answer.
+
+		:param value: str, answer of the LLM, other values are returned as they are.
+		:returns: str, text of the answer.
+		"""
+		if not isinstance(value, str):
+			return value
+
+		return value.strip().strip('"').strip()
+
+
+	@classmethod
+	def parse_date(cls, value: str) -> tuple:
+		"""
+		Finds the first date of an answer, with the precision it was given with. Dates without
+		a day or a month are set to the first day of their month or year. Of the dates starting at
+		the same position, the most precise one is kept, as "2023/03" also starts "2023/03/15".
+
+		:param value: str, answer of the LLM, such as "2023/03/15", "March 2023" or "2023".
+		:returns: tuple, date and precision, 'day', 'month' or 'year', or None twice if no valid date was found.
+		"""
+		# First valid match of every pattern, with its position and the rank of its pattern
+		matches = []
+		for rank, (pattern, precision) in enumerate(cls.DATE_PATTERNS):
+			for match in pattern.finditer(value):
+				parts = match.groupdict()
+				month = cls.MONTHS.index(parts['month_name'].lower()[:3]) + 1 if parts.get('month_name') else int(parts.get('month') or 1)
+				try:
+					matches.append((match.start(), rank, datetime.date(int(parts['year']), month, int(parts.get('day') or 1)), precision))
+					break
+				except ValueError:
+					continue
+
+		if not matches:
+			logging.warning(f"No publication date found in '{value}'.")
+			return None, None
+
+		_, _, date, precision = min(matches)
+		return date, precision
+
+
+	@classmethod
+	def split_items(cls, value, separators: re.Pattern, strip: str = ' "\'.') -> list:
+		"""
+		Splits a list answer into its items, without their labels, list markers and duplicates.
+
+		:param value: str or list, answer of the LLM, as text or as a JSON array.
+		:param separators: re.Pattern, separators of the items of a text answer.
+		:param strip: str, characters stripped around every item.
+		:returns: list of str, items in order.
+		"""
+		if isinstance(value, str):
+			value = cls.LABEL_PATTERN.sub('', value.strip())
+			if value.startswith('['):
+				try:
+					value = json.loads(value)
+				except ValueError:
+					value = value.strip('[]')
+		if isinstance(value, str):
+			value = separators.split(value)
+
+		items, seen = [], set()
+		for item in value:
+			item = cls.ITEM_MARKERS.sub('', str(item).strip()).strip(strip)
+			if item and item.lower() not in seen:
+				seen.add(item.lower())
+				items.append(item)
+
+		return items
+
+
+	@classmethod
+	def parse_keywords(cls, value):
+		"""
+		Parses the keywords of an answer, separated by commas, semicolons or lines.
+
+		:param value: str or list, answer of the LLM, other values are returned as they are.
+		:returns: list of str, keywords.
+		"""
+		if value is None:
+			return []
+		if not isinstance(value, (str, list)):
+			return value
+
+		return cls.split_items(value, cls.KEYWORD_SEPARATORS)
+
+
+	@classmethod
+	def parse_authors(cls, value):
+		"""
+		Parses the authors of an answer, separated by commas, semicolons, lines or "and". When
+		authors are separated by semicolons, commas are kept, as in "Doe, Jane; Smith, John", and so
+		are commas followed by initials or a suffix, as in "Smith, J., Doe, A." or "John Smith, Jr.".
+
+		:param value: str or list, answer of the LLM, other values are returned as they are.
+		:returns: list of str, names of the authors, without affiliation markers.
+		"""
+		if value is None:
+			return []
+		if not isinstance(value, (str, list)):
+			return value
+
+		separators = re.compile(r';|\n') if isinstance(value, str) and ';' in value else cls.AUTHOR_SEPARATORS
+		return [
+			name for name in (
+				cls.NAME_PERIOD.sub('', cls.AFFILIATION_MARKERS.sub('', author).strip())
+				for author in cls.split_items(value, separators, strip=' "\'')
+			)
+			if name
+		]
+
+
+	def to_dict(self) -> dict:
+		"""
+		Converts the record to extracted data matching the table schema, with authors joined into
+		a single string and dates formatted as StorageBackend.convert_row expects them. A date without
+		a day is stored on the first day of its month or year, and its precision in its own column.
+
+		:returns: dict, extracted data, field name to value.
+		"""
+		extracted_data = {
+			'utc_timestamp': self.utc_timestamp.strftime(self.TIMESTAMP_FORMAT) if isinstance(self.utc_timestamp, datetime.datetime) else self.utc_timestamp,
+			'title': self.title,
+			'authors': ', '.join(self.authors) if isinstance(self.authors, list) else self.authors,
+			'publication_date': self.publication_date.strftime(self.DATE_FORMAT) if isinstance(self.publication_date, datetime.date) else self.publication_date,
+			'date_precision': self.date_precision,
+			'abstract': self.abstract,
+			'findings': self.findings,
+			'methodology': self.methodology,
+			'summary': self.summary,
+			'keywords': self.keywords
+		}
+
+		return extracted_data
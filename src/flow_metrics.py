@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+class DocumentMetrics:
+	"""
+	Timing, token and size measurements collected while a single document goes through the pipeline.
+	"""
+
+	def __init__(self, file_path: str) -> None:
+		"""
+		Initializes empty measurements for a document.
+
+		:param file_path: str, path to the PDF file.
+		"""
+		self.file_path = file_path
+		self.page_count = 0
+		self.char_count = 0
+		self.stages = defaultdict(float)
+		self.fields = defaultdict(lambda: {
+			'calls': 0, 'cache_hits': 0, 'seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0
+		})
+		self.lock = threading.Lock()
+
+
+	@contextmanager
+	def measure(self, stage: str):
+		"""
+		Measures the wall time of a stage, accumulated if the stage runs several times.
+
+		:param stage: str, name of the stage.
+		"""
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.stages[stage] += time.perf_counter() - start
+
+
+	def record_prompt(self, field: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0, cost: float = 0.0, cache_hit: bool = False) -> None:
+		"""
+		Records a prompt run for a field.
+
+		:param field: str, name of the field the prompt extracts.
+		:param seconds: float, wall time of the prompt.
+		:param prompt_tokens: int, tokens sent to the LLM.
+		:param completion_tokens: int, tokens generated by the LLM.
+		:param cost: float, estimated cost in USD.
+		:param cache_hit: bool, whether the response came from the cache.
+		"""
+		with self.lock:
+			field_metrics = self.fields[field]
+			field_metrics['calls'] += 1
+			field_metrics['cache_hits'] += int(cache_hit)
+			field_metrics['seconds'] += seconds
+			field_metrics['prompt_tokens'] += prompt_tokens
+			field_metrics['completion_tokens'] += completion_tokens
+			field_metrics['cost'] += cost
+
+
+	def record_document(self, page_count: int, char_count: int) -> None:
+		"""
+		Records the size of the document.
+
+		:param page_count: int, number of pages of the PDF.
+		:param char_count: int, number of characters of the processed text.
+		"""
+		self.page_count = page_count
+		self.char_count = char_count
+
+
+	def to_dict(self) -> dict:
+		"""
+		Returns the measurements as a dictionary ready to be serialized.
+
+		:returns: dict, measurements of the document.
+		"""
+		with self.lock:
+			fields = {field: dict(values) for field, values in self.fields.items()}
+			return {
+				'event': 'document_metrics',
+				'file_path': self.file_path,
+				'page_count': self.page_count,
+				'char_count': self.char_count,
+				'stages': {stage: round(seconds, 6) for stage, seconds in self.stages.items()},
+				'fields': fields,
+				'prompt_tokens': sum(values['prompt_tokens'] for values in fields.values()),
+				'completion_tokens': sum(values['completion_tokens'] for values in fields.values()),
+				'cost': sum(values['cost'] for values in fields.values())
+			}
+
+
+class FlowMetrics:
+	"""
+	Collects the measurements of every document processed by the pipeline. Each finished document is
+	logged as a JSON line, and totals can be exported in Prometheus text format.
+	"""
+
+	def __init__(self, prometheus_path: str = None) -> None:
+		"""
+		Initializes the collector.
+
+		:param prometheus_path: str, optional file rewritten with the totals after every document, for a local scraper.
+		"""
+		self.prometheus_path = prometheus_path
+		self.documents = {}
+		self.documents_total = 0
+		self.pages_total = 0
+		self.chars_total = 0
+		self.stages_total = defaultdict(float)
+		self.fields_total = defaultdict(lambda: defaultdict(float))
+		self.lock = threading.Lock()
+
+
+	def document(self, file_path: str) -> DocumentMetrics:
+		"""
+		Returns the measurements of a document in progress, creating them if needed.
+
+		:param file_path: str, path to the PDF file.
+		:returns: DocumentMetrics, measurements of the document.
+		"""
+		with self.lock:
+			if file_path not in self.documents:
+				self.documents[file_path] = DocumentMetrics(file_path)
+
+			return self.documents[file_path]
+
+
+	def finish_document(self, file_path: str) -> dict:
+		"""
+		Closes the measurements of a document, logging them as a JSON line and adding them to the totals.
+
+		:param file_path: str, path to the PDF file.
+		:returns: dict, measurements of the document.
+		"""
+		with self.lock:
+			document_metrics = self.documents.pop(file_path, None)
+		if document_metrics is None:
+			return {}
+
+		metrics = document_metrics.to_dict()
+		logging.info(json.dumps(metrics))
+
+		with self.lock:
+			self.documents_total += 1
+			self.pages_total += metrics['page_count']
+			self.chars_total += metrics['char_count']
+			for stage, seconds in metrics['stages'].items():
+				self.stages_total[stage] += seconds
+			for field, values in metrics['fields'].items():
+				for name, value in values.items():
+					self.fields_total[field][name] += value
+
+		if self.prometheus_path:
+			self.write_prometheus(self.prometheus_path)
+
+		return metrics
+
+
+	def to_prometheus(self) -> str:
+		"""
+		Renders the totals in Prometheus text exposition format.
+
+		:returns: str, metrics in Prometheus text format.
+		"""
+		lines = []
+
+		def add_metric(name: str, help_text: str, samples: list) -> None:
+			lines.append(f"# HELP {name} {help_text}")
+			lines.append(f"# TYPE {name} counter")
+			for labels, value in samples:
+				label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+				lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+		with self.lock:
+			add_metric('paper_documents_total', "Documents processed.", [({}, self.documents_total)])
+			add_metric('paper_pages_total', "PDF pages processed.", [({}, self.pages_total)])
+			add_metric('paper_characters_total', "Characters of processed text.", [({}, self.chars_total)])
+			add_metric('paper_stage_seconds_total', "Wall time spent in each pipeline stage.", [
+				({'stage': stage}, seconds) for stage, seconds in sorted(self.stages_total.items())
+			])
+
+			fields = sorted(self.fields_total.items())
+			add_metric('paper_prompt_calls_total', "Prompts run for each field.", [
+				({'field': field}, int(values['calls'])) for field, values in fields
+			])
+			add_metric('paper_prompt_cache_hits_total', "Prompts answered from the cache for each field.", [
+				({'field': field}, int(values['cache_hits'])) for field, values in fields
+			])
+			add_metric('paper_prompt_seconds_total', "Wall time spent in prompts for each field.", [
+				({'field': field}, values['seconds']) for field, values in fields
+			])
+			add_metric('paper_prompt_tokens_total', "Tokens used by prompts for each field.", [
+				({'field': field, 'type': token_type}, int(values[f'{token_type}_tokens']))
+				for field, values in fields for token_type in ('prompt', 'completion')
+			])
+			add_metric('paper_prompt_cost_usd_total', "Estimated cost of prompts for each field.", [
+				({'field': field}, values['cost']) for field, values in fields
+			])
+
+		return '\n'.join(lines) + '\n'
+
+
+	def write_prometheus(self, path: str) -> None:
+		"""
+		Writes the totals in Prometheus text format, replacing the file atomically so that a
+		scraper never reads a partial file.
+
+		:param path: str, path to the metrics file.
+		"""
+		temporary_path = f"{path}.tmp"
+		with open(temporary_path, 'w') as f:
+			f.write(self.to_prometheus())
+		os.replace(temporary_path, path)
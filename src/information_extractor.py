@@ -1,197 +1,768 @@
-import datetime
-from openai import OpenAIError
-from langchain.chains import LLMChain
-from langchain_community.llms import OpenAI
-from langchain.prompts import PromptTemplate
-
-class InformationExtractor:
-	"""
-	Extracts structured data from text using OpenAI from LangChain.
-	"""
-
-	def __init__(self, raw_text: str, openai_api_key: str) -> None:
-		"""
-		Initializes the InformationExtractor with API credentials.
-		:param: raw_text: str, text to be analyzed.
-		:param openai_api_key: str, OpenAI API key.
-		"""
-		self.raw_text = raw_text
-
-		# Initialize OpenAI model through LangChain
-		self.llm = OpenAI(api_key=openai_api_key)
-
-		# Variables to store extracted data
-		self.title = ""
-		self.authors = ""
-		self.publication_date = ""
-		self.abstract = ""
-		self.key_findings = ""
-		self.methodology = ""
-		self.summary = ""
-		self.keywords = []
-
-
-	def set_raw_text(self, raw_text: str) -> str:
-		"""
-		Sets and returns class variable with raw text to extract information.
-
-		:param: raw_text: str, text to be analyzed.
-		:returns: str, text to be analyzed.
-		"""
-		self.raw_text = raw_text
-
-		return self.raw_text
-
-
-	def run_prompt(self, prompt_template: PromptTemplate) -> str:
-		"""
-		General method to run a given prompt through the LLM.
-
-		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
-		:returns: str, response from the LLM.
-		"""
-		# Setup the prompt
-		llm_chain = LLMChain(llm=self.llm, prompt=prompt_template)
-		
-		# Obtain and return the response
-		try:
-			response = llm_chain.invoke(prompt_template.format(text=self.raw_text)).strip()
-		except OpenAIError as e:
-			response = f"An error occurred: {e}"
-		except Exception as e:
-			response = f"Unexpected error: {e}"
-		return response
-
-
-	def extract_title(self) -> str:
-		"""
-		Extracts title from the text.
-
-		:returns: str, research paper's title.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Extract the title of the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def extract_authors(self) -> str:
-		"""
-		Extracts author(s) from the text.
-
-		:returns: str, author(s) of the research paper.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Extract the author(s) of the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def extract_publication_date(self) -> str:
-		"""
-		Extracts publication date from the text.
-
-		:returns: str, research paper's publication date.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Extract the publication date of the following scientific research paper, format as YYYY/MM/DD:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def extract_abstract(self) -> str:
-		"""
-		Extracts abstract from the text.
-
-		:returns: str, research paper's abstract.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Extract the abstract of the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def extract_key_findings(self) -> str:
-		"""
-		Extracts key research findings from the text.
-
-		:returns: str, key findings from the research paper.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Identify key findings in the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def extract_methodology(self) -> str:
-		"""
-		Extracts methodology from the text.
-
-		:returns: str, methodology from the research paper.
-		"""
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Identify the methodology used in the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def generate_summary(self) -> str:
-		"""
-		Generates a text summary.
-
-		:returns: str, research paper's summary.
-		"""
-
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Generate a brief summary of the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def generate_keywords(self) -> str:
-		"""
-		Generates keywords of the text.
-
-		:returns: str, research paper's keywords.
-		"""
-
-		prompt_template = PromptTemplate(
-			input_variables=['text'],
-			template="Generate keywords for the following scientific research paper:\n{text}"
-		)
-
-		return self.run_prompt(prompt_template)
-
-
-	def get_extracted_data(self) -> dict:
-		"""
-		Retrieves all extracted data as a dictionary.
-
-		:returns: dict, dictionary containing all extracted information.
-		"""
-		return {
-			'utc_timestamp': datetime.datetime.now(datetime.timezone.utc).strftime("%Y/%m/%d %H:%M:%S"),
-			'title': self.extract_title(),
-			'authors': self.extract_authors(),
-			'publication_date': self.extract_publication_date(),
-			'abstract': self.extract_abstract(),
-			'findings': self.extract_key_findings(),
-			'methodology': self.extract_methodology(),
-			'summary': self.generate_summary(),
-			'keywords': self.generate_keywords()
-		}
-	
\ No newline at end of file
+import json
+import time
+import asyncio
+import logging
+import datetime
+from dataclasses import dataclass
+from openai import OpenAIError, RateLimitError
+from langchain.chains import LLMChain
+from langchain_community.llms import OpenAI
+from langchain.prompts import PromptTemplate
+from langchain_community.callbacks import get_openai_callback
+from src.data_storer import DataStorer
+from src.extraction_result import ExtractionResult
+from src.text_chunker import TextChunker
+from src.response_cache import ResponseCache
+from src.flow_metrics import DocumentMetrics
+from src.rate_limiter import RateLimiter
+
+
+@dataclass
+class ExtractionFailure:
+	"""
+	Field that could not be extracted, returned in place of its value so that errors
+	are never mistaken for an answer of the LLM and stored.
+	"""
+	field: str
+	error_type: str
+	message: str
+	attempts: int = 1
+
+
+	def __str__(self) -> str:
+		return f"Failed to extract {self.field} after {self.attempts} attempt(s): {self.error_type}: {self.message}"
+
+
+	@staticmethod
+	def find(extracted_data: dict) -> list:
+		"""
+		Lists the failed fields of extracted data.
+
+		:param extracted_data: dict, extracted data, field name to value.
+		:returns: list of ExtractionFailure, failures found in the data.
+		"""
+		return [value for value in (extracted_data or {}).values() if isinstance(value, ExtractionFailure)]
+
+
+class InformationExtractor:
+	"""
+	Extracts structured data from text using OpenAI from LangChain.
+	"""
+
+	# Prompt used to extract each schema field on its own
+	FIELD_PROMPTS = {
+		'title': "Extract the title of the following scientific research paper:\n{text}",
+		'authors': "Extract the author(s) of the following scientific research paper:\n{text}",
+		'publication_date': "Extract the publication date of the following scientific research paper, format as YYYY/MM/DD:\n{text}",
+		'abstract': "Extract the abstract of the following scientific research paper:\n{text}",
+		'findings': "Identify key findings in the following scientific research paper:\n{text}",
+		'methodology': "Identify the methodology used in the following scientific research paper:\n{text}",
+		'summary': "Generate a brief summary of the following scientific research paper:\n{text}",
+		'keywords': "Generate keywords for the following scientific research paper:\n{text}"
+	}
+
+	# Fields that need the whole paper, extracted by map-reduce over its chunks when chunking is enabled,
+	# the remaining fields only read the first chunks
+	MAP_REDUCE_FIELDS = ('findings', 'methodology', 'summary')
+
+	# Sections holding each field, matched against the section index of the document
+	FIELD_SECTIONS = {
+		'title': ('front matter',),
+		'authors': ('front matter',),
+		'publication_date': ('front matter',),
+		'abstract': ('abstract',),
+		'findings': ('result', 'discussion', 'conclusion', 'finding'),
+		'methodology': ('method', 'materials', 'experimental setup', 'approach'),
+		'keywords': ('abstract', 'keywords', 'index terms')
+	}
+
+	# Minimum length of the section text for it to replace the whole text
+	MIN_SECTION_LENGTH = 50
+
+	# Reduce rounds of a map-reduce, the last one reduces answers cut to fit a single prompt
+	MAX_REDUCE_ROUNDS = 3
+
+
+	def __init__(self, raw_text: str, openai_api_key: str, cache: ResponseCache = None, chunker: TextChunker = None, head_chunks: int = 1, sections: dict = None, metadata: dict = None, metadata_threshold: float = 0.8, metrics: DocumentMetrics = None, llm: OpenAI = None, rate_limiter: RateLimiter = None, chains: dict = None) -> None:
+		"""
+		Initializes the InformationExtractor with API credentials.
+		:param: raw_text: str, text to be analyzed.
+		:param openai_api_key: str, OpenAI API key.
+		:param cache: ResponseCache, optional cache of LLM responses.
+		:param chunker: TextChunker, optional splitter enabling token-aware extraction of long papers.
+		:param head_chunks: int, number of leading chunks read by the fields that do not need the whole paper.
+		:param sections: dict, optional section index of the text, section name to (start, end) offsets.
+		:param metadata: dict, optional bibliographic metadata read from the PDF, field name to value and confidence.
+		:param metadata_threshold: float, minimum confidence for a metadata value to be used instead of the LLM.
+		:param metrics: DocumentMetrics, optional collector of the time, tokens and cost of each prompt.
+		:param llm: OpenAI, optional model shared with other extractors, reusing its HTTP connections. A new one is created when not given.
+		:param rate_limiter: RateLimiter, optional limiter shared by every extractor, pacing the calls and retrying transient errors.
+		:param chains: dict, optional chains shared with the other extractors of the same LLM, prompt template to chain.
+		"""
+		self.raw_text = raw_text
+		self.cache = cache
+		self.chunker = chunker
+		self.head_chunks = head_chunks
+		self.sections = sections or {}
+		self.metadata = metadata or {}
+		self.metadata_threshold = metadata_threshold
+		self.metrics = metrics
+		self.rate_limiter = rate_limiter
+		self.chunks = {}
+
+		# Field measured for each prompt template, reduce and combined prompts are registered when built
+		self.prompt_fields = {template: field for field, template in self.FIELD_PROMPTS.items()}
+
+		# Initialize OpenAI model through LangChain, retries are left to the rate limiter when there is one
+		llm_arguments = {'max_retries': 0} if rate_limiter is not None else {}
+		self.llm = llm or OpenAI(api_key=openai_api_key, **llm_arguments)
+
+		# Chains built once per prompt template and reused for every document, and by every extractor sharing them
+		self.chains = {} if chains is None else chains
+
+		# Variables to store extracted data
+		self.title = ""
+		self.authors = ""
+		self.publication_date = ""
+		self.abstract = ""
+		self.key_findings = ""
+		self.methodology = ""
+		self.summary = ""
+		self.keywords = []
+
+
+	def set_raw_text(self, raw_text: str, sections: dict = None, metadata: dict = None, metrics: DocumentMetrics = None) -> str:
+		"""
+		Sets and returns class variable with raw text to extract information.
+		This is the only change needed to reuse the extractor, its model and chains for another document.
+
+		:param: raw_text: str, text to be analyzed.
+		:param: sections: dict, optional section index of the text, section name to (start, end) offsets.
+		:param: metadata: dict, optional bibliographic metadata read from the PDF.
+		:param: metrics: DocumentMetrics, optional collector of the prompts of the document.
+		:returns: str, text to be analyzed.
+		"""
+		self.raw_text = raw_text
+		self.sections = sections or {}
+		self.metadata = metadata or {}
+		self.metrics = metrics
+		self.chunks = {}
+
+		return self.raw_text
+
+
+	def run_prompt(self, prompt_template: PromptTemplate, text: str = None) -> str:
+		"""
+		General method to run a given prompt through the LLM.
+
+		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
+		:param text: str, text to run the prompt on, defaults to the whole raw text.
+		:returns: str, response from the LLM, or ExtractionFailure if the LLM could not answer.
+		"""
+		text = self.raw_text if text is None else text
+
+		# Reuse the response of an identical prompt if cached
+		cache_key = self.get_cache_key(prompt_template, text)
+		if cache_key is not None:
+			start = time.perf_counter()
+			response = self.cache.get(cache_key)
+			if response is not None:
+				self.record_prompt(prompt_template, start, cache_hit=True)
+				return response
+
+		# Setup the prompt
+		llm_chain = self.get_chain(prompt_template)
+		estimated_tokens = self.estimate_tokens(prompt_template, text)
+
+		# Obtain and return the response, retrying transient errors
+		attempt = 0
+		while True:
+			attempt += 1
+			if self.rate_limiter is not None:
+				self.rate_limiter.acquire(estimated_tokens)
+
+			start = time.perf_counter()
+			with get_openai_callback() as callback:
+				try:
+					response = llm_chain.invoke({'text': text})['text'].strip()
+					break
+				except Exception as e:
+					retry_delay = self.get_retry_delay(e, attempt)
+					if retry_delay is None:
+						return self.make_failure(prompt_template, e, attempt)
+				finally:
+					self.record_prompt(prompt_template, start, callback, estimated_tokens=estimated_tokens)
+
+			time.sleep(retry_delay)
+
+		if self.rate_limiter is not None:
+			self.rate_limiter.record_success()
+		if cache_key is not None:
+			self.cache.set(cache_key, response)
+		return response
+
+
+	async def arun_prompt(self, prompt_template: PromptTemplate, text: str = None) -> str:
+		"""
+		Asynchronous version of run_prompt, using the async interface of the LLM.
+
+		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
+		:param text: str, text to run the prompt on, defaults to the whole raw text.
+		:returns: str, response from the LLM, or ExtractionFailure if the LLM could not answer.
+		"""
+		text = self.raw_text if text is None else text
+
+		# Reuse the response of an identical prompt if cached
+		cache_key = self.get_cache_key(prompt_template, text)
+		if cache_key is not None:
+			start = time.perf_counter()
+			response = self.cache.get(cache_key)
+			if response is not None:
+				self.record_prompt(prompt_template, start, cache_hit=True)
+				return response
+
+		# Setup the prompt
+		llm_chain = self.get_chain(prompt_template)
+		estimated_tokens = self.estimate_tokens(prompt_template, text)
+
+		# Obtain and return the response, retrying transient errors
+		attempt = 0
+		while True:
+			attempt += 1
+			if self.rate_limiter is not None:
+				await self.rate_limiter.aacquire(estimated_tokens)
+
+			start = time.perf_counter()
+			with get_openai_callback() as callback:
+				try:
+					response = (await llm_chain.ainvoke({'text': text}))['text'].strip()
+					break
+				except Exception as e:
+					retry_delay = self.get_retry_delay(e, attempt)
+					if retry_delay is None:
+						return self.make_failure(prompt_template, e, attempt)
+				finally:
+					self.record_prompt(prompt_template, start, callback, estimated_tokens=estimated_tokens)
+
+			await asyncio.sleep(retry_delay)
+
+		if self.rate_limiter is not None:
+			self.rate_limiter.record_success()
+		if cache_key is not None:
+			self.cache.set(cache_key, response)
+		return response
+
+
+	def estimate_tokens(self, prompt_template: PromptTemplate, text: str) -> int:
+		"""
+		Estimates the tokens of a call before sending it, counting the prompt and the longest possible completion.
+
+		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
+		:param text: str, text the prompt is run on.
+		:returns: int, estimated number of tokens, 0 when no rate limiter needs it.
+		"""
+		if self.rate_limiter is None:
+			return 0
+
+		max_tokens = getattr(self.llm, 'max_tokens', None)
+		completion_tokens = max_tokens if isinstance(max_tokens, int) and max_tokens > 0 else 256
+
+		return TextChunker.count_tokens(prompt_template.template) + TextChunker.count_tokens(text) + completion_tokens
+
+
+	def get_retry_delay(self, error: Exception, attempt: int) -> float:
+		"""
+		Decides whether a failed call is retried. Only transient errors are retried, and only with a rate limiter.
+
+		:param error: Exception, error raised by the call.
+		:param attempt: int, number of attempts already made.
+		:returns: float, seconds to wait before retrying, or None to give up.
+		"""
+		if self.rate_limiter is None or not self.rate_limiter.is_retryable(error) or attempt > self.rate_limiter.max_retries:
+			return None
+
+		retry_after = self.rate_limiter.get_retry_after(error)
+		if isinstance(error, RateLimitError):
+			self.rate_limiter.record_rate_limit(retry_after)
+
+		delay = self.rate_limiter.get_backoff_delay(attempt, retry_after)
+		logging.warning(f"LLM call failed ({type(error).__name__}), retrying in {delay:.1f}s.")
+
+		return delay
+
+
+	def make_failure(self, prompt_template: PromptTemplate, error: Exception, attempts: int) -> ExtractionFailure:
+		"""
+		Builds the failure returned for a prompt the LLM could not answer.
+
+		:param prompt_template: PromptTemplate, prompt processed by the LLM.
+		:param error: Exception, last error raised by the call.
+		:param attempts: int, number of attempts made.
+		:returns: ExtractionFailure, description of the failure.
+		"""
+		failure = ExtractionFailure(
+			field=self.prompt_fields.get(prompt_template.template, 'other'),
+			error_type=type(error).__name__ if isinstance(error, OpenAIError) else f"Unexpected {type(error).__name__}",
+			message=str(error),
+			attempts=attempts
+		)
+		logging.error(str(failure))
+
+		return failure
+
+
+	def get_chain(self, prompt_template: PromptTemplate) -> LLMChain:
+		"""
+		Returns the chain running a prompt, built on first use.
+
+		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
+		:returns: LLMChain, chain running the prompt through the LLM.
+		"""
+		chain = self.chains.get(prompt_template.template)
+		if chain is None:
+			# Extractors of other threads may build the same chain, only the first one stored is kept
+			chain = self.chains.setdefault(prompt_template.template, LLMChain(llm=self.llm, prompt=prompt_template))
+
+		return chain
+
+
+	def record_prompt(self, prompt_template: PromptTemplate, start: float, callback=None, cache_hit: bool = False, estimated_tokens: int = 0) -> None:
+		"""
+		Records the time, tokens and cost of a prompt in the document metrics, if any,
+		and corrects the rate limiter with the tokens actually used.
+
+		:param prompt_template: PromptTemplate, prompt processed by the LLM.
+		:param start: float, value of time.perf_counter when the prompt started.
+		:param callback: OpenAICallbackHandler, token and cost counters of the LLM call, None for cached responses.
+		:param cache_hit: bool, whether the response came from the cache.
+		:param estimated_tokens: int, tokens reserved from the rate limiter for the call.
+		"""
+		if self.rate_limiter is not None and callback is not None:
+			self.rate_limiter.record_usage(estimated_tokens, callback.total_tokens)
+
+		if self.metrics is None:
+			return
+
+		self.metrics.record_prompt(
+			self.prompt_fields.get(prompt_template.template, 'other'),
+			time.perf_counter() - start,
+			prompt_tokens=callback.prompt_tokens if callback else 0,
+			completion_tokens=callback.completion_tokens if callback else 0,
+			cost=callback.total_cost if callback else 0.0,
+			cache_hit=cache_hit
+		)
+
+
+	def get_cache_key(self, prompt_template: PromptTemplate, text: str) -> str:
+		"""
+		Builds the cache key of a prompt run on a text. Error responses are never cached.
+
+		:param prompt_template: PromptTemplate, prompt to be processed by the LLM.
+		:param text: str, text the prompt is run on.
+		:returns: str, cache key, or None when no cache is used.
+		"""
+		if self.cache is None:
+			return None
+
+		model_name = getattr(self.llm, 'model_name', type(self.llm).__name__)
+		return self.cache.make_key(model_name, prompt_template.template, text)
+
+
+	def get_prompt_template(self, field: str) -> PromptTemplate:
+		"""
+		Builds the prompt used to extract a single field.
+
+		:param field: str, name of the schema field.
+		:returns: PromptTemplate, prompt to extract the field.
+		"""
+		return PromptTemplate(
+			input_variables=['text'],
+			template=self.FIELD_PROMPTS[field]
+		)
+
+
+	def get_reduce_prompt_template(self, field: str) -> PromptTemplate:
+		"""
+		Builds the prompt combining the partial answers obtained from each chunk of the paper.
+
+		:param field: str, name of the schema field.
+		:returns: PromptTemplate, prompt to combine the partial answers.
+		"""
+		instruction = self.FIELD_PROMPTS[field].split('\n{text}')[0].rstrip(':')
+		template = (
+			"The following are partial answers, each obtained from a different part of the same scientific "
+			f"research paper, to the request \"{instruction}\". Combine them into a single answer:\n{{text}}"
+		)
+		self.prompt_fields[template] = f'{field}:reduce'
+
+		return PromptTemplate(input_variables=['text'], template=template)
+
+
+	def get_metadata_value(self, field: str) -> str:
+		"""
+		Returns the value of a field read from the PDF metadata, if confident enough.
+
+		:param field: str, name of the schema field.
+		:returns: str, value from the metadata, or None if the LLM is needed.
+		"""
+		entry = self.metadata.get(field)
+		if entry and entry['confidence'] >= self.metadata_threshold:
+			return entry['value']
+
+		return None
+
+
+	def get_field_text(self, field: str) -> str:
+		"""
+		Gathers the text of the sections relevant to a field, in document order.
+
+		:param field: str, name of the schema field.
+		:returns: str, text of the relevant sections, or None to fall back to the whole text.
+		"""
+		names = self.FIELD_SECTIONS.get(field, ())
+		spans = sorted(
+			span for name, span in self.sections.items()
+			if any(keyword in name for keyword in names)
+		)
+		text = '\n'.join(self.raw_text[start:end].strip() for start, end in spans)
+
+		return text if len(text) >= self.MIN_SECTION_LENGTH else None
+
+
+	def get_chunks(self, text: str = None) -> list:
+		"""
+		Splits a text into chunks, computed once per text.
+
+		:param text: str, text to be split, defaults to the whole raw text.
+		:returns: list of str, chunks of the text.
+		"""
+		text = self.raw_text if text is None else text
+		if text not in self.chunks:
+			self.chunks[text] = self.chunker.chunk(text)
+
+		return self.chunks[text]
+
+
+	def map_reduce(self, field: str, chunks: list) -> str:
+		"""
+		Extracts a field from each chunk and combines the partial answers until they fit in one prompt.
+
+		:param field: str, name of the schema field.
+		:param chunks: list of str, chunks of the text.
+		:returns: str, combined answer.
+		"""
+		partials = [self.run_prompt(self.get_prompt_template(field), text=chunk) for chunk in chunks]
+		for reduce_round in range(1, self.MAX_REDUCE_ROUNDS + 1):
+			# A missing part would silently change the answer, fail the whole field instead
+			failures = ExtractionFailure.find(dict(enumerate(partials)))
+			if failures:
+				return failures[0]
+
+			groups = self.get_reduce_groups(partials, reduce_round)
+			partials = [self.run_prompt(self.get_reduce_prompt_template(field), text=group) for group in groups]
+			if len(groups) == 1:
+				return partials[0]
+
+
+	async def amap_reduce(self, field: str, chunks: list, semaphore: asyncio.Semaphore = None) -> str:
+		"""
+		Asynchronous version of map_reduce, running the prompts of each step concurrently.
+
+		:param field: str, name of the schema field.
+		:param chunks: list of str, chunks of the text.
+		:param semaphore: asyncio.Semaphore, optional limit of the prompts running at the same time.
+		:returns: str, combined answer.
+		"""
+		partials = await asyncio.gather(*(self.arun_limited_prompt(self.get_prompt_template(field), chunk, semaphore) for chunk in chunks))
+		for reduce_round in range(1, self.MAX_REDUCE_ROUNDS + 1):
+			failures = ExtractionFailure.find(dict(enumerate(partials)))
+			if failures:
+				return failures[0]
+
+			groups = self.get_reduce_groups(partials, reduce_round)
+			partials = await asyncio.gather(*(self.arun_limited_prompt(self.get_reduce_prompt_template(field), group, semaphore) for group in groups))
+			if len(groups) == 1:
+				return partials[0]
+
+
+	def get_reduce_groups(self, partials: list, reduce_round: int) -> list:
+		"""
+		Packs partial answers into the texts of the next reduce prompts. Answers larger than half of the
+		token budget would never fit together, so in the last round each one is cut to an equal share
+		of the budget and all of them are reduced by a single prompt.
+
+		:param partials: list of str, partial answers.
+		:param reduce_round: int, number of the reduce round, starting at 1.
+		:returns: list of str, texts of the reduce prompts.
+		"""
+		groups = self.chunker.chunk('\n\n'.join(partials))
+		if len(groups) > 1 and reduce_round >= self.MAX_REDUCE_ROUNDS:
+			share = max(1, self.chunker.max_tokens // len(partials))
+			groups = ['\n\n'.join(self.chunker.truncate(partial, share) for partial in partials)]
+
+		return groups
+
+
+	def extract_field(self, field: str) -> str:
+		"""
+		Extracts a single field, reading only its relevant sections when the document has a section index.
+		When chunking is enabled, fields that need the whole paper are extracted by map-reduce over its
+		chunks and the others only read the first chunks. No LLM is called for fields found in the PDF
+		metadata with enough confidence.
+
+		:param field: str, name of the schema field.
+		:returns: str, extracted value.
+		"""
+		# Bibliographic fields are taken from the PDF metadata when it is reliable enough
+		value = self.get_metadata_value(field)
+		if value is not None:
+			return value
+
+		text = self.get_field_text(field)
+
+		if self.chunker is not None:
+			chunks = self.get_chunks(text)
+			if len(chunks) > 1:
+				if field in self.MAP_REDUCE_FIELDS:
+					return self.map_reduce(field, chunks)
+				text = '\n'.join(chunks[:self.head_chunks])
+
+		return self.run_prompt(self.get_prompt_template(field), text=text)
+
+
+	async def aextract_field(self, field: str, semaphore: asyncio.Semaphore = None) -> str:
+		"""
+		Asynchronous version of extract_field.
+
+		:param field: str, name of the schema field.
+		:param semaphore: asyncio.Semaphore, optional limit of the prompts running at the same time.
+		:returns: str, extracted value.
+		"""
+		value = self.get_metadata_value(field)
+		if value is not None:
+			return value
+
+		text = self.get_field_text(field)
+
+		if self.chunker is not None:
+			chunks = self.get_chunks(text)
+			if len(chunks) > 1:
+				if field in self.MAP_REDUCE_FIELDS:
+					return await self.amap_reduce(field, chunks, semaphore)
+				text = '\n'.join(chunks[:self.head_chunks])
+
+		return await self.arun_limited_prompt(self.get_prompt_template(field), text, semaphore)
+
+
+	async def arun_limited_prompt(self, prompt_template: PromptTemplate, text: str = None, semaphore: asyncio.Semaphore = None) -> str:
+		"""
+		Runs a prompt asynchronously once the concurrency limit allows it.
+
+		:param prompt_template: PromptTemplate, template of the prompt.
+		:param text: str, text of the prompt, defaults to the raw text.
+		:param semaphore: asyncio.Semaphore, optional limit of the prompts running at the same time.
+		:returns: str, response from the LLM.
+		"""
+		if semaphore is None:
+			return await self.arun_prompt(prompt_template, text=text)
+
+		async with semaphore:
+			return await self.arun_prompt(prompt_template, text=text)
+
+
+	def extract_title(self) -> str:
+		"""
+		Extracts title from the text.
+
+		:returns: str, research paper's title.
+		"""
+		return self.extract_field('title')
+
+
+	def extract_authors(self) -> str:
+		"""
+		Extracts author(s) from the text.
+
+		:returns: str, author(s) of the research paper.
+		"""
+		return self.extract_field('authors')
+
+
+	def extract_publication_date(self) -> str:
+		"""
+		Extracts publication date from the text.
+
+		:returns: str, research paper's publication date.
+		"""
+		return self.extract_field('publication_date')
+
+
+	def extract_abstract(self) -> str:
+		"""
+		Extracts abstract from the text.
+
+		:returns: str, research paper's abstract.
+		"""
+		return self.extract_field('abstract')
+
+
+	def extract_key_findings(self) -> str:
+		"""
+		Extracts key research findings from the text.
+
+		:returns: str, key findings from the research paper.
+		"""
+		return self.extract_field('findings')
+
+
+	def extract_methodology(self) -> str:
+		"""
+		Extracts methodology from the text.
+
+		:returns: str, methodology from the research paper.
+		"""
+		return self.extract_field('methodology')
+
+
+	def generate_summary(self) -> str:
+		"""
+		Generates a text summary.
+
+		:returns: str, research paper's summary.
+		"""
+		return self.extract_field('summary')
+
+
+	def generate_keywords(self) -> str:
+		"""
+		Generates keywords of the text.
+
+		:returns: str, research paper's keywords.
+		"""
+		return self.extract_field('keywords')
+
+
+	def extract_all_fields(self) -> str:
+		"""
+		Extracts every field of the schema with a single prompt.
+
+		:returns: str, JSON object returned by the LLM.
+		"""
+		prompt_template = PromptTemplate(
+			input_variables=['text'],
+			template=(
+				"Extract the following information from the scientific research paper below and answer only "
+				"with a JSON object with these keys:\n"
+				"- \"title\": title of the paper\n"
+				"- \"authors\": author(s) of the paper\n"
+				"- \"publication_date\": publication date, format as YYYY/MM/DD\n"
+				"- \"abstract\": abstract of the paper\n"
+				"- \"findings\": key findings of the paper\n"
+				"- \"methodology\": methodology used in the paper\n"
+				"- \"summary\": brief summary of the paper\n"
+				"- \"keywords\": list of keywords for the paper\n"
+				"{text}"
+			)
+		)
+		self.prompt_fields[prompt_template.template] = 'combined'
+
+		return self.run_prompt(prompt_template)
+
+
+	def parse_combined_response(self, response: str) -> dict:
+		"""
+		Parses the JSON answer of the combined prompt and validates it against the BigQuery schema.
+		Fields missing from the answer or with a value that cannot be normalized are left out of the result.
+
+		:param response: str, response from the LLM to the combined prompt.
+		:returns: dict, valid fields found in the response.
+		"""
+		# A failed combined prompt leaves every field to its own prompt
+		if not isinstance(response, str):
+			return {}
+
+		# Keep only the outermost JSON object, models sometimes wrap it with text or code fences
+		start, end = response.find('{'), response.rfind('}')
+		if start == -1 or end <= start:
+			return {}
+
+		try:
+			parsed = json.loads(response[start:end + 1])
+		except ValueError:
+			return {}
+
+		if not isinstance(parsed, dict):
+			return {}
+
+		valid_data = {}
+		for field in DataStorer.create_schema():
+			if field.name not in self.FIELD_PROMPTS:
+				continue
+
+			value = parsed.get(field.name)
+			if field.mode == 'REPEATED':
+				if not isinstance(value, (str, list)):
+					continue
+				value = ExtractionResult.parse_keywords(value)
+				if not value:
+					continue
+			elif isinstance(value, str) and value.strip():
+				value = value.strip()
+				# Dates are kept as answered, so that ExtractionResult still knows their precision
+				if field.field_type == 'DATETIME' and ExtractionResult.parse_date(value)[0] is None:
+					continue
+			else:
+				continue
+
+			valid_data[field.name] = value
+
+		return valid_data
+
+
+	def get_extracted_data(self, combined: bool = False) -> dict:
+		"""
+		Retrieves all extracted data as a dictionary.
+
+		When combined is set, every field is requested with a single prompt and only the fields
+		whose value fails validation are extracted again with their own prompt. Answers are normalized
+		to the types of the table schema through an ExtractionResult.
+
+		:param combined: bool, whether to extract all fields with a single prompt.
+		:returns: dict, dictionary containing all extracted information, with an ExtractionFailure for each field that could not be extracted.
+		"""
+		extracted_data = {
+			'utc_timestamp': datetime.datetime.now(datetime.timezone.utc).strftime("%Y/%m/%d %H:%M:%S")
+		}
+
+		# Confident metadata values take precedence over any LLM answer
+		for field in self.FIELD_PROMPTS:
+			value = self.get_metadata_value(field)
+			if value is not None:
+				extracted_data[field] = value
+
+		if combined:
+			for field, value in self.parse_combined_response(self.extract_all_fields()).items():
+				extracted_data.setdefault(field, value)
+
+		# Extract individually every field not already obtained
+		for field in self.FIELD_PROMPTS:
+			if field not in extracted_data:
+				extracted_data[field] = self.extract_field(field)
+
+		return ExtractionResult.from_dict(extracted_data).to_dict()
+
+
+	async def aget_extracted_data(self, max_concurrency: int = 8) -> dict:
+		"""
+		Retrieves all extracted data as a dictionary, running the prompt of every field concurrently.
+		Answers are normalized to the types of the table schema through an ExtractionResult.
+
+		:param max_concurrency: int, maximum number of prompts running at the same time.
+		:returns: dict, dictionary containing all extracted information, with an ExtractionFailure for each field that could not be extracted.
+		"""
+		# The limit applies to every prompt, including those of the chunks of map-reduce fields
+		semaphore = asyncio.Semaphore(max_concurrency)
+		utc_timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y/%m/%d %H:%M:%S")
+		responses = await asyncio.gather(*(self.aextract_field(field, semaphore) for field in self.FIELD_PROMPTS))
+
+		return ExtractionResult.from_dict({'utc_timestamp': utc_timestamp, **dict(zip(self.FIELD_PROMPTS, responses))}).to_dict()
@@ -0,0 +1,292 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+import httpx
+import openai
+from pydantic import PrivateAttr
+from langchain_core.language_models.llms import LLM, BaseLLM
+from langchain_community.llms import OpenAI
+from src.rate_limiter import RateLimiter
+
+
+class CassetteLLM(LLM):
+	"""
+	LLM answering from a cassette file of recorded responses, keyed by the hash of the prompt.
+	In replay mode prompts missing from the cassette are an error, in record mode they are sent
+	to a real LLM and its response is appended to the cassette, a JSON Lines file with one
+	{"key", "response"} object per line, later lines replacing earlier ones.
+	"""
+
+	cassette_path: str
+	record: bool = False
+	llm: Optional[BaseLLM] = None
+
+	_responses: Dict[str, str] = PrivateAttr(default_factory=dict)
+	_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+
+	def __init__(self, **kwargs: Any) -> None:
+		"""
+		Initializes the LLM, loading the cassette if it exists.
+
+		:param cassette_path: str, path to the JSON Lines cassette file.
+		:param record: bool, whether to record the responses of prompts missing from the cassette.
+		:param llm: BaseLLM, LLM answering the prompts to record.
+		"""
+		super().__init__(**kwargs)
+		if self.record and self.llm is None:
+			raise ValueError("Recording a cassette needs an LLM to answer the prompts.")
+
+		if os.path.exists(self.cassette_path):
+			with open(self.cassette_path) as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						# Last line cut by an interrupted recording
+						continue
+					self._responses[entry['key']] = entry['response']
+
+
+	@property
+	def _llm_type(self) -> str:
+		return 'cassette'
+
+
+	@property
+	def _identifying_params(self) -> Dict[str, Any]:
+		return {'cassette_path': self.cassette_path}
+
+
+	@staticmethod
+	def make_key(prompt: str) -> str:
+		"""
+		Builds the key of a prompt in the cassette.
+
+		:param prompt: str, formatted prompt.
+		:returns: str, hexadecimal SHA-256 hash of the prompt.
+		"""
+		return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+	def lookup(self, prompt: str) -> str:
+		"""
+		Looks up the recorded response of a prompt.
+
+		:param prompt: str, formatted prompt.
+		:returns: str, recorded response, or None if missing in record mode.
+		"""
+		with self._lock:
+			response = self._responses.get(self.make_key(prompt))
+
+		if response is None and not self.record:
+			raise KeyError(f"No response recorded in {self.cassette_path} for prompt: {prompt[:80]!r}")
+
+		return response
+
+
+	def save_response(self, prompt: str, response: str) -> None:
+		"""
+		Adds a response to the cassette, appending it to the file so that recording stays linear in the number of responses.
+
+		:param prompt: str, formatted prompt.
+		:param response: str, response from the recording LLM.
+		"""
+		key = self.make_key(prompt)
+		with self._lock:
+			self._responses[key] = response
+			with open(self.cassette_path, 'a') as f:
+				f.write(json.dumps({'key': key, 'response': response}) + '\n')
+
+
+	def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+		response = self.lookup(prompt)
+		if response is None:
+			response = self.llm.invoke(prompt, stop=stop)
+			self.save_response(prompt, response)
+
+		return response
+
+
+	async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+		response = self.lookup(prompt)
+		if response is None:
+			response = await self.llm.ainvoke(prompt, stop=stop)
+			self.save_response(prompt, response)
+
+		return response
+
+
+class SyntheticLLM(LLM):
+	"""
+	Local stand-in for the OpenAI API, answering every prompt with a plausible response after a
+	random latency and failing a given share of the calls with the errors of the OpenAI client.
+	Random draws only depend on the seed, the prompt and how many times it was sent, so runs are
+	reproducible whatever the concurrency.
+	"""
+
+	# Mean latency in seconds, and standard deviation of its lognormal distribution, 0 for a constant latency
+	latency_mean: float = 0.5
+	latency_stddev: float = 0.0
+
+	# Probability of each kind of failure: 'rate_limit', 'timeout' and 'server_error'
+	failure_rates: Dict[str, float] = {}
+
+	# Delay asked by rate limit errors, in seconds
+	retry_after: float = 1.0
+	seed: int = 0
+
+	_calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+	_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+
+	@property
+	def _llm_type(self) -> str:
+		return 'synthetic'
+
+
+	@property
+	def _identifying_params(self) -> Dict[str, Any]:
+		return {'latency_mean': self.latency_mean, 'latency_stddev': self.latency_stddev, 'failure_rates': self.failure_rates, 'seed': self.seed}
+
+
+	def get_random(self, prompt: str) -> random.Random:
+		"""
+		Returns the random generator of a call, seeded by the prompt and its number of previous calls.
+
+		:param prompt: str, formatted prompt.
+		:returns: random.Random, generator of the call.
+		"""
+		key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+		with self._lock:
+			calls = self._calls.get(key, 0)
+			self._calls[key] = calls + 1
+
+		return random.Random(f"{self.seed}:{key}:{calls}")
+
+
+	def get_latency(self, generator: random.Random) -> float:
+		"""
+		Draws the latency of a call.
+
+		:param generator: random.Random, generator of the call.
+		:returns: float, latency in seconds.
+		"""
+		if self.latency_mean <= 0:
+			return 0.0
+		if self.latency_stddev <= 0:
+			return self.latency_mean
+
+		# Parameters of the underlying normal distribution giving the requested mean and deviation
+		sigma_squared = math.log(1 + (self.latency_stddev / self.latency_mean) ** 2)
+		return generator.lognormvariate(math.log(self.latency_mean) - sigma_squared / 2, math.sqrt(sigma_squared))
+
+
+	def get_failure(self, generator: random.Random) -> Exception:
+		"""
+		Draws whether a call fails, building the error the OpenAI client would raise.
+
+		:param generator: random.Random, generator of the call.
+		:returns: Exception, error to raise, or None if the call succeeds.
+		"""
+		draw = generator.random()
+		request = httpx.Request('POST', 'https://api.openai.com/v1/completions')
+
+		for kind, rate in sorted(self.failure_rates.items()):
+			if draw >= rate:
+				draw -= rate
+				continue
+
+			if kind == 'rate_limit':
+				response = httpx.Response(429, headers={'retry-after': str(self.retry_after)}, request=request)
+				return openai.RateLimitError("Synthetic rate limit", response=response, body=None)
+			if kind == 'timeout':
+				return openai.APITimeoutError(request=request)
+			if kind == 'server_error':
+				return openai.InternalServerError("Synthetic server error", response=httpx.Response(500, request=request), body=None)
+
+			raise ValueError(f"Unknown failure kind: {kind}")
+
+		return None
+
+
+	@staticmethod
+	def make_response(prompt: str) -> str:
+		"""
+		Builds a deterministic response fitting the request of the prompt.
+
+		:param prompt: str, formatted prompt.
+		:returns: str, synthetic response.
+		"""
+		digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+
+		if 'JSON object' in prompt:
+			return json.dumps({
+				'title': f"Synthetic title {digest}",
+				'authors': "Jane Doe, John Doe",
+				'publication_date': "2024/01/01",
+				'abstract': f"Synthetic abstract {digest}.",
+				'findings': f"Synthetic findings {digest}.",
+				'methodology': f"Synthetic methodology {digest}.",
+				'summary': f"Synthetic summary {digest}.",
+				'keywords': ["synthetic", digest]
+			})
+		if 'YYYY/MM/DD' in prompt:
+			return "2024/01/01"
+		if 'keywords' in prompt.split('\n')[0]:
+			return f"synthetic, {digest}"
+
+		return f"Synthetic answer {digest}."
+
+
+	def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+		generator = self.get_random(prompt)
+		time.sleep(self.get_latency(generator))
+
+		failure = self.get_failure(generator)
+		if failure is not None:
+			raise failure
+
+		return self.make_response(prompt)
+
+
+	async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+		generator = self.get_random(prompt)
+		await asyncio.sleep(self.get_latency(generator))
+
+		failure = self.get_failure(generator)
+		if failure is not None:
+			raise failure
+
+		return self.make_response(prompt)
+
+
+def create_llm(backend: str, openai_api_key: str = None, cassette_path: str = None, rate_limiter: RateLimiter = None, **kwargs: Any) -> BaseLLM:
+	"""
+	Creates the LLM used by the information extractors.
+
+	:param backend: str, 'openai', 'replay' to answer from a cassette, 'record' to fill a cassette from OpenAI, or 'synthetic'.
+	:param openai_api_key: str, OpenAI API key, needed by 'openai' and 'record'.
+	:param cassette_path: str, path to the cassette file, needed by 'replay' and 'record'.
+	:param rate_limiter: RateLimiter, optional limiter of the extractors, which then retry transient errors instead of the OpenAI client.
+	:param kwargs: settings of the synthetic backend.
+	:returns: BaseLLM, LLM of the backend, or None for 'openai', letting each extractor create its OpenAI model.
+	"""
+	if backend == 'openai':
+		return None
+	if backend == 'replay':
+		return CassetteLLM(cassette_path=cassette_path)
+	if backend == 'record':
+		# Retries of the OpenAI client would be counted again by the limiter retrying the same calls
+		llm_arguments = {'max_retries': 0} if rate_limiter is not None else {}
+		return CassetteLLM(cassette_path=cassette_path, record=True, llm=OpenAI(api_key=openai_api_key, **llm_arguments))
+	if backend == 'synthetic':
+		return SyntheticLLM(**kwargs)
+
+	raise ValueError(f"Unknown LLM backend: {backend}")
@@ -1,28 +1,349 @@
-import os
-from create_env import load_config
-
-# Load environment configuration
-load_config()
-
-from text_processing_flow import TextProcessingFlow
-
-
-def main():
-	"""
-	Main function to run the document processing pipeline.
-	"""
-	# Initialize processing flow with environment variables load from config file
-	text_processing_flow = TextProcessingFlow(
-		file_path=os.getenv('FILE_PATH'),
-		openai_api_key=os.getenv('OPENAI_API_KEY'),
-		project_id=os.getenv('PROJECT_ID'),
-		dataset_id=os.getenv('DATASET_ID'),
-		table_id=os.getenv('TABLE_ID')
-	)
-
-	# Run processing flow
-	text_processing_flow.run()
-
-
-if __name__ == "__main__":
-	main()
+import os
+import sys
+import json
+import argparse
+
+# Add the root of the project directory to the Python path, the modules import each other from the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.create_env import load_config
+
+# Heavy dependencies (LangGraph, LangChain, OpenAI, BigQuery, PyMuPDF) are imported by the commands
+# needing them, so that --help, ingest-only and dry-run start quickly
+
+
+def create_parser() -> argparse.ArgumentParser:
+	"""
+	Creates the parser of the command line.
+
+	:returns: argparse.ArgumentParser, parser of the commands and their options.
+	"""
+	parser = argparse.ArgumentParser(description="Extracts information from research papers and stores it.")
+	parser.set_defaults(source=None)
+	subparsers = parser.add_subparsers(dest='command')
+
+	commands = {
+		'run': "Processes a PDF file, or a batch when the source is a directory, glob pattern or manifest file (default).",
+		'batch': "Processes every PDF file of the source as a batch, with bulk inserts.",
+		'ingest-only': "Extracts the text of the PDF files without calling the LLM or storing anything.",
+		'dry-run': "Lists the PDF files that would be processed and the tokens they would send, without calling the LLM or storing anything."
+	}
+	for command, description in commands.items():
+		subparser = subparsers.add_parser(command, help=description, description=description)
+		subparser.add_argument('source', nargs='?', help="PDF file, directory, glob pattern or manifest file, FILE_PATH of config.ini by default.")
+
+		if command in ('run', 'batch'):
+			subparser.add_argument('--no-cache', action='store_true', help="Call the LLM even for prompts whose response is in the cache of CACHE_PATH.")
+		if command == 'ingest-only':
+			subparser.add_argument('--output-dir', help="Directory where the text of each PDF file is written.")
+		if command == 'dry-run':
+			subparser.add_argument('--ledger', help="Ledger leaving out the papers already processed, LEDGER_PATH of config.ini by default.")
+
+	description = "Searches the title, abstract, summary and keywords of the stored papers in the local search index."
+	subparser = subparsers.add_parser('search', help=description, description=description)
+	subparser.add_argument('query', help="Terms that every paper found contains.")
+	subparser.add_argument('--field', choices=['title', 'abstract', 'summary', 'keywords'], help="Only search this field.")
+	subparser.add_argument('--limit', type=int, default=10, help="Maximum number of papers returned.")
+	subparser.add_argument('--prefix', action='store_true', help="Also match words starting with the last term.")
+	subparser.add_argument('--index', help="Search index, SEARCH_INDEX_PATH of config.ini by default.")
+
+	description = "Finds the stored papers most similar to a paper or a text in the local embedding index."
+	subparser = subparsers.add_parser('similar', help=description, description=description)
+	subparser.add_argument('paper', nargs='?', help="PDF file of an indexed paper.")
+	subparser.add_argument('--text', help="Text to find similar papers to, instead of a paper.")
+	subparser.add_argument('--k', type=int, default=10, help="Number of papers returned.")
+	subparser.add_argument('--index', help="Embedding index, EMBEDDING_INDEX_PATH of config.ini by default.")
+
+	return parser
+
+
+def get_source(args: argparse.Namespace) -> str:
+	"""
+	Returns the PDF files to work on, loading the configuration when they are not given on the command line.
+
+	:param args: argparse.Namespace, parsed command line.
+	:returns: str, PDF file, directory, glob pattern or manifest file.
+	"""
+	if args.source:
+		return os.path.abspath(args.source)
+
+	load_config()
+
+	return os.getenv('FILE_PATH')
+
+
+def collect_files(source: str) -> list:
+	"""
+	Lists the PDF files of a source, a single PDF file included.
+
+	:param source: str, PDF file, directory, glob pattern or manifest file.
+	:returns: list of str, paths to the PDF files.
+	"""
+	from src.batch_processor import BatchProcessor
+
+	if os.path.isfile(source) and source.endswith('.pdf'):
+		return [source]
+
+	return BatchProcessor.collect_files(source)
+
+
+def run(source: str, batch: bool = False, bypass_cache: bool = False) -> None:
+	"""
+	Runs the whole pipeline on a PDF file or a batch of them.
+
+	:param source: str, PDF file, directory, glob pattern or manifest file.
+	:param batch: bool, whether a single PDF file is also processed as a batch.
+	:param bypass_cache: bool, whether to call the LLM even for prompts whose response is cached.
+	"""
+	from src.text_processing_flow import TextProcessingFlow
+	from src.batch_processor import BatchProcessor
+	from src.storage_backends import create_storer
+	from src.document_ledger import DocumentLedger
+	from src.flow_metrics import FlowMetrics
+	from src.rate_limiter import RateLimiter
+	from src.llm_backends import create_llm
+	from src.duplicate_detector import DuplicateDetector
+	from src.search_index import SearchIndex
+	from src.embedding_index import EmbeddingIndex
+	from src.response_cache import ResponseCache
+	from src.text_chunker import TextChunker
+
+	# LLM calls are paced to stay within the API quota when limits are configured
+	rate_limiter = None
+	if os.getenv('REQUESTS_PER_MINUTE') or os.getenv('TOKENS_PER_MINUTE'):
+		rate_limiter = RateLimiter(
+			requests_per_minute=float(os.getenv('REQUESTS_PER_MINUTE')) if os.getenv('REQUESTS_PER_MINUTE') else None,
+			tokens_per_minute=float(os.getenv('TOKENS_PER_MINUTE')) if os.getenv('TOKENS_PER_MINUTE') else None
+		)
+
+	# Near-duplicates of stored papers reuse their extracted data when an index is configured
+	duplicate_detector = None
+	if os.getenv('DEDUP_PATH'):
+		duplicate_detector = DuplicateDetector(os.getenv('DEDUP_PATH'), threshold=float(os.getenv('DEDUP_THRESHOLD', 0.8)))
+
+	# Stored papers are searchable locally when an index is configured
+	search_index = SearchIndex(os.getenv('SEARCH_INDEX_PATH')) if os.getenv('SEARCH_INDEX_PATH') else None
+
+	# Similar papers can be found once they are embedded, with the offline embedder by default
+	embedding_index = EmbeddingIndex(os.getenv('EMBEDDING_INDEX_PATH')) if os.getenv('EMBEDDING_INDEX_PATH') else None
+
+	# Responses of the LLM are reused by reruns when a cache is configured
+	cache = None
+	if os.getenv('CACHE_PATH'):
+		cache = ResponseCache(
+			os.getenv('CACHE_PATH'),
+			max_entries=int(os.getenv('CACHE_MAX_ENTRIES')) if os.getenv('CACHE_MAX_ENTRIES') else None,
+			ttl_seconds=float(os.getenv('CACHE_TTL_SECONDS')) if os.getenv('CACHE_TTL_SECONDS') else None,
+			bypass=bypass_cache
+		)
+
+	# Long papers are split into chunks of at most this number of tokens when it is configured
+	chunker = TextChunker(max_tokens=int(os.getenv('CHUNK_TOKENS'))) if os.getenv('CHUNK_TOKENS') else None
+
+	# Initialize processing flow with environment variables load from config file
+	text_processing_flow = TextProcessingFlow(
+		file_path=source,
+		openai_api_key=os.getenv('OPENAI_API_KEY'),
+		project_id=os.getenv('PROJECT_ID'),
+		dataset_id=os.getenv('DATASET_ID'),
+		table_id=os.getenv('TABLE_ID'),
+		combined_extraction=os.getenv('COMBINED_EXTRACTION', 'false').lower() in ('true', 'yes', 'on', '1'),
+		extraction_concurrency=int(os.getenv('EXTRACTION_CONCURRENCY', 1)),
+		cache=cache,
+		chunker=chunker,
+		metadata_threshold=float(os.getenv('METADATA_THRESHOLD', 0.8)),
+		page_workers=int(os.getenv('PAGE_WORKERS', 1)),
+		checkpoint_path=os.getenv('CHECKPOINT_PATH'),
+		metrics=FlowMetrics(prometheus_path=os.getenv('METRICS_PATH')),
+		rate_limiter=rate_limiter,
+		llm=create_llm(
+			os.getenv('LLM_BACKEND', 'openai'),
+			openai_api_key=os.getenv('OPENAI_API_KEY'),
+			cassette_path=os.getenv('LLM_CASSETTE_PATH'),
+			rate_limiter=rate_limiter
+		),
+		duplicate_detector=duplicate_detector,
+		search_index=search_index,
+		embedding_index=embedding_index
+	)
+
+	# Run processing flow, a directory, glob pattern or manifest file is processed as a batch
+	single_file = not batch and os.path.isfile(source) and source.endswith('.pdf')
+
+	ledger = None
+	try:
+		# Rows of a batch are inserted in bulk, the storer is flushed when leaving the block
+		with create_storer(
+			os.getenv('STORAGE_BACKEND', 'bigquery'),
+			project_id=os.getenv('PROJECT_ID'),
+			dataset_id=os.getenv('DATASET_ID'),
+			table_id=os.getenv('TABLE_ID'),
+			output_path=os.getenv('STORAGE_OUTPUT_PATH'),
+			buffered=not single_file
+		) as data_storer:
+			text_processing_flow.data_storer = data_storer
+
+			if single_file:
+				text_processing_flow.run()
+			else:
+				# Only new or changed papers are processed when a ledger is configured
+				if os.getenv('LEDGER_PATH'):
+					ledger = DocumentLedger(os.getenv('LEDGER_PATH'))
+				# Each stage of the batch runs with its own number of workers, with bounded queues between them
+				BatchProcessor(
+					text_processing_flow,
+					ingest_workers=int(os.getenv('INGEST_WORKERS')) if os.getenv('INGEST_WORKERS') else None,
+					extract_workers=int(os.getenv('EXTRACT_WORKERS')) if os.getenv('EXTRACT_WORKERS') else None,
+					store_workers=int(os.getenv('STORE_WORKERS')) if os.getenv('STORE_WORKERS') else None,
+					queue_size=int(os.getenv('QUEUE_SIZE', 8)),
+					ledger=ledger
+				).run(source)
+	finally:
+		# Release the checkpoint file, the ledger, the cache and the local indexes, even when the run fails
+		text_processing_flow.close()
+		for index in (ledger, cache, duplicate_detector, search_index, embedding_index):
+			if index is not None:
+				index.close()
+
+
+def ingest_only(source: str, output_dir: str = None) -> None:
+	"""
+	Extracts the text of the PDF files and prints one JSON line per file with its size, sections and metadata.
+
+	:param source: str, PDF file, directory, glob pattern or manifest file.
+	:param output_dir: str, optional directory where the text of each PDF file is written.
+	"""
+	from concurrent.futures import ProcessPoolExecutor
+	from src.batch_processor import ingest_file
+
+	file_paths = collect_files(source)
+	if output_dir:
+		os.makedirs(output_dir, exist_ok=True)
+
+	with ProcessPoolExecutor() as pool:
+		for file_path, ingested in zip(file_paths, pool.map(ingest_file, file_paths)):
+			if output_dir:
+				text_path = os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0] + '.txt')
+				with open(text_path, 'w', encoding='utf-8') as f:
+					f.write(ingested['pdf_content'])
+
+			print(json.dumps({
+				'file_path': file_path,
+				'page_count': ingested['page_count'],
+				'characters': len(ingested['pdf_content']),
+				'sections': list(ingested['sections']),
+				'metadata': ingested['metadata']
+			}, default=str))
+
+
+def dry_run(source: str, ledger_path: str = None) -> None:
+	"""
+	Prints the PDF files that would be processed, leaving out those already processed according to
+	the ledger, with the approximate number of tokens of their text, then a summary line.
+
+	:param source: str, PDF file, directory, glob pattern or manifest file.
+	:param ledger_path: str, optional path to the ledger of the papers already processed.
+	"""
+	from src.document_ingestor import DocumentIngestor
+	from src.document_ledger import DocumentLedger
+	from src.text_chunker import TextChunker
+
+	file_paths = collect_files(source)
+	ledger = DocumentLedger(ledger_path) if ledger_path else None
+
+	pending, total_tokens = 0, 0
+	for file_path in file_paths:
+		if ledger is not None and not ledger.needs_processing(file_path)[0]:
+			print(json.dumps({'file_path': file_path, 'status': 'skipped'}))
+			continue
+
+		ingestor = DocumentIngestor(file_path)
+		tokens = TextChunker.count_tokens(ingestor.process_text())
+		pending += 1
+		total_tokens += tokens
+		print(json.dumps({'file_path': file_path, 'status': 'pending', 'page_count': ingestor.page_count, 'tokens': tokens}))
+
+	print(json.dumps({'files': len(file_paths), 'pending': pending, 'skipped': len(file_paths) - pending, 'tokens': total_tokens}))
+	if ledger is not None:
+		ledger.close()
+
+
+def search(index_path: str, query: str, field: str = None, limit: int = 10, prefix: bool = False) -> None:
+	"""
+	Prints one JSON line per paper of the search index matching the query, best first.
+
+	:param index_path: str, path to the search index.
+	:param query: str, terms that every paper found contains.
+	:param field: str, optional field searched.
+	:param limit: int, maximum number of papers printed.
+	:param prefix: bool, whether the last term also matches longer words.
+	"""
+	from src.search_index import SearchIndex
+
+	if not index_path or not os.path.exists(index_path):
+		raise SystemExit(f"Search index not found: {index_path}")
+
+	search_index = SearchIndex(index_path)
+	for paper in search_index.search(query, field=field, limit=limit, prefix=prefix):
+		print(json.dumps(paper))
+	search_index.close()
+
+
+def similar(index_path: str, paper: str = None, text: str = None, k: int = 10) -> None:
+	"""
+	Prints one JSON line per paper of the embedding index most similar to a paper or a text, most similar first.
+
+	:param index_path: str, path to the embedding index.
+	:param paper: str, PDF file of an indexed paper.
+	:param text: str, text embedded with the offline embedder, used when no paper is given.
+	:param k: int, number of papers printed.
+	"""
+	from src.embedding_index import EmbeddingIndex, HashingEmbedder
+
+	if not index_path or not os.path.exists(index_path):
+		raise SystemExit(f"Embedding index not found: {index_path}")
+
+	embedding_index = EmbeddingIndex(index_path)
+	if paper:
+		vector = embedding_index.get_vector(os.path.abspath(paper))
+		if vector is None:
+			raise SystemExit(f"Paper not indexed: {paper}")
+	else:
+		vector = HashingEmbedder(dimensions=embedding_index.dimensions).embed([text or ""])[0]
+
+	for file_path, similarity in embedding_index.search(vector, k=k, exclude=os.path.abspath(paper) if paper else None):
+		print(json.dumps({'file_path': file_path, 'similarity': similarity}))
+	embedding_index.close()
+
+
+def main(argv: list = None):
+	"""
+	Main function to run the document processing pipeline from the command line.
+
+	:param argv: list of str, command line arguments, those of the process by default.
+	"""
+	args = create_parser().parse_args(argv)
+	command = args.command or 'run'
+
+	if command in ('run', 'batch'):
+		# The whole pipeline needs the credentials and settings of the config file
+		load_config()
+		run(os.path.abspath(args.source) if args.source else os.getenv('FILE_PATH'), batch=command == 'batch', bypass_cache=args.no_cache)
+	elif command == 'ingest-only':
+		ingest_only(get_source(args), output_dir=args.output_dir)
+	elif command == 'dry-run':
+		source = get_source(args)
+		dry_run(source, ledger_path=args.ledger or os.getenv('LEDGER_PATH'))
+	elif command == 'search':
+		if not args.index:
+			load_config()
+		search(args.index or os.getenv('SEARCH_INDEX_PATH'), args.query, field=args.field, limit=args.limit, prefix=args.prefix)
+	elif command == 'similar':
+		if not args.paper and not args.text:
+			raise SystemExit("Give a paper or a --text to find similar papers to.")
+		if not args.index:
+			load_config()
+		similar(args.index or os.getenv('EMBEDDING_INDEX_PATH'), paper=args.paper, text=args.text, k=args.k)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,205 @@
+import time
+import random
+import asyncio
+import threading
+
+
+class RateLimiter:
+	"""
+	Client-side limiter shared by every LLM call of the pipeline. Two token buckets cap the requests
+	and the tokens sent per minute, rate limit responses pause every caller for the time asked by
+	the API and lower the request rate, which then recovers on each successful call.
+	"""
+
+	def __init__(
+		self,
+		requests_per_minute: float = None,
+		tokens_per_minute: float = None,
+		max_retries: int = 5,
+		base_delay: float = 1.0,
+		max_delay: float = 60.0,
+		min_rate_factor: float = 0.1
+	) -> None:
+		"""
+		Initializes the limiter with full buckets.
+
+		:param requests_per_minute: float, maximum number of requests per minute, unlimited when not given.
+		:param tokens_per_minute: float, maximum number of prompt and completion tokens per minute, unlimited when not given.
+		:param max_retries: int, number of retries of a failed call before giving up.
+		:param base_delay: float, delay in seconds before the first retry, doubled on each attempt.
+		:param max_delay: float, maximum delay in seconds between two attempts.
+		:param min_rate_factor: float, lowest fraction of the request rate kept after repeated rate limit errors.
+		"""
+		self.requests_per_minute = requests_per_minute
+		self.tokens_per_minute = tokens_per_minute
+		self.max_retries = max_retries
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		self.min_rate_factor = min_rate_factor
+
+		# Fraction of the configured request rate currently allowed
+		self.rate_factor = 1.0
+
+		# Available requests and tokens, and time until which every caller is paused
+		self.request_allowance = requests_per_minute or 0.0
+		self.token_allowance = tokens_per_minute or 0.0
+		self.updated_at = time.monotonic()
+		self.paused_until = 0.0
+
+		self.lock = threading.Lock()
+
+
+	def refill(self, now: float) -> None:
+		"""
+		Adds the requests and tokens earned since the last update to the buckets. Must be called with the lock held.
+
+		:param now: float, current value of time.monotonic.
+		"""
+		elapsed = now - self.updated_at
+		self.updated_at = now
+
+		if self.requests_per_minute:
+			self.request_allowance = min(
+				self.requests_per_minute,
+				self.request_allowance + elapsed * self.requests_per_minute * self.rate_factor / 60
+			)
+		if self.tokens_per_minute:
+			self.token_allowance = min(self.tokens_per_minute, self.token_allowance + elapsed * self.tokens_per_minute / 60)
+
+
+	def reserve(self, tokens: int) -> float:
+		"""
+		Takes one request and a number of tokens from the buckets if available.
+
+		:param tokens: int, estimated number of tokens of the call.
+		:returns: float, seconds to wait before trying again, 0 when the call can proceed.
+		"""
+		with self.lock:
+			now = time.monotonic()
+			self.refill(now)
+
+			if now < self.paused_until:
+				return self.paused_until - now
+
+			# A call larger than the whole bucket would never fit, let it go once the bucket is full
+			tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else tokens
+
+			wait = 0.0
+			if self.requests_per_minute and self.request_allowance < 1:
+				wait = max(wait, (1 - self.request_allowance) * 60 / (self.requests_per_minute * self.rate_factor))
+			if self.tokens_per_minute and self.token_allowance < tokens:
+				wait = max(wait, (tokens - self.token_allowance) * 60 / self.tokens_per_minute)
+			if wait > 0:
+				return wait
+
+			self.request_allowance -= 1
+			self.token_allowance -= tokens
+
+			return 0.0
+
+
+	def acquire(self, tokens: int) -> None:
+		"""
+		Blocks until a call of the given size is allowed.
+
+		:param tokens: int, estimated number of tokens of the call.
+		"""
+		wait = self.reserve(tokens)
+		while wait > 0:
+			time.sleep(wait)
+			wait = self.reserve(tokens)
+
+
+	async def aacquire(self, tokens: int) -> None:
+		"""
+		Asynchronous version of acquire, leaving the event loop free while waiting.
+
+		:param tokens: int, estimated number of tokens of the call.
+		"""
+		wait = self.reserve(tokens)
+		while wait > 0:
+			await asyncio.sleep(wait)
+			wait = self.reserve(tokens)
+
+
+	def record_usage(self, estimated_tokens: int, used_tokens: int) -> None:
+		"""
+		Corrects the token bucket with the actual usage of a call, once known.
+
+		:param estimated_tokens: int, tokens reserved before the call.
+		:param used_tokens: int, tokens reported by the API, 0 when unknown.
+		"""
+		if not self.tokens_per_minute or not used_tokens:
+			return
+
+		with self.lock:
+			self.token_allowance = min(self.tokens_per_minute, self.token_allowance + estimated_tokens - used_tokens)
+
+
+	def record_success(self) -> None:
+		"""
+		Slowly restores the request rate after a successful call.
+		"""
+		with self.lock:
+			self.rate_factor = min(1.0, self.rate_factor + 0.05)
+
+
+	def record_rate_limit(self, retry_after: float = None) -> None:
+		"""
+		Pauses every caller after a rate limit response and halves the request rate.
+
+		:param retry_after: float, seconds to wait asked by the API, if any.
+		"""
+		with self.lock:
+			self.rate_factor = max(self.min_rate_factor, self.rate_factor / 2)
+			if retry_after:
+				self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+	def is_retryable(self, error: Exception) -> bool:
+		"""
+		Tells whether a failed call is worth retrying.
+
+		:param error: Exception, error raised by the call.
+		:returns: bool, whether the error is transient.
+		"""
+		# Imported here so that loading the limiter does not load the OpenAI SDK
+		import openai
+
+		return isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError))
+
+
+	@staticmethod
+	def get_retry_after(error: Exception) -> float:
+		"""
+		Reads the delay asked by the API in the headers of an error response.
+
+		:param error: Exception, error raised by the call.
+		:returns: float, seconds to wait, or None if not given.
+		"""
+		response = getattr(error, 'response', None)
+		headers = getattr(response, 'headers', None) or {}
+
+		try:
+			if headers.get('retry-after-ms'):
+				return float(headers['retry-after-ms']) / 1000
+			if headers.get('retry-after'):
+				return float(headers['retry-after'])
+		except (TypeError, ValueError):
+			pass
+
+		return None
+
+
+	def get_backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+		"""
+		Computes the delay before a retry, exponential with full jitter so that callers
+		failing together do not retry together, and never shorter than asked by the API.
+
+		:param attempt: int, number of attempts already made, starting at 1.
+		:param retry_after: float, seconds to wait asked by the API, if any.
+		:returns: float, seconds to wait before the next attempt.
+		"""
+		delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+		return max(delay, retry_after or 0.0)
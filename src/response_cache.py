@@ -0,0 +1,145 @@
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class ResponseCache:
+	"""
+	Persistent on-disk cache of LLM responses, stored in SQLite and keyed by a hash
+	of the model name, the prompt template and the analyzed text.
+	"""
+
+	def __init__(self, db_path: str, max_entries: int = None, ttl_seconds: float = None, bypass: bool = False) -> None:
+		"""
+		Initializes the cache, creating the database if needed.
+
+		:param db_path: str, path to the SQLite database file.
+		:param max_entries: int, maximum number of responses kept, least recently used ones are evicted first.
+		:param ttl_seconds: float, time after which a response is considered expired.
+		:param bypass: bool, whether to skip the cache, always calling the LLM.
+		"""
+		self.db_path = db_path
+		self.max_entries = max_entries
+		self.ttl_seconds = ttl_seconds
+		self.bypass = bypass
+
+		# Hit and miss counters
+		self.hits = 0
+		self.misses = 0
+
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(db_path, check_same_thread=False)
+		with self.connection:
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS responses ("
+				"key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_accessed REAL NOT NULL)"
+			)
+			self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_accessed ON responses (last_accessed)")
+
+
+	@staticmethod
+	def make_key(model_name: str, prompt_template: str, text: str) -> str:
+		"""
+		Builds the cache key of a prompt.
+
+		:param model_name: str, name of the LLM.
+		:param prompt_template: str, template of the prompt.
+		:param text: str, text the prompt is run on.
+		:returns: str, hexadecimal SHA-256 hash identifying the prompt.
+		"""
+		digest = hashlib.sha256()
+		for part in (model_name, prompt_template, text):
+			encoded = part.encode('utf-8')
+			# Prefix each part with its length so that different splits never collide
+			digest.update(len(encoded).to_bytes(8, 'big'))
+			digest.update(encoded)
+
+		return digest.hexdigest()
+
+
+	def get(self, key: str) -> str:
+		"""
+		Looks up a response in the cache.
+
+		:param key: str, cache key of the prompt.
+		:returns: str, cached response, or None if missing, expired or bypassed.
+		"""
+		if self.bypass:
+			return None
+
+		now = time.time()
+		with self.lock, self.connection:
+			row = self.connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+
+			if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+				self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+				row = None
+
+			if row is None:
+				self.misses += 1
+				return None
+
+			self.connection.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+			self.hits += 1
+
+		return row[0]
+
+
+	def set(self, key: str, response: str) -> None:
+		"""
+		Stores a response in the cache, evicting the least recently used ones when it is full.
+
+		:param key: str, cache key of the prompt.
+		:param response: str, response from the LLM.
+		"""
+		if self.bypass:
+			return
+
+		now = time.time()
+		with self.lock, self.connection:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO responses (key, response, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+				(key, response, now, now)
+			)
+
+			if self.max_entries is not None:
+				self.connection.execute(
+					"DELETE FROM responses WHERE key IN ("
+					"SELECT key FROM responses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+					(self.max_entries,)
+				)
+
+
+	def evict_expired(self) -> int:
+		"""
+		Removes every expired response from the cache.
+
+		:returns: int, number of removed responses.
+		"""
+		if self.ttl_seconds is None:
+			return 0
+
+		with self.lock, self.connection:
+			cursor = self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+		return cursor.rowcount
+
+
+	def stats(self) -> dict:
+		"""
+		Returns the usage counters of the cache.
+
+		:returns: dict, number of hits, misses and stored responses.
+		"""
+		with self.lock:
+			entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+		return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+
+	def close(self) -> None:
+		"""
+		Closes the connection to the database.
+		"""
+		self.connection.close()
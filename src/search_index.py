@@ -0,0 +1,148 @@
+import re
+import time
+import sqlite3
+import threading
+from typing import List
+
+
+class SearchIndex:
+	"""
+	Local full-text index of the stored papers, answering title and keyword lookups in milliseconds
+	without querying BigQuery. Papers are kept in a SQLite table mirrored by an FTS5 index over their
+	title, abstract, summary and keywords, updated as each paper is stored, and results are ranked by BM25.
+	"""
+
+	# Columns searched, with the weight of each one in the BM25 ranking
+	FIELDS = {'title': 10.0, 'abstract': 3.0, 'summary': 2.0, 'keywords': 5.0}
+	TERM_PATTERN = re.compile(r'\w+')
+
+
+	def __init__(self, db_path: str) -> None:
+		"""
+		Initializes the index, creating the database if needed.
+
+		:param db_path: str, path to the SQLite database file.
+		"""
+		self.db_path = db_path
+
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(db_path, check_same_thread=False)
+		self.connection.row_factory = sqlite3.Row
+
+		# Papers are indexed one at a time, a write-ahead log makes each commit cheap
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		with self.connection:
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS papers ("
+				"id INTEGER PRIMARY KEY, file_path TEXT UNIQUE NOT NULL, title TEXT, authors TEXT, publication_date TEXT, "
+				"abstract TEXT, summary TEXT, keywords TEXT, updated_at REAL NOT NULL)"
+			)
+			self.connection.execute(
+				"CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+				"title, abstract, summary, keywords, content='papers', content_rowid='id', tokenize='porter unicode61')"
+			)
+
+			# Keep the index in sync with the table, one paper at a time
+			self.connection.execute(
+				"CREATE TRIGGER IF NOT EXISTS papers_insert AFTER INSERT ON papers BEGIN "
+				"INSERT INTO papers_fts (rowid, title, abstract, summary, keywords) "
+				"VALUES (new.id, new.title, new.abstract, new.summary, new.keywords); END"
+			)
+			self.connection.execute(
+				"CREATE TRIGGER IF NOT EXISTS papers_delete AFTER DELETE ON papers BEGIN "
+				"INSERT INTO papers_fts (papers_fts, rowid, title, abstract, summary, keywords) "
+				"VALUES ('delete', old.id, old.title, old.abstract, old.summary, old.keywords); END"
+			)
+
+
+	def add(self, file_path: str, extracted_data: dict) -> None:
+		"""
+		Indexes a stored paper, replacing a previous version of the same file.
+
+		:param file_path: str, path to the PDF file.
+		:param extracted_data: dict, data extracted from the paper.
+		"""
+		keywords = extracted_data.get('keywords') or []
+		if not isinstance(keywords, str):
+			keywords = ', '.join(str(keyword) for keyword in keywords)
+
+		with self.lock, self.connection:
+			self.connection.execute("DELETE FROM papers WHERE file_path = ?", (file_path,))
+			self.connection.execute(
+				"INSERT INTO papers (file_path, title, authors, publication_date, abstract, summary, keywords, updated_at) "
+				"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(
+					file_path, extracted_data.get('title'), extracted_data.get('authors'), extracted_data.get('publication_date'),
+					extracted_data.get('abstract'), extracted_data.get('summary'), keywords, time.time()
+				)
+			)
+
+
+	def build_query(self, query: str, field: str = None, prefix: bool = False) -> str:
+		"""
+		Turns free text into an FTS5 query matching papers containing every term.
+
+		:param query: str, free text, punctuation and FTS5 operators are ignored.
+		:param field: str, optional column the terms must appear in.
+		:param prefix: bool, whether the last term also matches longer words.
+		:returns: str, FTS5 query, empty when the text has no term.
+		"""
+		terms = [f'"{term}"' for term in self.TERM_PATTERN.findall(query)]
+		if not terms:
+			return ""
+		if prefix:
+			terms[-1] += '*'
+
+		expression = ' '.join(terms)
+		if field is not None:
+			if field not in self.FIELDS:
+				raise ValueError(f"Unknown search field: {field}")
+			expression = f"{field} : ({expression})"
+
+		return expression
+
+
+	def search(self, query: str, field: str = None, limit: int = 10, prefix: bool = False) -> List[dict]:
+		"""
+		Finds the papers best matching a query.
+
+		:param query: str, free text searched in every column, or in field.
+		:param field: str, optional column searched, 'title', 'abstract', 'summary' or 'keywords'.
+		:param limit: int, maximum number of papers returned.
+		:param prefix: bool, whether the last term also matches longer words, for search as you type.
+		:returns: list of dict, matching papers with their BM25 score and an excerpt, best first.
+		"""
+		expression = self.build_query(query, field=field, prefix=prefix)
+		if not expression:
+			return []
+
+		weights = ', '.join(str(weight) for weight in self.FIELDS.values())
+		with self.lock:
+			rows = self.connection.execute(
+				"SELECT papers.file_path, papers.title, papers.authors, papers.publication_date, papers.keywords, "
+				f"bm25(papers_fts, {weights}) AS score, snippet(papers_fts, -1, '[', ']', '...', 12) AS excerpt "
+				"FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid "
+				"WHERE papers_fts MATCH ? ORDER BY score LIMIT ?",
+				(expression, limit)
+			).fetchall()
+
+		# BM25 scores are negative in SQLite, lower is better
+		return [{**dict(row), 'score': -row['score']} for row in rows]
+
+
+	def count(self) -> int:
+		"""
+		Counts the indexed papers.
+
+		:returns: int, number of papers.
+		"""
+		with self.lock:
+			return self.connection.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+
+	def close(self) -> None:
+		"""
+		Closes the connection to the database.
+		"""
+		self.connection.close()
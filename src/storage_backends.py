@@ -0,0 +1,269 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from abc import abstractmethod
+from typing import List
+from src.data_storer import StorageBackend, DataStorer, BufferedDataStorer, BackfillDataStorer
+
+# Optional dependencies, only needed by the local sinks using them
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+try:
+	import duckdb
+except ImportError:
+	duckdb = None
+
+
+class LocalStorer(StorageBackend):
+	"""
+	Base of the sinks writing to local files. Rows are converted to the types of the schema,
+	buffered, and written in batches of max_rows.
+	"""
+
+	def __init__(self, max_rows: int = 10000) -> None:
+		"""
+		Initializes the buffer.
+
+		:param max_rows: int, number of buffered rows written together as one batch.
+		"""
+		self.max_rows = max_rows
+		self.rows = []
+		self.row_keys = []
+		self.lock = threading.RLock()
+
+		# Time spent writing the buffered rows, summed over every flush
+		self.flush_seconds = 0.0
+
+
+	def store_data(self, extracted_data: dict, key: str = None) -> List[dict]:
+		"""
+		Adds extracted data to the buffer, writing a batch once it is full.
+
+		:param extracted_data: dict, extracted data to be stored.
+		:param key: str, optional identifier of the document, such as its path, attached to its rejected rows.
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		row = self.build_row(extracted_data)
+		try:
+			converted = self.convert_row(row)
+		except (TypeError, ValueError) as e:
+			logging.error(f"Failed to store row ('{row.get('title')}'): {e}")
+			return [{'row': row, 'errors': [{'reason': 'invalid', 'message': str(e)}], 'key': key}]
+
+		with self.lock:
+			self.rows.append(converted)
+			self.row_keys.append(key)
+			if len(self.rows) >= self.max_rows:
+				return self.flush()
+
+		return []
+
+
+	def flush(self) -> List[dict]:
+		"""
+		Writes every buffered row as one batch.
+
+		:returns: list of dict, rejected rows with their errors, always empty as rows are validated when buffered.
+		"""
+		with self.lock:
+			if not self.rows:
+				return []
+
+			rows, self.rows = self.rows, []
+			row_keys, self.row_keys = self.row_keys, []
+			start_time = time.perf_counter()
+			try:
+				self.write_rows(rows)
+			except Exception:
+				# Keep the rows so that a later flush can retry them
+				self.rows = rows + self.rows
+				self.row_keys = row_keys + self.row_keys
+				raise
+			finally:
+				seconds = time.perf_counter() - start_time
+				self.flush_seconds += seconds
+
+		logging.info(f"Wrote {len(rows)} rows to {self.describe()} in {seconds:.2f}s.")
+
+		return []
+
+
+	def get_pending_keys(self) -> List[str]:
+		with self.lock:
+			return list(self.row_keys)
+
+
+	@abstractmethod
+	def write_rows(self, rows: List[dict]) -> None:
+		"""
+		Writes a batch of converted rows.
+
+		:param rows: list of dict, rows converted to the types of the schema.
+		"""
+
+
+	@abstractmethod
+	def describe(self) -> str:
+		"""
+		Describes where the rows are written, for logging.
+
+		:returns: str, description of the destination.
+		"""
+
+
+class ParquetStorer(LocalStorer):
+	"""
+	Writes extracted data to a local Parquet dataset partitioned by ingest date, in the Hive
+	layout read by DuckDB, pandas, Spark or a BigQuery load job. Each batch becomes one file
+	per partition made of row groups of row_group_size rows.
+	"""
+
+	def __init__(self, root_path: str, max_rows: int = 10000, row_group_size: int = 10000, compression: str = 'zstd') -> None:
+		"""
+		Initializes the writer.
+
+		:param root_path: str, directory of the dataset.
+		:param max_rows: int, number of buffered rows written together.
+		:param row_group_size: int, maximum number of rows per row group.
+		:param compression: str, compression codec of the files.
+		"""
+		if pyarrow is None:
+			raise ImportError("The Parquet storage backend needs pyarrow, install it with `pip install pyarrow`.")
+
+		super().__init__(max_rows=max_rows)
+		self.root_path = root_path
+		self.row_group_size = row_group_size
+		self.compression = compression
+		self.arrow_schema = self.create_arrow_schema()
+
+
+	@classmethod
+	def create_arrow_schema(cls) -> 'pyarrow.Schema':
+		"""
+		Translates the table schema into an Arrow schema.
+
+		:returns: pyarrow.Schema, schema of the Parquet files.
+		"""
+		types = {
+			'STRING': pyarrow.string(),
+			'TIMESTAMP': pyarrow.timestamp('us', tz='UTC'),
+			'DATETIME': pyarrow.timestamp('us')
+		}
+
+		return pyarrow.schema([
+			pyarrow.field(field.name, pyarrow.list_(types[field.field_type]) if field.mode == 'REPEATED' else types[field.field_type])
+			for field in cls.create_schema()
+		])
+
+
+	def write_rows(self, rows: List[dict]) -> None:
+		partitions = {}
+		for row in rows:
+			partitions.setdefault(row['utc_timestamp'].date().isoformat(), []).append(row)
+
+		for ingest_date, partition_rows in sorted(partitions.items()):
+			directory = os.path.join(self.root_path, f"ingest_date={ingest_date}")
+			os.makedirs(directory, exist_ok=True)
+
+			table = pyarrow.Table.from_pylist(partition_rows, schema=self.arrow_schema)
+			file_path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+
+			# Write under a temporary name so that readers never see a partial file
+			pyarrow.parquet.write_table(table, f"{file_path}.tmp", row_group_size=self.row_group_size, compression=self.compression)
+			os.replace(f"{file_path}.tmp", file_path)
+
+
+	def describe(self) -> str:
+		return f"Parquet dataset {self.root_path}"
+
+
+class DuckDBStorer(LocalStorer):
+	"""
+	Writes extracted data to a table of a local DuckDB database, one transaction per batch.
+	"""
+
+	# DuckDB type of each schema type
+	DUCKDB_TYPES = {'STRING': 'VARCHAR', 'TIMESTAMP': 'TIMESTAMPTZ', 'DATETIME': 'TIMESTAMP'}
+
+
+	def __init__(self, db_path: str, table_id: str = 'papers', max_rows: int = 10000) -> None:
+		"""
+		Initializes the writer, creating the database and table if needed.
+
+		:param db_path: str, path to the DuckDB database file.
+		:param table_id: str, name of the table.
+		:param max_rows: int, number of buffered rows written together.
+		"""
+		if duckdb is None:
+			raise ImportError("The DuckDB storage backend needs duckdb, install it with `pip install duckdb`.")
+
+		super().__init__(max_rows=max_rows)
+		self.db_path = db_path
+		self.table_id = table_id
+
+		columns = ", ".join(
+			f"{field.name} {self.DUCKDB_TYPES[field.field_type]}{'[]' if field.mode == 'REPEATED' else ''}"
+			for field in self.create_schema()
+		)
+		self.connection = duckdb.connect(db_path)
+		self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table_id} ({columns})")
+
+
+	def write_rows(self, rows: List[dict]) -> None:
+		names = [field.name for field in self.create_schema()]
+		statement = f"INSERT INTO {self.table_id} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+
+		self.connection.execute("BEGIN TRANSACTION")
+		try:
+			self.connection.executemany(statement, [[row[name] for name in names] for row in rows])
+			self.connection.execute("COMMIT")
+		except Exception:
+			self.connection.execute("ROLLBACK")
+			raise
+
+
+	def describe(self) -> str:
+		return f"DuckDB table {self.db_path}:{self.table_id}"
+
+
+	def close(self) -> List[dict]:
+		"""
+		Flushes the remaining rows and closes the database.
+
+		:returns: list of dict, rejected rows with their errors.
+		"""
+		failed_rows = self.flush()
+		self.connection.close()
+
+		return failed_rows
+
+
+def create_storer(backend: str, project_id: str = None, dataset_id: str = None, table_id: str = None, output_path: str = None, buffered: bool = False) -> StorageBackend:
+	"""
+	Creates the sink where extracted data is stored.
+
+	:param backend: str, 'bigquery', 'bigquery_backfill', 'parquet' or 'duckdb'.
+	:param project_id: str, Google Cloud project ID, for BigQuery.
+	:param dataset_id: str, BigQuery dataset ID, for BigQuery.
+	:param table_id: str, table ID, for BigQuery and DuckDB.
+	:param output_path: str, dataset directory for Parquet or database file for DuckDB.
+	:param buffered: bool, whether BigQuery rows are inserted in bulk, local sinks always write in batches.
+	:returns: StorageBackend, sink of the extracted data.
+	"""
+	if backend == 'bigquery':
+		storer_class = BufferedDataStorer if buffered else DataStorer
+		return storer_class(project_id=project_id, dataset_id=dataset_id, table_id=table_id)
+	if backend == 'bigquery_backfill':
+		return BackfillDataStorer(project_id=project_id, dataset_id=dataset_id, table_id=table_id)
+	if backend == 'parquet':
+		return ParquetStorer(output_path)
+	if backend == 'duckdb':
+		return DuckDBStorer(output_path, table_id=table_id or 'papers')
+
+	raise ValueError(f"Unknown storage backend: {backend}")
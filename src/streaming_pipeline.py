@@ -0,0 +1,138 @@
+import time
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+
+class PipelineStage:
+	"""
+	Stage of a streaming pipeline, applying a function to every item with its own number of worker threads.
+	"""
+
+	def __init__(self, name: str, function: Callable, workers: int = 1) -> None:
+		"""
+		Initializes the stage.
+
+		:param name: str, name of the stage, used in reports.
+		:param function: callable, takes an item and returns the item passed on to the next stage.
+		:param workers: int, number of threads running the function concurrently.
+		"""
+		self.name = name
+		self.function = function
+		self.workers = workers
+
+		# Items processed and time spent processing them, summed over the workers
+		self.processed = 0
+		self.busy_seconds = 0.0
+		self.lock = threading.Lock()
+
+
+	def get_stats(self, elapsed_seconds: float) -> dict:
+		"""
+		Summarizes the work of the stage.
+
+		:param elapsed_seconds: float, duration of the run.
+		:returns: dict, number of items processed, time spent on them and fraction of the time the workers were busy.
+		"""
+		capacity = elapsed_seconds * self.workers
+		return {
+			'workers': self.workers,
+			'processed': self.processed,
+			'busy_seconds': self.busy_seconds,
+			'utilization': self.busy_seconds / capacity if capacity > 0 else 0.0
+		}
+
+
+class StreamingPipeline:
+	"""
+	Runs items through a sequence of stages connected by bounded queues, so that every stage works on
+	a different item at the same time. A stage whose queue is full blocks the previous one, which keeps
+	a fast stage from piling up items in memory while a slower one is the bottleneck.
+	"""
+
+	# Marks the end of the items in a queue
+	DONE = object()
+
+
+	def __init__(self, stages: List[PipelineStage], queue_size: int = 8, is_finished: Callable = None) -> None:
+		"""
+		Initializes the pipeline.
+
+		:param stages: list of PipelineStage, stages run in order.
+		:param queue_size: int, maximum number of items waiting in front of each stage.
+		:param is_finished: callable, optional predicate of the items needing no further stage, which leave the pipeline early.
+		"""
+		self.stages = stages
+		self.queue_size = queue_size
+		self.is_finished = is_finished
+
+
+	def run(self, items: Iterable) -> Iterator[tuple]:
+		"""
+		Streams items through the stages.
+
+		:param items: iterable, items given to the first stage, consumed as the pipeline makes room for them.
+		:returns: iterator of tuple, each item with the exception raised by the stage it failed in, or None,
+			in the order they leave the pipeline.
+		"""
+		queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+		results = queue.Queue()
+		remaining_workers = [stage.workers for stage in self.stages]
+		lock = threading.Lock()
+
+		def feed():
+			try:
+				for item in items:
+					queues[0].put(item)
+			finally:
+				for _ in range(self.stages[0].workers):
+					queues[0].put(self.DONE)
+
+		def work(index: int):
+			stage = self.stages[index]
+			while True:
+				item = queues[index].get()
+				if item is self.DONE:
+					break
+
+				start_time = time.perf_counter()
+				try:
+					item = stage.function(item)
+					error = None
+				except Exception as e:
+					error = e
+				with stage.lock:
+					stage.processed += 1
+					stage.busy_seconds += time.perf_counter() - start_time
+
+				last_stage = index == len(self.stages) - 1
+				if error is not None or last_stage or (self.is_finished is not None and self.is_finished(item)):
+					results.put((item, error))
+				else:
+					queues[index + 1].put(item)
+
+			# The last worker of a stage to stop tells the next stage that no more items will come
+			with lock:
+				remaining_workers[index] -= 1
+				last_worker = remaining_workers[index] == 0
+			if last_worker:
+				if index == len(self.stages) - 1:
+					results.put(self.DONE)
+				else:
+					for _ in range(self.stages[index + 1].workers):
+						queues[index + 1].put(self.DONE)
+
+		threads = [threading.Thread(target=feed, daemon=True)]
+		for index, stage in enumerate(self.stages):
+			threads.extend(threading.Thread(target=work, args=(index,), daemon=True) for _ in range(stage.workers))
+		for thread in threads:
+			thread.start()
+
+		while True:
+			result = results.get()
+			if result is self.DONE:
+				break
+			yield result
+
+		for thread in threads:
+			thread.join()
@@ -0,0 +1,137 @@
+import re
+from typing import Callable, List
+
+
+class TextChunker:
+	"""
+	Splits the text of a research paper into chunks that fit a token budget,
+	cutting at section boundaries whenever possible.
+	"""
+
+	# Lines that look like section headings, either numbered ("2.1 Methods") or well-known names
+	HEADING_PATTERN = re.compile(
+		r'^(?:\d+(?:\.\d+)*\.?\s+[A-Z][^.!?]{0,80}'
+		r'|(?:abstract|introduction|background|related work|methods?|methodology|materials and methods'
+		r'|experiments?|results|discussion|conclusions?|references|acknowledg(?:e)?ments?|appendix)\b.{0,40})$',
+		re.IGNORECASE
+	)
+	TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+	def __init__(self, max_tokens: int = 3000, token_counter: Callable[[str], int] = None) -> None:
+		"""
+		Initializes the chunker.
+
+		:param max_tokens: int, maximum number of tokens per chunk.
+		:param token_counter: callable, function counting the tokens of a text, defaults to count_tokens.
+		"""
+		self.max_tokens = max_tokens
+		self.token_counter = token_counter or self.count_tokens
+
+
+	@classmethod
+	def count_tokens(cls, text: str) -> int:
+		"""
+		Approximates the number of tokens of a text by counting words and punctuation marks.
+
+		:param text: str, text to be measured.
+		:returns: int, approximate number of tokens.
+		"""
+		return len(cls.TOKEN_PATTERN.findall(text))
+
+
+	def split_sections(self, text: str) -> List[str]:
+		"""
+		Splits the text into sections, starting a new one at every line that looks like a heading.
+
+		:param text: str, text to be split.
+		:returns: list of str, sections of the text.
+		"""
+		sections, current = [], []
+		for line in text.split('\n'):
+			if current and self.HEADING_PATTERN.match(line.strip()):
+				sections.append('\n'.join(current))
+				current = []
+			current.append(line)
+
+		if current:
+			sections.append('\n'.join(current))
+
+		return sections
+
+
+	def split_oversized(self, text: str) -> List[str]:
+		"""
+		Splits a piece of text longer than the token budget, first by lines and then by words.
+
+		:param text: str, text exceeding the token budget.
+		:returns: list of str, pieces within the token budget.
+		"""
+		pieces = []
+		for line in text.split('\n'):
+			if self.token_counter(line) <= self.max_tokens:
+				pieces.append(line)
+				continue
+
+			words, current = line.split(' '), []
+			for word in words:
+				if current and self.token_counter(' '.join(current + [word])) > self.max_tokens:
+					pieces.append(' '.join(current))
+					current = []
+				current.append(word)
+			if current:
+				pieces.append(' '.join(current))
+
+		return pieces
+
+
+	def chunk(self, text: str) -> List[str]:
+		"""
+		Splits the text into chunks within the token budget. Whole sections are packed together
+		while they fit, and only sections larger than the budget are cut inside.
+
+		:param text: str, text to be split.
+		:returns: list of str, chunks of the text in their original order.
+		"""
+		chunks, current, current_tokens = [], [], 0
+
+		for section in self.split_sections(text):
+			section_tokens = self.token_counter(section)
+			pieces = [section] if section_tokens <= self.max_tokens else self.split_oversized(section)
+
+			for piece in pieces:
+				piece_tokens = section_tokens if len(pieces) == 1 else self.token_counter(piece)
+				if current and current_tokens + piece_tokens > self.max_tokens:
+					chunks.append('\n'.join(current))
+					current, current_tokens = [], 0
+				current.append(piece)
+				current_tokens += piece_tokens
+
+		if current:
+			chunks.append('\n'.join(current))
+
+		return chunks
+
+
+	def truncate(self, text: str, max_tokens: int) -> str:
+		"""
+		Cuts a text to its first words within a token budget.
+
+		:param text: str, text to be cut.
+		:param max_tokens: int, maximum number of tokens kept.
+		:returns: str, beginning of the text within the budget.
+		"""
+		if self.token_counter(text) <= max_tokens:
+			return text
+
+		# Find the largest number of leading words within the budget
+		words = text.split()
+		low, high = 0, len(words)
+		while low < high:
+			middle = (low + high + 1) // 2
+			if self.token_counter(' '.join(words[:middle])) <= max_tokens:
+				low = middle
+			else:
+				high = middle - 1
+
+		return ' '.join(words[:low])
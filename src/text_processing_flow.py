@@ -1,191 +1,709 @@
-import logging
-from typing_extensions import TypedDict
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from src.data_storer import DataStorer
-from src.document_ingestor import DocumentIngestor
-from src.information_extractor import InformationExtractor
-
-
-class State(TypedDict):
-	"""
-	State is used as a container to manage the data being processed and passed between
-	different stages of the LangGraph pipeline. This structured type helps to maintain 
-	the state of extracted content and any additional information generated at each 
-	processing stage.
-	"""
-	pdf_content: str
-	extracted_data: dict
-
-
-class TextProcessingFlow:
-	"""
-	Manages the workflow for extracting text from a research paper in a PDF file, processing the text
-	to extract structured information, and storing this data in a BigQuery table.
-	"""
-
-	def __init__(self, file_path: str, openai_api_key: str, project_id: str, dataset_id: str, table_id: str) -> None:
-		"""
-		Initializes with necessary components for document ingestion, information extraction,
-		and data storage in a BigQuery table.
-
-		:param file_path: Path to the PDF file.
-		:param openai_api_key: API key for OpenAI.
-		:param project_id: Google Cloud project ID.
-		:param dataset_id: BigQuery dataset ID.
-		:param table_id: BigQuery table ID.
-		"""
-		self.file_path = file_path
-		self.openai_api_key = openai_api_key
-		self.project_id = project_id
-		self.dataset_id = dataset_id
-		self.table_id = table_id
-
-		# Set up logging
-		logging.basicConfig(level=logging.INFO)
-
-		# Create and compile the workflow using LangGraph
-		self.workflow = self.create_workflow()
-
-
-	def ingest_document(self, state) -> dict:
-		"""
-		Node function to ingest a document and extract text from it.
-		"""
-		# Initialize Document Ingestor
-		document_ingestor = DocumentIngestor(self.file_path)
-
-		# Extract text from PDF and save it into state
-		try:
-			state['pdf_content'] = document_ingestor.process_text()
-			logging.info("Text processed successfully from PDF file.")
-		
-		except Exception as e:
-			logging.error(f"Failed to process text from PDF file: {e}")
-
-		return {'pdf_content': state['pdf_content']}
-
-
-	def extract_information(self, state) -> dict:
-		"""
-		Node function to extract information from the PDF content.
-		"""
-		# Initialize Information Extractor
-		information_extractor = InformationExtractor(raw_text=state['pdf_content'], openai_api_key=self.openai_api_key)
-
-		# Extract needed info from text and save it into state
-		try:
-			state['extracted_data'] = information_extractor.get_extracted_data()
-			logging.info("Data extracted successfully from text.")
-	
-		except Exception as e:
-			logging.error(f"Failed to extract data from text: {e}")
-
-		return {'extracted_data': state['extracted_data']}
-
-
-	def store_information(self, state) -> dict:
-		"""
-		Node function to store extracted information in BigQuery.
-		"""
-		# Initialize Data Storer
-		data_storer = DataStorer(project_id=self.project_id, dataset_id=self.dataset_id, table_id=self.table_id)
-		# Store extracted data in BigQuery
-		try:
-			data_storer.store_data(state['extracted_data'])
-			logging.info("Data stored successfully in BigQuery.")
-	
-		except Exception as e:
-			logging.error(f"Failed to store data in BigQuery: {e}")
-
-		return {}
-
-
-	def create_graph_nodes(self, workflow: StateGraph) -> StateGraph:
-		"""
-		Adds nodes to the workflow of the StateGraph. Each node represents a distinct
-		processing step in the computational pipeline. Nodes are associated with their
-		respective processing functions.
-
-		This function defines three primary nodes:
-		- ingest_document: Responsible for ingesting and extracting text from a PDF.
-		- extract_information: Responsible for extracting structured information from raw text.
-		- store_information: Responsible for storing the extracted information into BigQuery.
-
-		:param workflow: StateGraph, workflow execution graph to be configured with nodes.
-		:returns: StateGraph, workflow with added nodes.
-		"""
-		# Add a node for the document ingestion process, associating it with its method
-		workflow.add_node('ingest_document', self.ingest_document)
-
-		# Add a node for the information extraction process, associating it with its method
-		workflow.add_node('extract_information', self.extract_information)
-
-		# Add a node for the data storage process, associating it with its method
-		workflow.add_node('store_information', self.store_information)
-
-		return workflow
-
-
-	def create_graph_edges(self, workflow: StateGraph) -> StateGraph:
-		"""
-		Defines the directed edges between nodes within the workflow graph of StateGraph.
-		These edges establish a processing sequence, dictating the order in which nodes
-		should be executed.
-
-		The current sequence is structured as follows:
-		1. Start with the 'ingest_document' node.
-		2. Proceed to the 'extract_information' node.
-		3. Move to the 'store_information' node.
-		4. Conclude the process at the END node.
-
-		:param workflow: StateGraph, workflow execution graph to configure with edges.
-		:returns: StateGraph, workflow with added edges.
-		"""
-		# Connect the START node to the 'ingest_document' node
-		workflow.add_edge(START, 'ingest_document')
-
-		# Connect 'ingest_document' to the next node, 'extract_information'
-		workflow.add_edge('ingest_document', 'extract_information')
-
-		# Connect 'extract_information' to 'store_information', continuing the process flow
-		workflow.add_edge('extract_information', 'store_information')
-
-		# Connect 'store_information' to the END node, marking the conclusion of the process
-		workflow.add_edge('store_information', END)
-
-		return workflow
-
-
-	def create_workflow(self):
-		"""
-		Creates and compiles the workflow using LangGraph, which orchestrates it.
-		"""
-		# Set up memory
-		memory = MemorySaver()
-		
-		# Initialize workflow
-		workflow = StateGraph(State)
-		
-		# Add nodes
-		workflow = self.create_graph_nodes(workflow)
-		
-		# Define edges between nodes
-		workflow = self.create_graph_edges(workflow)
-
-		# Compile workflow into a LangChain Runnable, meaning it can be used as we would any other runnable
-		return workflow.compile(checkpointer=memory)
-
-
-	def run(self):
-		"""
-		Executes the processing workflow.
-		"""
-		# Set up configuration
-		self.config = {'configurable': {'thread_id': 'my_thread'}}
-
-		# Set up initial state
-		initial_state = State(pdf_content="", extracted_data={})
-		
-		# Run the workflow
-		self.workflow.invoke(input=initial_state, config=self.config)
+import os
+import asyncio
+import logging
+import threading
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.language_models.llms import BaseLLM
+from src.data_storer import StorageBackend, DataStorer
+from src.document_ingestor import DocumentIngestor
+from src.text_chunker import TextChunker
+from src.response_cache import ResponseCache
+from src.rate_limiter import RateLimiter
+from src.information_extractor import InformationExtractor, ExtractionFailure
+from src.flow_metrics import FlowMetrics, DocumentMetrics
+from src.duplicate_detector import DuplicateDetector
+from src.search_index import SearchIndex
+from src.embedding_index import Embedder, EmbeddingIndex, HashingEmbedder
+
+
+class State(TypedDict):
+	"""
+	State is used as a container to manage the data being processed and passed between
+	different stages of the LangGraph pipeline. This structured type helps to maintain 
+	the state of extracted content and any additional information generated at each 
+	processing stage.
+	"""
+	file_path: str
+	pdf_content: str
+	sections: dict
+	metadata: dict
+	page_count: int
+	duplicate_of: str
+	extracted_data: dict
+	stored: bool
+
+
+class TextProcessingFlow:
+	"""
+	Manages the workflow for extracting text from a research paper in a PDF file, processing the text
+	to extract structured information, and storing this data in a BigQuery table.
+	"""
+
+	def __init__(
+		self,
+		file_path: str,
+		openai_api_key: str,
+		project_id: str,
+		dataset_id: str,
+		table_id: str,
+		combined_extraction: bool = False,
+		extraction_concurrency: int = 1,
+		cache: ResponseCache = None,
+		data_storer: StorageBackend = None,
+		chunker: TextChunker = None,
+		metadata_threshold: float = 0.8,
+		page_workers: int = 1,
+		checkpoint_path: str = None,
+		metrics: FlowMetrics = None,
+		rate_limiter: RateLimiter = None,
+		llm: BaseLLM = None,
+		duplicate_detector: DuplicateDetector = None,
+		search_index: SearchIndex = None,
+		embedding_index: EmbeddingIndex = None,
+		embedder: Embedder = None
+	) -> None:
+		"""
+		Initializes with necessary components for document ingestion, information extraction,
+		and data storage in a BigQuery table.
+
+		:param file_path: Path to the PDF file.
+		:param openai_api_key: API key for OpenAI.
+		:param project_id: Google Cloud project ID.
+		:param dataset_id: BigQuery dataset ID.
+		:param table_id: BigQuery table ID.
+		:param combined_extraction: Whether to extract all fields with a single LLM call.
+		:param extraction_concurrency: Maximum number of field prompts running concurrently, 1 runs them sequentially.
+		:param cache: Optional cache of LLM responses shared by all documents.
+		:param data_storer: Optional long-lived storer shared by all documents, such as a BufferedDataStorer or a local Parquet or DuckDB sink.
+		:param chunker: Optional splitter enabling token-aware extraction of long papers.
+		:param metadata_threshold: Minimum confidence for PDF metadata to be used instead of the LLM.
+		:param page_workers: Number of processes extracting the pages of large PDFs in parallel.
+		:param checkpoint_path: Optional SQLite file where the state of each document is persisted after every node,
+			so that reruns resume from the last completed node. State is kept in memory when not given.
+		:param metrics: Optional collector of the timings, token usage and sizes of each document, a new one is created when not given.
+		:param rate_limiter: Optional limiter shared by every LLM call, keeping the pipeline within the API quota.
+		:param llm: Optional LLM backend shared by every extractor, such as an offline one from llm_backends. An OpenAI model is created when not given.
+		:param duplicate_detector: Optional index of the papers already stored, near-duplicates of which reuse their
+			extracted data instead of being extracted again. Every paper is extracted when not given.
+		:param search_index: Optional local full-text index updated with every paper stored.
+		:param embedding_index: Optional index of the vectors of the title, abstract and summary of every paper stored,
+			to find similar papers.
+		:param embedder: Optional model embedding the papers for the embedding index, an offline HashingEmbedder when not given.
+		"""
+		self.file_path = file_path
+		self.openai_api_key = openai_api_key
+		self.project_id = project_id
+		self.dataset_id = dataset_id
+		self.table_id = table_id
+		self.combined_extraction = combined_extraction
+		self.extraction_concurrency = extraction_concurrency
+		self.cache = cache
+		self.data_storer = data_storer
+		self.chunker = chunker
+		self.metadata_threshold = metadata_threshold
+		self.page_workers = page_workers
+		self.checkpoint_path = checkpoint_path
+		self.metrics = metrics or FlowMetrics()
+		self.rate_limiter = rate_limiter
+		self.duplicate_detector = duplicate_detector
+		self.search_index = search_index
+		self.embedding_index = embedding_index
+		if embedding_index is not None and embedder is None:
+			embedder = HashingEmbedder(dimensions=embedding_index.dimensions)
+		self.embedder = embedder
+
+		# Long-lived clients shared by every document: the LLM and BigQuery clients keep their HTTP
+		# connections alive, and the extractor of each worker thread reuses the chains shared by all of them
+		self.llm = llm
+		self.chains = {}
+		self.extractors = threading.local()
+		self.clients_lock = threading.Lock()
+
+		# Event loop of the asynchronous extraction, run by its own thread for the lifetime of the flow, as the
+		# async client of the shared LLM keeps connections bound to the loop they were opened in
+		self.event_loop = None
+		self.event_loop_thread = None
+
+		# Number of documents skipped by run because they were already stored
+		self.skipped_documents = 0
+
+		# Set up logging
+		logging.basicConfig(level=logging.INFO)
+
+		# Create and compile the workflow using LangGraph
+		self.checkpointer = None
+		self.workflow = self.create_workflow()
+
+		# Same workflow stopping before the extraction and the storage, so that batches can run the stages
+		# of different documents concurrently, see start_document
+		self.step_workflow = self.create_workflow(interrupt_before=['extract_information', 'store_information'])
+
+
+	def ingest_document(self, state) -> dict:
+		"""
+		Node function to ingest a document and extract text from it.
+		Ingestion is skipped when the state already holds the text of the document.
+		"""
+		if state.get('pdf_content'):
+			return {'pdf_content': state['pdf_content']}
+
+		# Initialize Document Ingestor
+		document_ingestor = DocumentIngestor(state.get('file_path') or self.file_path, workers=self.page_workers)
+
+		# Extract text, section index and metadata from PDF and save them into state
+		try:
+			with self.get_document_metrics(state).measure('ingest_document'):
+				ingested = document_ingestor.ingest()
+			state.update(ingested)
+			logging.info("Text processed successfully from PDF file.")
+		
+		except Exception as e:
+			logging.error(f"Failed to process text from PDF file: {e}")
+			return {'pdf_content': state['pdf_content']}
+
+		return ingested
+
+
+	def check_duplicate(self, state) -> dict:
+		"""
+		Node function to look for a near-duplicate of the document among the papers already stored,
+		such as another version of the same paper, whose extracted data is then reused.
+		"""
+		if not state['pdf_content']:
+			return {'duplicate_of': None}
+
+		file_path = os.path.abspath(state.get('file_path') or self.file_path)
+		try:
+			with self.get_document_metrics(state).measure('check_duplicate'):
+				duplicate = self.duplicate_detector.find_duplicate(file_path, state['pdf_content'])
+		except Exception as e:
+			logging.error(f"Failed to look for near-duplicates: {e}")
+			return {'duplicate_of': None}
+
+		if duplicate is None:
+			return {'duplicate_of': None}
+
+		# The data of the duplicate is already stored, link the document to it instead of storing it again
+		duplicate_path, extracted_data, similarity = duplicate
+		try:
+			self.duplicate_detector.link(file_path, duplicate_path, similarity)
+		except Exception as e:
+			logging.error(f"Failed to link the document to its near-duplicate {duplicate_path}, extracting it: {e}")
+			return {'duplicate_of': None}
+		logging.info(f"Reusing the extracted data of {duplicate_path}, a near-duplicate with a similarity of {similarity:.2f}.")
+
+		return {'duplicate_of': duplicate_path, 'extracted_data': extracted_data, 'stored': True}
+
+
+	def route_after_duplicate_check(self, state) -> str:
+		"""
+		Chooses the node following the duplicate check, near-duplicates skip extraction and storage.
+		"""
+		return END if state.get('duplicate_of') else 'extract_information'
+
+
+	def extract_information(self, state) -> dict:
+		"""
+		Node function to extract information from the PDF content.
+		"""
+		document_metrics = self.get_document_metrics(state)
+		document_metrics.record_document(state.get('page_count') or 0, len(state['pdf_content']))
+
+		# Point the extractor of this thread at the document
+		information_extractor = self.get_information_extractor()
+		information_extractor.set_raw_text(
+			state['pdf_content'],
+			sections=state.get('sections'),
+			metadata=state.get('metadata'),
+			metrics=document_metrics
+		)
+
+		# Extract needed info from text and save it into state
+		try:
+			with document_metrics.measure('extract_information'):
+				if self.extraction_concurrency > 1 and not self.combined_extraction:
+					state['extracted_data'] = asyncio.run_coroutine_threadsafe(
+						information_extractor.aget_extracted_data(max_concurrency=self.extraction_concurrency),
+						self.get_event_loop()
+					).result()
+				else:
+					state['extracted_data'] = information_extractor.get_extracted_data(combined=self.combined_extraction)
+
+			failures = ExtractionFailure.find(state['extracted_data'])
+			if failures:
+				logging.error(f"Failed to extract {', '.join(failure.field for failure in failures)} from text.")
+			else:
+				logging.info("Data extracted successfully from text.")
+	
+		except Exception as e:
+			logging.error(f"Failed to extract data from text: {e}")
+
+		return {'extracted_data': state['extracted_data']}
+
+
+	def store_information(self, state) -> dict:
+		"""
+		Node function to store extracted information in BigQuery.
+		"""
+		# Never store a row with fields that could not be extracted
+		if ExtractionFailure.find(state['extracted_data']):
+			logging.error("Extracted data has failed fields, not storing it.")
+			return {'stored': False}
+
+		data_storer = self.get_data_storer()
+
+		# Store extracted data in BigQuery, buffered storers only add the row to their buffer here and
+		# time their inserts themselves, see flush_seconds
+		try:
+			with self.get_document_metrics(state).measure('store_data'):
+				failed_rows = data_storer.store_data(state['extracted_data'], key=state.get('file_path') or self.file_path)
+			if failed_rows:
+				logging.error("BigQuery rejected the extracted data.")
+				return {'stored': False}
+			logging.info("Data stored successfully in BigQuery.")
+	
+		except Exception as e:
+			logging.error(f"Failed to store data in BigQuery: {e}")
+			return {'stored': False}
+
+		self.index_document(state)
+
+		return {'stored': True}
+
+
+	def index_document(self, state) -> None:
+		"""
+		Adds a stored document to the local indexes, its data being stored even if this fails.
+
+		:param state: State, state of the workflow.
+		"""
+		file_path = os.path.abspath(state.get('file_path') or self.file_path)
+
+		# Later versions of the paper can now reuse its extracted data, a document stored again after its
+		# text was released was already added when it was first stored
+		if self.duplicate_detector is not None and state.get('pdf_content'):
+			try:
+				self.duplicate_detector.add(file_path, state['pdf_content'], state['extracted_data'])
+			except Exception as e:
+				logging.error(f"Failed to add the document to the duplicate index: {e}")
+
+		if self.search_index is not None:
+			try:
+				self.search_index.add(file_path, state['extracted_data'])
+			except Exception as e:
+				logging.error(f"Failed to add the document to the search index: {e}")
+
+		# Similar papers are found from the title, abstract and summary
+		if self.embedding_index is not None:
+			text = '\n'.join(str(state['extracted_data'].get(field) or '') for field in ('title', 'abstract', 'summary'))
+			try:
+				with self.get_document_metrics(state).measure('embed_document'):
+					self.embedding_index.add(file_path, self.embedder.embed([text])[0])
+			except Exception as e:
+				logging.error(f"Failed to add the document to the embedding index: {e}")
+
+
+	def get_information_extractor(self) -> InformationExtractor:
+		"""
+		Returns the information extractor of the current thread, created on first use. Extractors hold
+		the state of the document being processed, so each thread gets its own, but all of them share
+		the same LLM client and the chains built once per prompt template from it.
+
+		:returns: InformationExtractor, extractor of the current thread.
+		"""
+		information_extractor = getattr(self.extractors, 'information_extractor', None)
+		if information_extractor is None:
+			with self.clients_lock:
+				information_extractor = InformationExtractor(
+					raw_text="",
+					openai_api_key=self.openai_api_key,
+					cache=self.cache,
+					chunker=self.chunker,
+					metadata_threshold=self.metadata_threshold,
+					llm=self.llm,
+					rate_limiter=self.rate_limiter,
+					chains=self.chains
+				)
+				self.llm = information_extractor.llm
+			self.extractors.information_extractor = information_extractor
+
+		return information_extractor
+
+
+	def get_data_storer(self) -> StorageBackend:
+		"""
+		Returns the data storer shared by every document, created on first use unless one was provided.
+
+		:returns: StorageBackend, storer of the extracted data.
+		"""
+		if self.data_storer is None:
+			with self.clients_lock:
+				if self.data_storer is None:
+					self.data_storer = DataStorer(project_id=self.project_id, dataset_id=self.dataset_id, table_id=self.table_id)
+
+		return self.data_storer
+
+
+	def get_event_loop(self) -> asyncio.AbstractEventLoop:
+		"""
+		Returns the event loop running the asynchronous extraction of every document, started on first use.
+
+		:returns: asyncio.AbstractEventLoop, loop running in its own thread.
+		"""
+		if self.event_loop is None:
+			with self.clients_lock:
+				if self.event_loop is None:
+					event_loop = asyncio.new_event_loop()
+					self.event_loop_thread = threading.Thread(target=event_loop.run_forever, daemon=True)
+					self.event_loop_thread.start()
+					self.event_loop = event_loop
+
+		return self.event_loop
+
+
+	def get_document_metrics(self, state) -> DocumentMetrics:
+		"""
+		Returns the metrics of the document being processed.
+
+		:param state: State, state of the workflow.
+		:returns: DocumentMetrics, metrics of the document.
+		"""
+		return self.metrics.document(state.get('file_path') or self.file_path)
+
+
+	def create_graph_nodes(self, workflow: StateGraph) -> StateGraph:
+		"""
+		Adds nodes to the workflow of the StateGraph. Each node represents a distinct
+		processing step in the computational pipeline. Nodes are associated with their
+		respective processing functions.
+
+		This function defines three primary nodes:
+		- ingest_document: Responsible for ingesting and extracting text from a PDF.
+		- extract_information: Responsible for extracting structured information from raw text.
+		- store_information: Responsible for storing the extracted information into BigQuery.
+
+		When a duplicate detector is configured, check_duplicate looks for a near-duplicate of the
+		document before its extraction.
+
+		:param workflow: StateGraph, workflow execution graph to be configured with nodes.
+		:returns: StateGraph, workflow with added nodes.
+		"""
+		# Add a node for the document ingestion process, associating it with its method
+		workflow.add_node('ingest_document', self.ingest_document)
+
+		# Add a node looking for near-duplicates of the document when an index is configured
+		if self.duplicate_detector is not None:
+			workflow.add_node('check_duplicate', self.check_duplicate)
+
+		# Add a node for the information extraction process, associating it with its method
+		workflow.add_node('extract_information', self.extract_information)
+
+		# Add a node for the data storage process, associating it with its method
+		workflow.add_node('store_information', self.store_information)
+
+		return workflow
+
+
+	def create_graph_edges(self, workflow: StateGraph) -> StateGraph:
+		"""
+		Defines the directed edges between nodes within the workflow graph of StateGraph.
+		These edges establish a processing sequence, dictating the order in which nodes
+		should be executed.
+
+		The current sequence is structured as follows:
+		1. Start with the 'ingest_document' node.
+		2. Proceed to the 'extract_information' node, unless 'check_duplicate' finds a near-duplicate
+		   whose extracted data is reused, which concludes the process.
+		3. Move to the 'store_information' node.
+		4. Conclude the process at the END node.
+
+		:param workflow: StateGraph, workflow execution graph to configure with edges.
+		:returns: StateGraph, workflow with added edges.
+		"""
+		# Connect the START node to the 'ingest_document' node
+		workflow.add_edge(START, 'ingest_document')
+
+		# Connect 'ingest_document' to the next node, 'extract_information', through the duplicate check if any
+		if self.duplicate_detector is not None:
+			workflow.add_edge('ingest_document', 'check_duplicate')
+			workflow.add_conditional_edges('check_duplicate', self.route_after_duplicate_check, ['extract_information', END])
+		else:
+			workflow.add_edge('ingest_document', 'extract_information')
+
+		# Connect 'extract_information' to 'store_information', continuing the process flow
+		workflow.add_edge('extract_information', 'store_information')
+
+		# Connect 'store_information' to the END node, marking the conclusion of the process
+		workflow.add_edge('store_information', END)
+
+		return workflow
+
+
+	def create_workflow(self, interrupt_before: list = None):
+		"""
+		Creates and compiles the workflow using LangGraph, which orchestrates it.
+
+		:param interrupt_before: list, optional nodes the workflow stops before, running them when invoked again.
+		"""
+		# Set up memory, persisted on disk when a checkpoint file is given, and shared by every compiled workflow
+		if self.checkpointer is None:
+			if self.checkpoint_path:
+				import sqlite3
+				from langgraph.checkpoint.sqlite import SqliteSaver
+
+				self.checkpointer = SqliteSaver(sqlite3.connect(self.checkpoint_path, check_same_thread=False))
+			else:
+				self.checkpointer = MemorySaver()
+		
+		# Initialize workflow
+		workflow = StateGraph(State)
+		
+		# Add nodes
+		workflow = self.create_graph_nodes(workflow)
+		
+		# Define edges between nodes
+		workflow = self.create_graph_edges(workflow)
+
+		# Compile workflow into a LangChain Runnable, meaning it can be used as we would any other runnable
+		return workflow.compile(checkpointer=self.checkpointer, interrupt_before=interrupt_before)
+
+
+	def get_last_completed_node(self, values: dict) -> str:
+		"""
+		Finds the last node whose output is present in a saved state.
+
+		:param values: dict, saved state of a document.
+		:returns: str, name of the last completed node, or None if the document must start over.
+		"""
+		# Fields that failed are extracted again
+		if values.get('extracted_data') and not ExtractionFailure.find(values['extracted_data']):
+			return 'extract_information'
+		if values.get('pdf_content'):
+			return 'ingest_document'
+
+		return None
+
+
+	def run(self, file_path: str = None, pdf_content: str = "", sections: dict = None, metadata: dict = None, page_count: int = 0) -> dict:
+		"""
+		Executes the processing workflow. Each document is identified by the hash of its content:
+		documents already stored are skipped, and documents whose previous run failed or was
+		interrupted resume from their last completed node.
+
+		:param file_path: Path to the PDF file, defaults to the one given at initialization.
+		:param pdf_content: Text of the document when it has already been ingested.
+		:param sections: Section index of the document when it has already been ingested.
+		:param metadata: Bibliographic metadata of the document when it has already been ingested.
+		:param page_count: Number of pages of the document when it has already been ingested.
+		:returns: dict, final state of the workflow.
+		"""
+		file_path = file_path or self.file_path
+		config = self.get_config(file_path)
+
+		try:
+			return self.run_document(file_path, config, pdf_content, sections, metadata, page_count)
+		finally:
+			self.release_document(config)
+			# Log the timings and token usage of the document as a JSON line
+			self.metrics.finish_document(file_path)
+
+
+	def run_document(self, file_path: str, config: dict, pdf_content: str, sections: dict, metadata: dict, page_count: int) -> dict:
+		"""
+		Runs or resumes the workflow of a single document, see run.
+
+		:param file_path: Path to the PDF file.
+		:param config: Configuration of the workflow of the document.
+		:param pdf_content: Text of the document, empty to ingest it.
+		:param sections: Section index of the document.
+		:param metadata: Bibliographic metadata of the document.
+		:param page_count: Number of pages of the document.
+		:returns: dict, final state of the workflow.
+		"""
+		snapshot = self.workflow.get_state(config)
+
+		if snapshot.values.get('stored'):
+			logging.info(f"Skipping {file_path}, already stored.")
+			self.skipped_documents += 1
+			return snapshot.values
+
+		# The previous run was interrupted in the middle of the workflow
+		if snapshot.next:
+			logging.info(f"Resuming {file_path} at {', '.join(snapshot.next)}.")
+			return self.workflow.invoke(input=None, config=config)
+
+		# The previous run finished without storing the data, rerun the nodes after the last completed one
+		last_completed_node = self.get_last_completed_node(snapshot.values)
+		if last_completed_node is not None:
+			logging.info(f"Resuming {file_path} after {last_completed_node}.")
+			self.workflow.update_state(config, {}, as_node=last_completed_node)
+			return self.workflow.invoke(input=None, config=config)
+
+		# Set up initial state
+		initial_state = State(
+			file_path=file_path, pdf_content=pdf_content, sections=sections or {}, metadata=metadata or {},
+			page_count=page_count, duplicate_of=None, extracted_data={}, stored=False
+		)
+		
+		# Run the workflow
+		return self.workflow.invoke(input=initial_state, config=config)
+
+
+	def get_config(self, file_path: str, content_hash: str = None) -> dict:
+		"""
+		Builds the configuration of the workflow of a document, identified by the hash of its content.
+
+		:param file_path: str, path to the PDF file.
+		:param content_hash: str, hash of the content of the file when already computed, such as by a ledger.
+		:returns: dict, configuration with the thread of the document.
+		"""
+		# One thread per document so that documents can run concurrently
+		thread_id = content_hash
+		if thread_id is None:
+			try:
+				thread_id = DocumentIngestor(file_path).get_content_hash()
+			except Exception as e:
+				logging.warning(f"Failed to hash PDF file, using its path to identify it: {e}")
+				thread_id = file_path
+
+		return {'configurable': {'thread_id': thread_id}}
+
+
+	def get_document(self, file_path: str, config: dict) -> dict:
+		"""
+		Describes where a document stands in the stepwise workflow.
+
+		:param file_path: str, path to the PDF file.
+		:param config: dict, configuration of the workflow of the document.
+		:returns: dict, with the 'file_path' and 'config' of the document, the 'next' nodes it waits before,
+			empty once it is finished, and the 'values' of its state.
+		"""
+		snapshot = self.step_workflow.get_state(config)
+
+		return {'file_path': file_path, 'config': config, 'next': snapshot.next, 'values': snapshot.values}
+
+
+	def start_document(self, file_path: str, pdf_content: str = "", sections: dict = None, metadata: dict = None, page_count: int = 0, content_hash: str = None) -> dict:
+		"""
+		Starts a document in the stepwise workflow, which runs its ingestion and duplicate check and stops
+		before its extraction. Like run, documents already stored are skipped and others resume where
+		they stopped. Unlike run, the metrics of the document are not finished, see finish_document.
+
+		:param file_path: Path to the PDF file.
+		:param pdf_content: Text of the document when it has already been ingested.
+		:param sections: Section index of the document when it has already been ingested.
+		:param metadata: Bibliographic metadata of the document when it has already been ingested.
+		:param page_count: Number of pages of the document when it has already been ingested.
+		:param content_hash: Hash of the content of the file when already computed.
+		:returns: dict, document as described by get_document.
+		"""
+		config = self.get_config(file_path, content_hash)
+		snapshot = self.step_workflow.get_state(config)
+		last_completed_node = self.get_last_completed_node(snapshot.values)
+
+		if snapshot.values.get('stored'):
+			logging.info(f"Skipping {file_path}, already stored.")
+			self.skipped_documents += 1
+		elif snapshot.next:
+			logging.info(f"Resuming {file_path} at {', '.join(snapshot.next)}.")
+		elif last_completed_node is not None:
+			logging.info(f"Resuming {file_path} after {last_completed_node}.")
+			self.step_workflow.update_state(config, {}, as_node=last_completed_node)
+		else:
+			initial_state = State(
+				file_path=file_path, pdf_content=pdf_content, sections=sections or {}, metadata=metadata or {},
+				page_count=page_count, duplicate_of=None, extracted_data={}, stored=False
+			)
+			self.step_workflow.invoke(input=initial_state, config=config)
+
+		return self.get_document(file_path, config)
+
+
+	def resume_document(self, document: dict) -> dict:
+		"""
+		Runs a document started by start_document from the node it waits before up to the next stop,
+		before the storage or at the end of the workflow.
+
+		:param document: dict, document as described by get_document.
+		:returns: dict, document after the nodes run.
+		"""
+		self.step_workflow.invoke(input=None, config=document['config'])
+
+		return self.get_document(document['file_path'], document['config'])
+
+
+	def mark_not_stored(self, config: dict) -> None:
+		"""
+		Records that the data of a finished document did not reach the table after all, such as rows
+		rejected when a buffered storer is flushed, so that reruns store it again.
+
+		:param config: dict, configuration of the workflow of the document.
+		"""
+		self.step_workflow.update_state(config, {'stored': False}, as_node='store_information')
+
+
+	def finish_document(self, file_path: str, config: dict = None) -> None:
+		"""
+		Logs the timings and token usage of a document processed with start_document as a JSON line,
+		and releases its state, see release_document.
+
+		:param file_path: str, path to the PDF file.
+		:param config: dict, optional configuration of the workflow of the document.
+		"""
+		if config is not None:
+			self.release_document(config)
+		self.metrics.finish_document(file_path)
+
+
+	def release_document(self, config: dict) -> None:
+		"""
+		Deletes the checkpoints of a finished document, in memory or in the checkpoint file, as every one
+		of them holds its whole text. A stored document keeps a single checkpoint of its state without its
+		text and section index, so that later runs still skip it, or store its data again if it is marked as
+		not stored. Documents that were not stored keep the checkpoints of the checkpoint file, reruns resume
+		from them.
+
+		:param config: dict, configuration of the workflow of the document.
+		"""
+		values = self.workflow.get_state(config).values
+		if not values.get('stored') and not isinstance(self.checkpointer, MemorySaver):
+			return
+
+		self.delete_checkpoints(config['configurable']['thread_id'])
+		if values.get('stored'):
+			values = {key: value for key, value in values.items() if key not in ('pdf_content', 'sections')}
+			self.workflow.update_state(config, values, as_node='store_information')
+
+
+	def delete_checkpoints(self, thread_id: str) -> None:
+		"""
+		Deletes every checkpoint of a thread.
+
+		:param thread_id: str, thread of the document.
+		"""
+		if isinstance(self.checkpointer, MemorySaver):
+			self.checkpointer.delete_thread(thread_id)
+			return
+
+		# The SqliteSaver of langgraph-checkpoint-sqlite 2.0 does not implement delete_thread, its cursor
+		# holds the lock of the connection and commits on exit
+		with self.checkpointer.cursor() as cursor:
+			cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+			cursor.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+
+	def close(self) -> None:
+		"""
+		Stops the event loop of the asynchronous extraction and closes the connection to the checkpoint
+		file. The storer and indexes given to the flow are closed by their owner.
+		"""
+		if self.event_loop is not None:
+			self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+			self.event_loop_thread.join()
+			self.event_loop.close()
+			self.event_loop, self.event_loop_thread = None, None
+
+		if self.checkpoint_path and self.checkpointer is not None:
+			self.checkpointer.conn.close()
@@ -0,0 +1,18 @@
+def make_extracted_data(title: str) -> dict:
+	"""
+	Builds example extracted data with the given title, as the extraction returns it.
+
+	:param title: str, title of the paper.
+	:returns: dict, extracted data with every field of the table schema.
+	"""
+	return {
+		'utc_timestamp': '2025/01/01 00:00:00',
+		'title': title,
+		'authors': 'Authors',
+		'publication_date': '2023/01/01',
+		'abstract': 'Abstract',
+		'findings': 'Findings',
+		'methodology': 'Methodology',
+		'summary': 'Summary',
+		'keywords': ['keyword1', 'keyword2']
+	}
@@ -0,0 +1,198 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.batch_processor import BatchProcessor
+from src.document_ledger import DocumentLedger
+
+
+class TestBatchProcessor(unittest.TestCase):
+	"""
+	Test cases for the BatchProcessor class.
+	"""
+
+	def setUp(self):
+		"""
+		Creates a temporary directory with some PDF files and a manifest.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.file_paths = []
+		for name in ['a.pdf', 'b.pdf', os.path.join('nested', 'c.pdf')]:
+			file_path = os.path.join(self.temp_dir.name, name)
+			os.makedirs(os.path.dirname(file_path), exist_ok=True)
+			with open(file_path, 'w') as f:
+				f.write(name)
+			self.file_paths.append(file_path)
+		open(os.path.join(self.temp_dir.name, 'notes.txt'), 'w').close()
+
+		self.manifest_path = os.path.join(self.temp_dir.name, 'manifest.txt')
+		with open(self.manifest_path, 'w') as f:
+			f.write("# papers to process\na.pdf\n\nnested/c.pdf\n")
+
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+
+	def test_collect_files(self):
+		"""
+		Tests collecting PDF files from a directory, a glob pattern and a manifest file.
+		"""
+		self.assertEqual(BatchProcessor.collect_files(self.temp_dir.name), sorted(self.file_paths))
+		self.assertEqual(BatchProcessor.collect_files(os.path.join(self.temp_dir.name, '*.pdf')), sorted(self.file_paths[:2]))
+		self.assertEqual(BatchProcessor.collect_files(self.manifest_path), [self.file_paths[0], self.file_paths[2]])
+
+
+	def make_flow(self, stored=lambda file_path: True) -> MagicMock:
+		"""
+		Mocks a flow whose documents wait before their extraction once started, then before their storage.
+
+		:param stored: callable, tells whether the data of a file is stored.
+		:returns: MagicMock, flow.
+		"""
+		flow = MagicMock()
+		flow.start_document.side_effect = lambda file_path, **ingested: {
+			'file_path': file_path, 'config': {}, 'next': ('extract_information',), 'values': {'extracted_data': {}}
+		}
+
+		def resume_document(document):
+			if document['next'] == ('extract_information',):
+				return {**document, 'next': ('store_information',), 'values': {'extracted_data': {'title': 'Mocked Title'}}}
+			return {**document, 'next': (), 'values': {**document['values'], 'stored': stored(document['file_path'])}}
+
+		flow.resume_document.side_effect = resume_document
+		return flow
+
+
+	@patch('src.batch_processor.ProcessPoolExecutor', ThreadPoolExecutor)
+	@patch('src.batch_processor.ingest_file')
+	def test_run_reports_each_paper(self, mock_ingest_file):
+		"""
+		Tests that a batch run reports success or failure for each paper, the throughput and the work of each stage.
+		"""
+		def fake_ingest(file_path):
+			if file_path.endswith('c.pdf'):
+				raise RuntimeError("Corrupted PDF")
+			return {'pdf_content': "Mocked PDF content", 'sections': {}, 'metadata': {}}
+
+		mock_ingest_file.side_effect = fake_ingest
+		flow = self.make_flow(stored=lambda file_path: not file_path.endswith('b.pdf'))
+
+		report = BatchProcessor(flow, ingest_workers=2, io_workers=2).run(self.temp_dir.name)
+
+		statuses = {os.path.basename(result['file_path']): result['status'] for result in report['results']}
+		self.assertEqual(statuses, {'a.pdf': 'succeeded', 'b.pdf': 'failed', 'c.pdf': 'failed'})
+		self.assertIn("Corrupted PDF", report['results'][2]['error'])
+		self.assertEqual(report['succeeded'], 1)
+		self.assertEqual(report['failed'], 2)
+		self.assertGreater(report['papers_per_second'], 0)
+		self.assertEqual(flow.start_document.call_count, 2)
+		self.assertEqual(flow.resume_document.call_count, 4)
+		self.assertEqual(flow.finish_document.call_count, 3)
+		self.assertEqual({name: stats['processed'] for name, stats in report['stages'].items()}, {'ingest': 3, 'extract': 2, 'store': 2})
+
+
+	@patch('src.batch_processor.ProcessPoolExecutor', ThreadPoolExecutor)
+	@patch('src.batch_processor.ingest_file', return_value={'pdf_content': "Mocked PDF content", 'sections': {}, 'metadata': {}})
+	def test_run_skips_documents_in_ledger(self, mock_ingest_file):
+		"""
+		Tests that a second run over the same files only processes the ones that failed.
+		"""
+		flow = self.make_flow(stored=lambda file_path: not file_path.endswith('b.pdf'))
+		ledger = DocumentLedger(os.path.join(self.temp_dir.name, 'ledger.sqlite'))
+		processor = BatchProcessor(flow, ingest_workers=2, io_workers=2, ledger=ledger)
+
+		first_report = processor.run(self.temp_dir.name)
+		second_report = processor.run(self.temp_dir.name)
+		ledger.close()
+
+		self.assertEqual(first_report['skipped'], 0)
+		self.assertEqual(second_report['skipped'], 2)
+		self.assertEqual([result['file_path'] for result in second_report['results']], [self.file_paths[1]])
+		self.assertEqual(flow.start_document.call_count, 4)
+
+
+	@patch('src.batch_processor.ProcessPoolExecutor', ThreadPoolExecutor)
+	@patch('src.batch_processor.ingest_file', return_value={'pdf_content': "Mocked PDF content", 'sections': {}, 'metadata': {}})
+	def test_run_fails_documents_of_rows_not_flushed(self, mock_ingest_file):
+		"""
+		Tests that documents whose buffered rows were rejected, or left over by a failed flush, are
+		recorded as failed in the ledger and marked as not stored, while the others are recorded as stored.
+		"""
+		flow = self.make_flow()
+		flow.start_document.side_effect = lambda file_path, **ingested: {
+			'file_path': file_path, 'config': {'configurable': {'thread_id': file_path}},
+			'next': ('extract_information',), 'values': {'extracted_data': {}}
+		}
+		flow.data_storer.flush.side_effect = RuntimeError("Connection reset")
+		flow.data_storer.get_pending_keys.return_value = [self.file_paths[1]]
+		flow.data_storer.take_rejected_rows.return_value = [
+			{'row': {}, 'errors': [{'reason': 'invalid', 'message': "Bad date"}], 'key': self.file_paths[0]}
+		]
+		ledger = DocumentLedger(os.path.join(self.temp_dir.name, 'ledger.sqlite'))
+		processor = BatchProcessor(flow, ingest_workers=2, io_workers=2, ledger=ledger)
+
+		report = processor.run(self.temp_dir.name)
+		errors = {os.path.basename(result['file_path']): result['error'] for result in report['results']}
+		self.assertEqual(report['succeeded'], 1)
+		self.assertIn("Bad date", errors['a.pdf'])
+		self.assertIn("Connection reset", errors['b.pdf'])
+		self.assertIsNone(errors['c.pdf'])
+		self.assertEqual(
+			sorted(call.args[0]['configurable']['thread_id'] for call in flow.mark_not_stored.call_args_list),
+			self.file_paths[:2]
+		)
+
+		flow.data_storer.flush.side_effect = None
+		flow.data_storer.get_pending_keys.return_value = []
+		flow.data_storer.take_rejected_rows.return_value = []
+		second_report = processor.run(self.temp_dir.name)
+		ledger.close()
+
+		self.assertEqual(second_report['skipped'], 1)
+		self.assertEqual([result['file_path'] for result in second_report['results']], self.file_paths[:2])
+
+
+	@patch('src.batch_processor.ProcessPoolExecutor', ThreadPoolExecutor)
+	@patch('src.batch_processor.ingest_file')
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_run_streams_documents_through_the_workflow(self, mock_openai, mock_client, mock_store, mock_extract, mock_ingest_file):
+		"""
+		Tests that documents go through the stages of the workflow of a real flow, and that a second
+		run skips the documents stored by the first one.
+		"""
+		from src.text_processing_flow import TextProcessingFlow
+
+		mock_ingest_file.side_effect = lambda file_path: {'pdf_content': f"Text of {file_path}", 'sections': {}, 'metadata': {}}
+		flow = TextProcessingFlow(
+			file_path=None, openai_api_key='dummy_api_key', project_id='dummy_project_id',
+			dataset_id='dummy_dataset_id', table_id='dummy_table_id'
+		)
+		processor = BatchProcessor(flow, ingest_workers=2, extract_workers=2, store_workers=1, queue_size=1)
+
+		report = processor.run(self.temp_dir.name)
+		self.assertEqual(report['succeeded'], 3)
+		self.assertEqual(mock_extract.call_count, 3)
+		self.assertEqual(mock_store.call_count, 3)
+		for file_path in self.file_paths:
+			self.assertTrue(flow.workflow.get_state(flow.get_config(file_path)).values['stored'])
+
+		report = processor.run(self.temp_dir.name)
+		self.assertEqual((report['succeeded'], report['failed'], report['skipped']), (0, 0, 3))
+		self.assertEqual({result['reason'] for result in report['results']}, {"already stored"})
+		self.assertEqual(report['papers_per_second'], 0.0)
+		self.assertEqual(flow.skipped_documents, 3)
+		self.assertEqual(report['stages']['store']['processed'], 0)
+		self.assertEqual(mock_store.call_count, 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,80 +1,301 @@
-import os
-import sys
-import unittest
-from unittest.mock import patch, MagicMock
-
-# Add the root of the project directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.data_storer import DataStorer
-
-
-class TestDataStorer(unittest.TestCase):
-	"""
-	Test cases for the DataStorer class.
-	"""
-
-	@patch('src.data_storer.Client', autospec=True)
-	def test_store_data(self, mock_bq_client):
-		"""
-		Test storing data in BigQuery using a mocked client.
-		"""
-		# Create a mock instance for BigQuery client
-		mock_client = mock_bq_client.return_value
-
-		# Set up the DataStorer with mock parameters
-		storer = DataStorer('project_id', 'dataset_id', 'table_id')
-
-		# Create example extracted data
-		extracted_data = {
-			'utc_timestamp': '2025/01/01 00:00:00',
-			'title': 'Title',
-			'authors': 'Authors',
-			'publication_date': '2023/01/01',
-			'abstract': 'Abstract',
-			'findings': 'Findings',
-			'methodology': 'Methodology',
-			'summary': 'Summary',
-			'keywords': ['keyword1', 'keyword2']
-		}
-		
-		# Store data using the DataStorer instance
-		storer.store_data(extracted_data)
-
-		# Assert the insert_rows_json function was called once
-		mock_client.insert_rows_json.assert_called_once()
-
-
-	@patch('src.data_storer.Client', autospec=True)
-	def test_store_data_with_error(self, mock_bq_client):
-		"""
-		Test handling errors when storing data in BigQuery.
-		"""
-		# Create a mock instance for BigQuery client
-		mock_client = mock_bq_client.return_value
-
-		# Simulate an error when inserting rows
-		mock_client.insert_rows_json.side_effect = Exception("BigQuery insert error")
-
-		# Set up the DataStorer with mock parameters
-		storer = DataStorer('project_id', 'dataset_id', 'table_id')
-
-		# Create example extracted data
-		extracted_data = {
-			'utc_timestamp': '2025/01/01 00:00:00',
-			'title': 'Title',
-			'authors': 'Authors',
-			'publication_date': '2023/01/01',
-			'abstract': 'Abstract',
-			'findings': 'Findings',
-			'methodology': 'Methodology',
-			'summary': 'Summary',
-			'keywords': ['keyword1', 'keyword2']
-		}
-		
-		# Attempt to store data and ensure an exception is raised
-		with self.assertRaises(Exception):
-			storer.store_data(extracted_data)
-
-
-if __name__ == '__main__':
-	unittest.main()
+import os
+import sys
+import gzip
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from google.api_core.exceptions import BadRequest
+from google.cloud.bigquery import DatasetReference, SchemaField, Table
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.data_storer import DataStorer, BufferedDataStorer, BackfillDataStorer
+from tests.fixtures import make_extracted_data
+
+
+class TestDataStorer(unittest.TestCase):
+	"""
+	Test cases for the DataStorer class.
+	"""
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_data(self, mock_bq_client):
+		"""
+		Test storing data in BigQuery using a mocked client.
+		"""
+		# Create a mock instance for BigQuery client
+		mock_client = mock_bq_client.return_value
+
+		# Set up the DataStorer with mock parameters
+		storer = DataStorer('project_id', 'dataset_id', 'table_id')
+
+		# Create example extracted data
+		extracted_data = {
+			'utc_timestamp': '2025/01/01 00:00:00',
+			'title': 'Title',
+			'authors': 'Authors',
+			'publication_date': '2023/01/01',
+			'abstract': 'Abstract',
+			'findings': 'Findings',
+			'methodology': 'Methodology',
+			'summary': 'Summary',
+			'keywords': ['keyword1', 'keyword2']
+		}
+		
+		# Store data using the DataStorer instance
+		storer.store_data(extracted_data)
+
+		# Assert the insert_rows_json function was called once
+		mock_client.insert_rows_json.assert_called_once()
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_data_validates_rows(self, mock_bq_client):
+		"""
+		Test that rows are sent with the date formats of BigQuery, and that rows not matching
+		the schema are rejected without any request.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.return_value = []
+		storer = DataStorer('project_id', 'dataset_id', 'table_id')
+
+		failed_rows = storer.store_data({**make_extracted_data('Invalid'), 'publication_date': 'March 2023'})
+		self.assertEqual(failed_rows[0]['row']['title'], 'Invalid')
+		self.assertEqual(failed_rows[0]['errors'][0]['reason'], 'invalid')
+		mock_client.insert_rows_json.assert_not_called()
+		mock_client.create_table.assert_not_called()
+
+		self.assertEqual(storer.store_data(make_extracted_data('Title')), [])
+		row = mock_client.insert_rows_json.call_args.args[1][0]
+		self.assertEqual(row['utc_timestamp'], '2025-01-01T00:00:00+00:00')
+		self.assertEqual(row['publication_date'], '2023-01-01T00:00:00')
+		self.assertEqual(row['keywords'], ['keyword1', 'keyword2'])
+		self.assertIsNone(row['date_precision'])
+
+		storer.store_data({**make_extracted_data('Month'), 'date_precision': 'month'})
+		self.assertEqual(mock_client.insert_rows_json.call_args.args[1][0]['date_precision'], 'month')
+
+		# Keywords given as text are split as the extraction splits them
+		storer.store_data({**make_extracted_data('Text'), 'keywords': "Keywords: graphs; chemistry, graphs."})
+		self.assertEqual(mock_client.insert_rows_json.call_args.args[1][0]['keywords'], ['graphs', 'chemistry'])
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_data_with_error(self, mock_bq_client):
+		"""
+		Test handling errors when storing data in BigQuery.
+		"""
+		# Create a mock instance for BigQuery client
+		mock_client = mock_bq_client.return_value
+
+		# Simulate an error when inserting rows
+		mock_client.insert_rows_json.side_effect = Exception("BigQuery insert error")
+
+		# Set up the DataStorer with mock parameters
+		storer = DataStorer('project_id', 'dataset_id', 'table_id')
+
+		# Create example extracted data
+		extracted_data = {
+			'utc_timestamp': '2025/01/01 00:00:00',
+			'title': 'Title',
+			'authors': 'Authors',
+			'publication_date': '2023/01/01',
+			'abstract': 'Abstract',
+			'findings': 'Findings',
+			'methodology': 'Methodology',
+			'summary': 'Summary',
+			'keywords': ['keyword1', 'keyword2']
+		}
+		
+		# Attempt to store data and ensure an exception is raised
+		with self.assertRaises(Exception):
+			storer.store_data(extracted_data)
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_data_reports_rejected_rows(self, mock_bq_client):
+		"""
+		Test that rows rejected by BigQuery are returned with their errors.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.return_value = [{'index': 0, 'errors': [{'reason': 'invalid'}]}]
+
+		storer = DataStorer('project_id', 'dataset_id', 'table_id')
+		failed_rows = storer.store_data(make_extracted_data('Title'))
+
+		self.assertEqual(len(failed_rows), 1)
+		self.assertEqual(failed_rows[0]['row']['title'], 'Title')
+		self.assertEqual(failed_rows[0]['errors'], [{'reason': 'invalid'}])
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_buffered_store_data_flushes_in_bulk(self, mock_bq_client):
+		"""
+		Test that the buffered writer checks the table once and inserts rows in bulk
+		when the row count threshold is reached or when it is closed.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.side_effect = [[], [{'index': 0, 'errors': [{'reason': 'invalid'}]}]]
+
+		with BufferedDataStorer('project_id', 'dataset_id', 'table_id', max_rows=2) as storer:
+			self.assertEqual(storer.store_data(make_extracted_data('Title 1')), [])
+			mock_client.insert_rows_json.assert_not_called()
+			self.assertEqual(storer.flush_seconds, 0.0)
+			self.assertEqual(storer.store_data(make_extracted_data('Title 2')), [])
+			storer.store_data(make_extracted_data('Title 3'))
+
+		# One bulk insert of two rows plus the final flush of the remaining row, both timed by the storer
+		self.assertGreater(storer.flush_seconds, 0.0)
+		self.assertEqual(mock_client.insert_rows_json.call_count, 2)
+		self.assertEqual(len(mock_client.insert_rows_json.call_args_list[0].args[1]), 2)
+		self.assertEqual(mock_client.insert_rows_json.call_args_list[1].args[1][0]['title'], 'Title 3')
+		mock_client.create_table.assert_called_once()
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_buffered_rejections_reach_their_document(self, mock_bq_client):
+		"""
+		Test that rows rejected by a flush are reported with the key of their own document,
+		not to the document whose row triggered the flush.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.side_effect = [[{'index': 0, 'errors': [{'reason': 'invalid'}]}], Exception("BigQuery insert error")]
+
+		storer = BufferedDataStorer('project_id', 'dataset_id', 'table_id', max_rows=2)
+		self.assertEqual(storer.store_data(make_extracted_data('Title 1'), key='first.pdf'), [])
+		self.assertEqual(storer.store_data(make_extracted_data('Title 2'), key='second.pdf'), [])
+
+		rejected_rows = storer.take_rejected_rows()
+		self.assertEqual([(row['key'], row['row']['title']) for row in rejected_rows], [('first.pdf', 'Title 1')])
+		self.assertEqual(storer.take_rejected_rows(), [])
+
+		# Rows of a failed flush stay buffered with their keys
+		storer.store_data(make_extracted_data('Title 3'), key='third.pdf')
+		with self.assertRaises(Exception):
+			storer.flush()
+		self.assertEqual(storer.get_pending_keys(), ['third.pdf'])
+		storer.rows = []
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_buffered_flush_keeps_rows_on_error(self, mock_bq_client):
+		"""
+		Test that buffered rows are kept for a later flush when the insert request fails.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.side_effect = [Exception("BigQuery insert error"), []]
+
+		storer = BufferedDataStorer('project_id', 'dataset_id', 'table_id')
+		storer.store_data(make_extracted_data('Title'))
+
+		with self.assertRaises(Exception):
+			storer.flush()
+		self.assertEqual(len(storer.rows), 1)
+
+		self.assertEqual(storer.close(), [])
+		self.assertEqual(storer.rows, [])
+
+
+	@patch('src.data_storer.Client', autospec=True)
+	def test_buffered_rows_are_flushed_by_timer(self, mock_bq_client):
+		"""
+		Test that buffered rows are flushed once they waited max_interval, without any other row arriving.
+		"""
+		mock_client = mock_bq_client.return_value
+		mock_client.insert_rows_json.return_value = []
+
+		storer = BufferedDataStorer('project_id', 'dataset_id', 'table_id', max_interval=0.05)
+		storer.store_data(make_extracted_data('Title'), key='paper.pdf')
+		mock_client.insert_rows_json.assert_not_called()
+
+		storer.flush_timer.join(5)
+		self.assertEqual(mock_client.insert_rows_json.call_count, 1)
+		self.assertEqual(storer.get_pending_keys(), [])
+		self.assertIsNone(storer.flush_timer)
+
+		# A later row starts a new timer, stopped by the flush of close
+		storer.store_data(make_extracted_data('Title 2'))
+		flush_timer = storer.flush_timer
+		storer.close()
+		self.assertIsNone(storer.flush_timer)
+		flush_timer.join(5)
+		self.assertFalse(flush_timer.is_alive())
+		self.assertEqual(mock_client.insert_rows_json.call_count, 2)
+
+
+	def test_backfill_loads_large_batches(self):
+		"""
+		Test that large batches are staged to compressed newline delimited JSON and loaded with one
+		load job, that small ones are streamed, and that rows not matching the schema are rejected.
+		"""
+		client = self.make_backfill_client()
+		staged_rows = []
+		client.load_table_from_file.side_effect = lambda staged_file, table, rewind, job_config: (
+			staged_file.seek(0), staged_rows.extend(json.loads(line) for line in gzip.decompress(staged_file.read()).splitlines()), MagicMock(job_id='job_1', errors=None)
+		)[-1]
+
+		with BackfillDataStorer('project_id', 'dataset_id', 'table_id', max_rows=3, load_min_rows=3, client=client) as storer:
+			storer.store_data(make_extracted_data('Title 1'))
+			failed_rows = storer.store_data({**make_extracted_data('Invalid'), 'publication_date': 'unknown'})
+			storer.store_data(make_extracted_data('Title 2'))
+			storer.store_data(make_extracted_data('Title 3'))
+			storer.store_data(make_extracted_data('Title 4'))
+
+		# Rows not matching the schema are rejected before they are buffered
+		self.assertEqual([row['row']['title'] for row in failed_rows], ['Invalid'])
+		client.load_table_from_file.assert_called_once()
+		self.assertEqual([row['title'] for row in staged_rows], ['Title 1', 'Title 2', 'Title 3'])
+		self.assertEqual(staged_rows[0]['publication_date'], '2023-01-01T00:00:00')
+		self.assertEqual(client.insert_rows_json.call_args.args[1][0]['title'], 'Title 4')
+		self.assertEqual(client.insert_rows_json.call_args.args[1][0]['publication_date'], '2023-01-01T00:00:00')
+
+
+	def test_backfill_reports_failed_load_jobs(self):
+		"""
+		Test that the rows of a failed load job are returned with the errors of the job.
+		"""
+		client = self.make_backfill_client()
+		job = client.load_table_from_file.return_value
+		job.errors = [{'reason': 'invalid', 'message': 'Bad row'}]
+		job.result.side_effect = BadRequest("Load job failed")
+
+		storer = BackfillDataStorer('project_id', 'dataset_id', 'table_id', load_min_rows=1, client=client)
+		storer.store_data(make_extracted_data('Title'))
+		failed_rows = storer.close()
+
+		self.assertEqual(len(failed_rows), 1)
+		self.assertEqual(failed_rows[0]['errors'], job.errors)
+
+
+	def test_backfill_checks_table_schema(self):
+		"""
+		Test that rows are not loaded into a table whose schema does not match, and are kept for a later flush.
+		"""
+		client = self.make_backfill_client(schema=[SchemaField('title', 'INTEGER')])
+
+		storer = BackfillDataStorer('project_id', 'dataset_id', 'table_id', client=client)
+		storer.store_data(make_extracted_data('Title'))
+
+		with self.assertRaisesRegex(ValueError, "title is NULLABLE INTEGER"):
+			storer.flush()
+		self.assertEqual(len(storer.rows), 1)
+		client.load_table_from_file.assert_not_called()
+
+		# The rows can never be loaded, drop them instead of flushing them again at exit
+		storer.rows = []
+
+
+	def make_backfill_client(self, schema: list = None) -> MagicMock:
+		"""
+		Builds a mocked BigQuery client whose table has the given schema, the expected one by default.
+		"""
+		client = MagicMock()
+		client.dataset.return_value = DatasetReference('project_id', 'dataset_id')
+		client.insert_rows_json.return_value = []
+		client.get_table.return_value = Table('project_id.dataset_id.table_id', schema=schema or DataStorer.create_schema())
+
+		return client
+
+
+if __name__ == '__main__':
+	unittest.main()
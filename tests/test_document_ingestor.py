@@ -1,76 +1,204 @@
-import os
-import sys
-import unittest
-from unittest.mock import patch, MagicMock
-
-# Add the root of the project directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.document_ingestor import DocumentIngestor
-
-
-class TestDocumentIngestor(unittest.TestCase):
-	"""
-	Test cases for the DocumentIngestor class.
-	"""
-
-	@patch('fitz.open', autospec=True)
-	def test_process_text_valid_pdf_with_lists(self, mock_fitz_open):
-		"""
-		Test processing text from a valid PDF file containing numbered and bullet lists.
-		"""
-		# Define PDF behavior with a mock
-		mock_pdf = MagicMock()
-		mock_fitz_open.return_value.__enter__.return_value = mock_pdf
-		mock_pdf.page_count = 1
-
-		# Simulate PDF page content with lists
-		mock_page = MagicMock()
-		mock_page.get_text.return_value = (
-			"1. First item\n"
-			"Details of first item continue.\n"
-			"2. Second item\n"
-			"● Bullet item A\n"
-			"● Bullet item B\n"
-			"3. Third item\n"
-		)
-		mock_pdf.load_page.return_value = mock_page
-
-		# Initialize ingestor and process the mock PDF
-		ingestor = DocumentIngestor('dummy.pdf')
-		processed_text = ingestor.process_text()
-
-		# Define expected text processing result where lists are properly combined
-		expected_text = (
-			"1. First item Details of first item continue.\n"
-			"2. Second item\n"
-			"● Bullet item A\n"
-			"● Bullet item B\n"
-			"3. Third item"
-		)
-
-		# Assert processed text matches expected result
-		self.assertEqual(processed_text, expected_text)
-
-
-	def test_initialize_invalid_file(self):
-		"""
-		Test initializing with a non-PDF file should raise a ValueError.
-		"""
-		with self.assertRaises(ValueError):
-			DocumentIngestor('dummy.txt')
-
-
-	@patch('fitz.open', side_effect=RuntimeError("Corrupted PDF"))
-	def test_process_text_corrupted_pdf(self, mock_fitz_open):
-		"""
-		Test processing a corrupted PDF raises an appropriate exception.
-		"""
-		ingestor = DocumentIngestor('dummy.pdf')
-		with self.assertRaises(Exception) as context:
-			ingestor.process_text()
-
-		self.assertIn("Error while reading PDF file", str(context.exception))
-
-
-if __name__ == '__main__':
-	unittest.main()
+import os
+import sys
+import fitz
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.document_ingestor import DocumentIngestor
+
+
+class TestDocumentIngestor(unittest.TestCase):
+	"""
+	Test cases for the DocumentIngestor class.
+	"""
+
+	@patch('fitz.open', autospec=True)
+	def test_process_text_valid_pdf_with_lists(self, mock_fitz_open):
+		"""
+		Test processing text from a valid PDF file containing numbered and bullet lists.
+		"""
+		# Define PDF behavior with a mock
+		mock_pdf = MagicMock()
+		mock_fitz_open.return_value.__enter__.return_value = mock_pdf
+		mock_pdf.page_count = 1
+
+		# Simulate PDF page content with lists
+		page_text = (
+			"1. First item\n"
+			"Details of first item continue.\n"
+			"2. Second item\n"
+			"● Bullet item A\n"
+			"● Bullet item B\n"
+			"3. Third item\n"
+		)
+		mock_page = MagicMock()
+		mock_page.get_text.side_effect = lambda option, textpage=None: page_text if option == 'text' else {'blocks': []}
+		mock_pdf.load_page.return_value = mock_page
+
+		# Initialize ingestor and process the mock PDF
+		ingestor = DocumentIngestor('dummy.pdf')
+		processed_text = ingestor.process_text()
+
+		# Define expected text processing result where lists are properly combined
+		expected_text = (
+			"1. First item Details of first item continue.\n"
+			"2. Second item\n"
+			"● Bullet item A\n"
+			"● Bullet item B\n"
+			"3. Third item"
+		)
+
+		# Assert processed text matches expected result
+		self.assertEqual(processed_text, expected_text)
+
+
+	def test_initialize_invalid_file(self):
+		"""
+		Test initializing with a non-PDF file should raise a ValueError.
+		"""
+		with self.assertRaises(ValueError):
+			DocumentIngestor('dummy.txt')
+
+
+	@patch('fitz.open', side_effect=RuntimeError("Corrupted PDF"))
+	def test_process_text_corrupted_pdf(self, mock_fitz_open):
+		"""
+		Test processing a corrupted PDF raises an appropriate exception.
+		"""
+		ingestor = DocumentIngestor('dummy.pdf')
+		with self.assertRaises(Exception) as context:
+			ingestor.process_text()
+
+		self.assertIn("Error while reading PDF file", str(context.exception))
+
+
+	def test_build_section_index(self):
+		"""
+		Test indexing sections from bold and large-font headings of a real PDF file.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_path = os.path.join(temp_dir, 'paper.pdf')
+			with fitz.open() as pdf:
+				page = pdf.new_page()
+				page.insert_text((72, 72), "A Study of Things", fontsize=18)
+				page.insert_text((72, 100), "Jane Doe", fontsize=10)
+				page.insert_text((72, 120), "Abstract", fontsize=10, fontname='hebo')
+				page.insert_text((72, 135), "We study things.", fontsize=10)
+				page.insert_text((72, 155), "2 Materials and Methods", fontsize=10, fontname='hebo')
+				page.insert_text((72, 170), "We counted things.", fontsize=10)
+				pdf.save(file_path)
+
+			ingestor = DocumentIngestor(file_path)
+			text = ingestor.process_text()
+			sections = ingestor.build_section_index(text)
+
+		self.assertEqual(list(sections), ['front matter', 'abstract', 'materials and methods'])
+		self.assertEqual(text[slice(*sections['front matter'])], "A Study of Things\nJane Doe\n")
+		self.assertEqual(text[slice(*sections['abstract'])], "Abstract\nWe study things.\n")
+		self.assertTrue(text[slice(*sections['materials and methods'])].endswith("We counted things."))
+
+
+	def test_extract_metadata(self):
+		"""
+		Test reading bibliographic metadata with confidence scores from the PDF information dictionary,
+		its XMP packet and the first page.
+		"""
+		xmp = (
+			'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+			'<rdf:Description xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:prism="http://prismstandard.org/namespaces/basic/2.0/">'
+			'<dc:creator><rdf:Seq><rdf:li>Jane Doe</rdf:li><rdf:li>John Roe</rdf:li></rdf:Seq></dc:creator>'
+			'<prism:publicationDate>2023-02</prism:publicationDate>'
+			'</rdf:Description></rdf:RDF></x:xmpmeta>'
+		)
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_path = os.path.join(temp_dir, 'paper.pdf')
+			with fitz.open() as pdf:
+				page = pdf.new_page()
+				page.insert_text((72, 72), "A Study of Things", fontsize=18)
+				page.insert_text((72, 100), "The body of the paper is written with a smaller font.", fontsize=10)
+				pdf.set_metadata({'title': "A Study of Things", 'author': "Jane Doe; John Roe", 'creationDate': "D:20230115120000"})
+				pdf.set_xml_metadata(xmp)
+				pdf.save(file_path)
+
+			metadata = DocumentIngestor(file_path).extract_metadata()
+
+			# Ingesting reads the text, headings and metadata with a single opening of the document
+			with patch('src.document_ingestor.fitz.open', wraps=fitz.open) as mock_open:
+				ingested = DocumentIngestor(file_path).ingest()
+			self.assertEqual(mock_open.call_count, 1)
+			self.assertEqual(ingested['metadata'], metadata)
+
+		# Title and authors are confirmed by two sources, the date lacks its day
+		self.assertEqual(metadata['title'], {'value': "A Study of Things", 'confidence': 0.8})
+		self.assertEqual(metadata['authors'], {'value': "Jane Doe, John Roe", 'confidence': 0.95})
+		self.assertEqual(metadata['publication_date']['value'], "2023/02")
+		self.assertLess(metadata['publication_date']['confidence'], 0.8)
+
+
+	@patch('fitz.open', autospec=True)
+	def test_iter_processed_pages_across_page_boundaries(self, mock_fitz_open):
+		"""
+		Test that pages are yielded lazily and that list items and lines continuing
+		on the next page are combined.
+		"""
+		mock_pdf = MagicMock()
+		mock_fitz_open.return_value.__enter__.return_value = mock_pdf
+		mock_pdf.page_count = 3
+
+		pages = [
+			"Intro line\n1. First item\n",
+			"continues here.\nA line cut ",
+			"across pages\n2. Second item\n"
+		]
+		mock_pdf.load_page.side_effect = lambda page_number: MagicMock(get_text=MagicMock(
+			side_effect=lambda option, textpage=None: pages[page_number] if option == 'text' else {'blocks': []}
+		))
+
+		ingestor = DocumentIngestor('dummy.pdf')
+		processed_pages = ingestor.iter_processed_pages()
+
+		# The first page is available before the others are read
+		self.assertEqual(next(processed_pages), "Intro line")
+		self.assertEqual(mock_pdf.load_page.call_count, 1)
+
+		remaining = list(processed_pages)
+		self.assertEqual(len(remaining), 3)
+		self.assertEqual(
+			"Intro line" + "".join(remaining),
+			"Intro line\n1. First item continues here. A line cut across pages\n2. Second item "
+		)
+		self.assertEqual(ingestor.process_text(), "Intro line\n1. First item continues here. A line cut across pages\n2. Second item")
+
+
+	def test_process_text_parallel_matches_sequential(self):
+		"""
+		Test that extracting pages with several processes gives the same text as a single process,
+		and that small documents skip the pool.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_path = os.path.join(temp_dir, 'thesis.pdf')
+			with fitz.open() as pdf:
+				for page_number in range(12):
+					page = pdf.new_page()
+					page.insert_text((72, 72), f"Page {page_number} text")
+					page.insert_text((72, 90), f"{page_number}. Item of page {page_number}")
+				pdf.save(file_path)
+
+			sequential_text = DocumentIngestor(file_path).process_text()
+			parallel_text = DocumentIngestor(file_path, workers=3, min_pages_per_worker=4).process_text()
+
+			with patch('src.document_ingestor.ProcessPoolExecutor') as mock_pool:
+				small_text = DocumentIngestor(file_path, workers=3, min_pages_per_worker=50).process_text()
+				mock_pool.assert_not_called()
+
+		self.assertEqual(parallel_text, sequential_text)
+		self.assertEqual(small_text, sequential_text)
+		self.assertIn("11. Item of page 11", parallel_text)
+
+
+if __name__ == '__main__':
+	unittest.main()
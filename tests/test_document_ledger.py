@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.document_ledger import DocumentLedger
+
+
+class TestDocumentLedger(unittest.TestCase):
+	"""
+	Test cases for the DocumentLedger class.
+	"""
+
+	def setUp(self):
+		"""
+		Creates a temporary directory with a PDF file and a ledger.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.file_path = os.path.join(self.temp_dir.name, 'paper.pdf')
+		with open(self.file_path, 'wb') as f:
+			f.write(b'%PDF-1.7 first version')
+
+		self.db_path = os.path.join(self.temp_dir.name, 'ledger.sqlite')
+		self.ledger = DocumentLedger(self.db_path)
+
+
+	def tearDown(self):
+		self.ledger.close()
+		self.temp_dir.cleanup()
+
+
+	def test_new_and_stored_documents(self):
+		"""
+		Tests that new documents need processing and stored ones are skipped
+		with a stat check only, without hashing them again.
+		"""
+		needs_processing, content_hash = self.ledger.needs_processing(self.file_path)
+		self.assertTrue(needs_processing)
+		self.ledger.record(self.file_path, content_hash, 'stored')
+
+		with patch('src.document_ledger.DocumentIngestor.get_content_hash') as mock_hash:
+			self.assertEqual(self.ledger.needs_processing(self.file_path), (False, None))
+			mock_hash.assert_not_called()
+
+
+	def test_failed_documents_are_retried(self):
+		"""
+		Tests that documents whose previous run failed are processed again.
+		"""
+		self.ledger.record(self.file_path, None, 'failed')
+		self.assertTrue(self.ledger.needs_processing(self.file_path)[0])
+
+
+	def test_touched_and_changed_documents(self):
+		"""
+		Tests that a touched file with the same content is skipped after hashing it,
+		while a file whose content changed is processed again.
+		"""
+		self.ledger.record(self.file_path, None, 'stored')
+
+		os.utime(self.file_path, (0, 0))
+		needs_processing, content_hash = self.ledger.needs_processing(self.file_path)
+		self.assertFalse(needs_processing)
+		self.assertIsNotNone(content_hash)
+
+		with open(self.file_path, 'wb') as f:
+			f.write(b'%PDF-1.7 second version')
+		self.assertTrue(self.ledger.needs_processing(self.file_path)[0])
+
+
+	def test_pipeline_version_change(self):
+		"""
+		Tests that documents processed by another pipeline version are processed again.
+		"""
+		self.ledger.record(self.file_path, None, 'stored')
+		self.ledger.close()
+
+		self.ledger = DocumentLedger(self.db_path, pipeline_version='2')
+		self.assertTrue(self.ledger.needs_processing(self.file_path)[0])
+
+
+if __name__ == '__main__':
+	unittest.main()
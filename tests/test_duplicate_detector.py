@@ -0,0 +1,112 @@
+import os
+import sys
+import random
+import tempfile
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.duplicate_detector import DuplicateDetector
+
+
+class TestDuplicateDetector(unittest.TestCase):
+	"""
+	Test cases for the DuplicateDetector class.
+	"""
+
+	def setUp(self):
+		"""
+		Creates a temporary directory for the index and the text of a paper.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.db_path = os.path.join(self.temp_dir.name, 'duplicates.sqlite')
+
+		generator = random.Random(0)
+		self.words = [f"word{generator.randint(0, 3000)}" for _ in range(5000)]
+		self.text = " ".join(self.words)
+
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+
+	def test_finds_near_duplicates(self):
+		"""
+		Tests that a lightly edited version of a paper is found with its extracted data,
+		and that a paper made of the same words in another order is not.
+		"""
+		detector = DuplicateDetector(self.db_path, threshold=0.8)
+		detector.add('/papers/preprint.pdf', self.text, {'title': 'Title'})
+
+		revised = " ".join(self.words[:4800] + ["revised", "conclusion"] * 50 + self.words[4900:])
+		duplicate_path, extracted_data, similarity = detector.find_duplicate('/papers/camera_ready.pdf', revised.upper())
+		self.assertEqual(duplicate_path, '/papers/preprint.pdf')
+		self.assertEqual(extracted_data, {'title': 'Title'})
+		self.assertGreaterEqual(similarity, 0.8)
+
+		shuffled = self.words[:]
+		random.Random(1).shuffle(shuffled)
+		self.assertIsNone(detector.find_duplicate('/papers/other.pdf', " ".join(shuffled)))
+		detector.close()
+
+
+	def test_index_is_persisted(self):
+		"""
+		Tests that the index is kept across detectors, and that earlier versions of the same file are ignored.
+		"""
+		detector = DuplicateDetector(self.db_path)
+		detector.add('/papers/preprint.pdf', self.text, {'title': 'Title'})
+		detector.close()
+
+		detector = DuplicateDetector(self.db_path)
+		self.assertEqual(detector.find_duplicate('/papers/copy.pdf', self.text)[2], 1.0)
+		self.assertIsNone(detector.find_duplicate('/papers/preprint.pdf', self.text))
+		detector.link('/papers/copy.pdf', '/papers/preprint.pdf', 1.0)
+		detector.close()
+
+		# Another threshold bands the stored signatures again, links are kept
+		detector = DuplicateDetector(self.db_path, threshold=0.9)
+		self.assertEqual(detector.find_duplicate('/papers/copy.pdf', self.text)[2], 1.0)
+		self.assertEqual(detector.get_link('/papers/copy.pdf'), ('/papers/preprint.pdf', 1.0))
+		self.assertIsNone(detector.get_link('/papers/preprint.pdf'))
+		detector.close()
+
+
+	def test_band_layout_follows_threshold(self):
+		"""
+		Tests that higher thresholds use fewer and longer bands, and that papers at the threshold
+		share a band more often than not.
+		"""
+		for threshold in (0.5, 0.8, 0.9):
+			bands, rows = DuplicateDetector.get_band_layout(threshold, 128)
+			self.assertLessEqual(bands * rows, 128)
+			self.assertGreater(1 - (1 - threshold ** rows) ** bands, 0.5)
+
+		self.assertEqual(DuplicateDetector.get_band_layout(0.8, 128), (12, 10))
+		self.assertGreater(DuplicateDetector.get_band_layout(0.5, 128)[0], 12)
+		self.assertLess(DuplicateDetector.get_band_layout(0.9, 128)[0], 12)
+
+
+	def test_recall_at_threshold(self):
+		"""
+		Tests that most pairs of papers whose Jaccard similarity is the threshold are found as candidates.
+		"""
+		detector = DuplicateDetector(':memory:', threshold=0.8, shingle_size=1)
+
+		# Each pair shares 800 of the 1000 distinct words of its two papers
+		found = 0
+		for pair in range(200):
+			shared = [f"shared{pair}x{index}" for index in range(800)]
+			first = " ".join(shared + [f"first{pair}x{index}" for index in range(100)])
+			second = " ".join(shared + [f"second{pair}x{index}" for index in range(100)])
+
+			first_buckets = detector.get_buckets(detector.get_signature(first))
+			second_buckets = detector.get_buckets(detector.get_signature(second))
+			found += any(a == b for a, b in zip(first_buckets, second_buckets))
+
+		self.assertGreater(found / 200, 0.6)
+		detector.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,159 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+from unittest.mock import patch, ANY
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.embedding_index import Embedder, EmbeddingIndex, HashingEmbedder
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+	"""
+	Test cases for the EmbeddingIndex and HashingEmbedder classes.
+	"""
+
+	def setUp(self):
+		"""
+		Creates an index of three papers in a temporary directory.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.directory = os.path.join(self.temp_dir.name, 'embeddings')
+		self.embedder = HashingEmbedder(dimensions=256)
+
+		self.index = EmbeddingIndex(self.directory, dimensions=256)
+		self.texts = {
+			'/papers/graphs.pdf': "Graph neural networks predict molecular properties with message passing.",
+			'/papers/molecules.pdf': "Message passing graph networks for molecular property prediction.",
+			'/papers/proteins.pdf': "Transformers predict protein structures from amino acid sequences."
+		}
+		for file_path, text in self.texts.items():
+			self.index.add(file_path, self.embedder.embed([text])[0])
+
+
+	def tearDown(self):
+		self.index.close()
+		self.temp_dir.cleanup()
+
+
+	def test_embed(self):
+		"""
+		Tests that the embedder is deterministic and gives close vectors to texts sharing terms.
+		"""
+		vectors = self.embedder.embed(list(self.texts.values()))
+		self.assertEqual(vectors.shape, (3, 256))
+		self.assertEqual(vectors.dtype, np.float32)
+		np.testing.assert_array_equal(vectors, self.embedder.embed(list(self.texts.values())))
+
+		vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+		self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+
+		# An embedder without an embed method fails when it is created
+		with self.assertRaises(TypeError):
+			type('IncompleteEmbedder', (Embedder,), {'dimensions': 8})()
+
+
+	def test_search_ranks_by_similarity(self):
+		"""
+		Tests that papers are ranked by cosine similarity, without the excluded paper.
+		"""
+		vector = self.index.get_vector('/papers/graphs.pdf')
+		results = self.index.search(vector, k=2)
+		self.assertEqual([file_path for file_path, _ in results], ['/papers/graphs.pdf', '/papers/molecules.pdf'])
+		self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+		results = self.index.search(vector, k=5, exclude='/papers/graphs.pdf')
+		self.assertEqual([file_path for file_path, _ in results], ['/papers/molecules.pdf', '/papers/proteins.pdf'])
+		self.assertIsNone(self.index.get_vector('/papers/unknown.pdf'))
+		self.assertEqual(self.index.search(vector, k=0), [])
+
+
+	def test_search_in_blocks(self):
+		"""
+		Tests that searching block by block finds the same papers as a search over the whole matrix.
+		"""
+		vectors = np.random.RandomState(0).standard_normal((500, 256)).astype(np.float32)
+		for row, vector in enumerate(vectors):
+			self.index.add(f"/papers/random{row}.pdf", vector)
+
+		self.index.BLOCK_ROWS = 64
+		results = self.index.search(vectors[42], k=10)
+
+		vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+		expected = np.argsort(-(vectors @ vectors[42]))[:10]
+		self.assertEqual([file_path for file_path, _ in results], [f"/papers/random{row}.pdf" for row in expected])
+
+
+	def test_add_replaces_and_compacts(self):
+		"""
+		Tests that adding a paper again replaces its vector, and that deleted rows are compacted away.
+		"""
+		vector = self.embedder.embed([self.texts['/papers/proteins.pdf']])[0]
+		self.index.add('/papers/graphs.pdf', vector)
+		self.assertEqual(self.index.count(), 3)
+		self.assertEqual(self.index.row_count, 4)
+		self.assertEqual(self.index.search(vector, k=1, exclude='/papers/proteins.pdf')[0][0], '/papers/graphs.pdf')
+
+		# A second replacement leaves more deleted rows than the compaction ratio allows
+		self.index.add('/papers/molecules.pdf', vector)
+		self.assertEqual(self.index.row_count, 3)
+		self.assertEqual(self.index.deleted_count, 0)
+		self.assertEqual(os.path.getsize(self.index.vectors_path), 3 * 256 * 4)
+		self.assertEqual(
+			sorted(file_path for file_path, _ in self.index.search(vector, k=3)),
+			['/papers/graphs.pdf', '/papers/molecules.pdf', '/papers/proteins.pdf']
+		)
+		self.assertAlmostEqual(self.index.search(vector, k=3)[2][1], 1.0, places=5)
+
+
+	def test_search_during_compaction(self):
+		"""
+		Tests that a search whose rows are renumbered by a compaction before they are mapped to
+		their papers searches the compacted index instead.
+		"""
+		vector = self.embedder.embed([self.texts['/papers/proteins.pdf']])[0]
+		self.index.add('/papers/graphs.pdf', self.embedder.embed([self.texts['/papers/graphs.pdf']])[0])
+		get_vectors = self.index.get_vectors
+		compacted = []
+
+		def get_vectors_then_compact():
+			vectors = get_vectors()
+			if not compacted:
+				compacted.append(True)
+				self.index.add('/papers/molecules.pdf', self.embedder.embed([self.texts['/papers/molecules.pdf']])[0])
+			return vectors
+
+		with patch.object(self.index, 'get_vectors', side_effect=get_vectors_then_compact):
+			results = self.index.search(vector, k=3)
+
+		self.assertEqual(self.index.generation, 1)
+		self.assertEqual(results[0], ('/papers/proteins.pdf', ANY))
+		self.assertEqual(sorted(file_path for file_path, _ in results), sorted(self.texts))
+
+
+	def test_persistence(self):
+		"""
+		Tests that a reopened index finds the same papers, ignores a partial row left by a crash
+		and refuses vectors of another size.
+		"""
+		self.index.add('/papers/graphs.pdf', self.embedder.embed(["Graph networks"])[0])
+		self.index.close()
+		with open(os.path.join(self.directory, 'vectors.f32'), 'ab') as f:
+			f.write(b'\x00' * 100)
+
+		self.index = EmbeddingIndex(self.directory)
+		self.assertEqual(self.index.dimensions, 256)
+		self.assertEqual(self.index.count(), 3)
+		self.assertEqual(os.path.getsize(self.index.vectors_path), 4 * 256 * 4)
+		vector = self.embedder.embed([self.texts['/papers/molecules.pdf']])[0]
+		self.assertEqual(self.index.search(vector, k=1)[0][0], '/papers/molecules.pdf')
+		self.assertEqual(len(self.index.search(vector, k=10)), 3)
+
+		with self.assertRaises(ValueError):
+			EmbeddingIndex(self.directory, dimensions=512)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import datetime
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.extraction_result import ExtractionResult
+from src.information_extractor import ExtractionFailure
+from src.data_storer import StorageBackend
+
+
+class TestExtractionResult(unittest.TestCase):
+	"""
+	Test cases for the ExtractionResult class.
+	"""
+
+	def test_parse_date(self):
+		"""
+		Tests that dates are found in answers with the precision they were given with.
+		"""
+		self.assertEqual(ExtractionResult.parse_date("2023/03/15"), (datetime.date(2023, 3, 15), 'day'))
+		self.assertEqual(ExtractionResult.parse_date("Published on March 15th, 2023."), (datetime.date(2023, 3, 15), 'day'))
+		self.assertEqual(ExtractionResult.parse_date("15 Mar 2023"), (datetime.date(2023, 3, 15), 'day'))
+		self.assertEqual(ExtractionResult.parse_date("Sept. 2021"), (datetime.date(2021, 9, 1), 'month'))
+		self.assertEqual(ExtractionResult.parse_date("2021-07"), (datetime.date(2021, 7, 1), 'month'))
+		self.assertEqual(ExtractionResult.parse_date("In 2019"), (datetime.date(2019, 1, 1), 'year'))
+		self.assertEqual(ExtractionResult.parse_date("2019 (revised 2021/05/03)"), (datetime.date(2019, 1, 1), 'year'))
+		self.assertEqual(ExtractionResult.parse_date("March 2020, accepted 2021/05/03"), (datetime.date(2020, 3, 1), 'month'))
+		self.assertEqual(ExtractionResult.parse_date("Not given"), (None, None))
+
+
+	def test_parse_lists(self):
+		"""
+		Tests that keywords and authors are split into lists without labels, markers and duplicates.
+		"""
+		self.assertEqual(
+			ExtractionResult.parse_keywords("Keywords: 1. Graph learning; chemistry\n- Chemistry\n* GNN."),
+			['Graph learning', 'chemistry', 'GNN']
+		)
+		self.assertEqual(ExtractionResult.parse_keywords('["graphs", "3D printing"]'), ['graphs', '3D printing'])
+		self.assertEqual(ExtractionResult.parse_keywords(None), [])
+
+		self.assertEqual(ExtractionResult.parse_authors("Jane Doe1,2, John Smith* and Bob Lee"), ['Jane Doe', 'John Smith', 'Bob Lee'])
+		self.assertEqual(ExtractionResult.parse_authors("Authors: Doe, Jane; Smith, John"), ['Doe, Jane', 'Smith, John'])
+		self.assertEqual(ExtractionResult.parse_authors("Smith, J., Doe, A."), ['Smith, J.', 'Doe, A.'])
+		self.assertEqual(ExtractionResult.parse_authors("Martin, J.-P. K., Lee, B."), ['Martin, J.-P. K.', 'Lee, B.'])
+		self.assertEqual(ExtractionResult.parse_authors("John Smith, Jr. and Jane Doe."), ['John Smith, Jr.', 'Jane Doe'])
+
+
+	def test_to_dict(self):
+		"""
+		Tests that normalized data matches the table schema and that failed fields are kept.
+		"""
+		failure = ExtractionFailure('summary', 'RateLimitError', "Too many requests")
+		result = ExtractionResult.from_dict({
+			'utc_timestamp': '2025/01/01 10:00:00',
+			'title': ' "Graph Networks" ',
+			'authors': "Jane Doe and John Smith",
+			'publication_date': "January 2023",
+			'abstract': "Abstract.",
+			'findings': "Findings.",
+			'methodology': "Methodology.",
+			'summary': failure,
+			'keywords': "graphs, molecules"
+		})
+
+		self.assertEqual(result.date_precision, 'month')
+		self.assertEqual(result.authors, ['Jane Doe', 'John Smith'])
+		self.assertFalse(hasattr(result, '__dict__'))
+
+		extracted_data = result.to_dict()
+		self.assertEqual(extracted_data['title'], "Graph Networks")
+		self.assertEqual(extracted_data['authors'], "Jane Doe, John Smith")
+		self.assertEqual(extracted_data['publication_date'], "2023/01/01")
+		self.assertEqual(extracted_data['date_precision'], 'month')
+		self.assertEqual(extracted_data['keywords'], ['graphs', 'molecules'])
+		self.assertIs(extracted_data['summary'], failure)
+
+		extracted_data['summary'] = "Summary."
+		row = StorageBackend.convert_row(StorageBackend.build_row(extracted_data))
+		self.assertEqual(row['publication_date'], datetime.datetime(2023, 1, 1))
+		self.assertEqual(row['utc_timestamp'], datetime.datetime(2025, 1, 1, 10, tzinfo=datetime.timezone.utc))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.flow_metrics import FlowMetrics
+
+
+class TestFlowMetrics(unittest.TestCase):
+	"""
+	Test cases for the FlowMetrics and DocumentMetrics classes.
+	"""
+
+	def record_document(self, metrics: FlowMetrics, file_path: str) -> None:
+		"""
+		Records the measurements of a two-prompt document.
+		"""
+		document_metrics = metrics.document(file_path)
+		document_metrics.record_document(page_count=12, char_count=34000)
+		with document_metrics.measure('extract_information'):
+			document_metrics.record_prompt('title', 0.5, prompt_tokens=100, completion_tokens=10, cost=0.01)
+			document_metrics.record_prompt('title', 0.0, cache_hit=True)
+
+
+	def test_finish_document_logs_json_line(self):
+		"""
+		Tests that finishing a document logs its measurements as a single JSON line.
+		"""
+		metrics = FlowMetrics()
+		self.record_document(metrics, 'paper.pdf')
+
+		with self.assertLogs(level='INFO') as logs:
+			result = metrics.finish_document('paper.pdf')
+
+		logged = json.loads(logs.records[0].getMessage())
+		self.assertEqual(logged, result)
+		self.assertEqual(logged['file_path'], 'paper.pdf')
+		self.assertEqual(logged['page_count'], 12)
+		self.assertEqual(logged['char_count'], 34000)
+		self.assertIn('extract_information', logged['stages'])
+		self.assertEqual(logged['fields']['title']['calls'], 2)
+		self.assertEqual(logged['fields']['title']['cache_hits'], 1)
+		self.assertEqual(logged['prompt_tokens'], 100)
+		self.assertEqual(logged['completion_tokens'], 10)
+
+		# A document is only reported once
+		self.assertEqual(metrics.finish_document('paper.pdf'), {})
+
+
+	def test_write_prometheus(self):
+		"""
+		Tests that totals over several documents are written in Prometheus text format.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			prometheus_path = os.path.join(temp_dir, 'metrics.prom')
+			metrics = FlowMetrics(prometheus_path=prometheus_path)
+
+			for file_path in ('first.pdf', 'second.pdf'):
+				self.record_document(metrics, file_path)
+				metrics.finish_document(file_path)
+
+			with open(prometheus_path) as f:
+				lines = f.read().splitlines()
+
+		self.assertIn('# TYPE paper_documents_total counter', lines)
+		self.assertIn('paper_documents_total 2', lines)
+		self.assertIn('paper_pages_total 24', lines)
+		self.assertIn('paper_prompt_calls_total{field="title"} 4', lines)
+		self.assertIn('paper_prompt_cache_hits_total{field="title"} 2', lines)
+		self.assertIn('paper_prompt_tokens_total{field="title",type="prompt"} 200', lines)
+		self.assertIn('paper_prompt_tokens_total{field="title",type="completion"} 20', lines)
+		self.assertTrue(any(line.startswith('paper_stage_seconds_total{stage="extract_information"}') for line in lines))
+
+
+if __name__ == '__main__':
+	unittest.main()
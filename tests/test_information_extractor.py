@@ -1,74 +1,375 @@
-import os
-import sys
-import unittest
-from openai import OpenAIError
-from unittest.mock import patch, MagicMock
-
-# Add the root of the project directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.information_extractor import InformationExtractor
-
-
-class TestInformationExtractor(unittest.TestCase):
-	"""
-	Test cases for the InformationExtractor class, responsible for extracting
-	structured data from text using models from the LangChain library.
-	"""
-
-	@patch('src.information_extractor.InformationExtractor.get_extracted_data', autospec=True)
-	@patch('src.information_extractor.OpenAI', autospec=True)
-	def test_extract_all_properties(self, mock_openai, mock_get_extracted_data):
-		"""
-		Test the extraction of all properties using a mocked OpenAI model.
-		Covers extraction methods for title, author, publication date,
-		abstract, key findings, methodology, summary, and keywords.
-		"""
-		# Mock the get_extracted_data method of InformationExtractor to simulate responses
-		mocked_data = {
-			'title': "Test Title",
-			'authors': "John Doe",
-			'publication_date': "2023/01/01",
-			'abstract': "Abstract content.",
-			'findings': "Key finding one.",
-			'methodology': "Methodology details.",
-			'summary': "Paper summary.",
-			'keywords': "keyword1, keyword2",
-		}
-
-		mock_get_extracted_data.return_value = mocked_data
-		
-		# Create an instance of the InformationExtractor with sample text
-		extractor = InformationExtractor("Sample text", 'fake_api_key')
-		
-		# Get the extracted data as a dictionary
-		data = extractor.get_extracted_data()
-
-		# Assert each piece of extracted data against expected mock responses
-		self.assertEqual(data['title'], "Test Title")
-		self.assertEqual(data['authors'], "John Doe")
-		self.assertEqual(data['publication_date'], "2023/01/01")
-		self.assertEqual(data['abstract'], "Abstract content.")
-		self.assertEqual(data['findings'], "Key finding one.")
-		self.assertEqual(data['methodology'], "Methodology details.")
-		self.assertEqual(data['summary'], "Paper summary.")
-		self.assertEqual(data['keywords'], "keyword1, keyword2")
-
-
-	@patch('src.information_extractor.InformationExtractor.get_extracted_data', autospec=True)
-	@patch('src.information_extractor.OpenAI', autospec=True)
-	def test_handle_openai_error(self, mock_openai, mock_get_extracted_data):
-		"""
-		Test handling of OpenAI errors during prompt processing.
-		Simulates a scenario where the OpenAI model raises an error.
-		"""
-		# Mock the get_extracted_data method of InformationExtractor to simulate error response
-		mock_get_extracted_data.side_effect = OpenAIError("API limit exceeded")
-		
-		# Assert that an OpenAIError is raised during extraction
-		with self.assertRaises(OpenAIError) as context:
-			InformationExtractor("Sample text", 'fake_api_key').get_extracted_data()
-		self.assertEqual(str(context.exception), "API limit exceeded")
-
-
-if __name__ == '__main__':
-	unittest.main()
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+import httpx
+from openai import OpenAIError, RateLimitError
+from unittest.mock import patch, MagicMock, AsyncMock
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.information_extractor import InformationExtractor, ExtractionFailure
+from src.text_chunker import TextChunker
+from src.response_cache import ResponseCache
+from src.flow_metrics import DocumentMetrics
+from src.rate_limiter import RateLimiter
+
+
+class TestInformationExtractor(unittest.TestCase):
+	"""
+	Test cases for the InformationExtractor class, responsible for extracting
+	structured data from text using models from the LangChain library.
+	"""
+
+	@patch('src.information_extractor.InformationExtractor.get_extracted_data', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_extract_all_properties(self, mock_openai, mock_get_extracted_data):
+		"""
+		Test the extraction of all properties using a mocked OpenAI model.
+		Covers extraction methods for title, author, publication date,
+		abstract, key findings, methodology, summary, and keywords.
+		"""
+		# Mock the get_extracted_data method of InformationExtractor to simulate responses
+		mocked_data = {
+			'title': "Test Title",
+			'authors': "John Doe",
+			'publication_date': "2023/01/01",
+			'abstract': "Abstract content.",
+			'findings': "Key finding one.",
+			'methodology': "Methodology details.",
+			'summary': "Paper summary.",
+			'keywords': "keyword1, keyword2",
+		}
+
+		mock_get_extracted_data.return_value = mocked_data
+		
+		# Create an instance of the InformationExtractor with sample text
+		extractor = InformationExtractor("Sample text", 'fake_api_key')
+		
+		# Get the extracted data as a dictionary
+		data = extractor.get_extracted_data()
+
+		# Assert each piece of extracted data against expected mock responses
+		self.assertEqual(data['title'], "Test Title")
+		self.assertEqual(data['authors'], "John Doe")
+		self.assertEqual(data['publication_date'], "2023/01/01")
+		self.assertEqual(data['abstract'], "Abstract content.")
+		self.assertEqual(data['findings'], "Key finding one.")
+		self.assertEqual(data['methodology'], "Methodology details.")
+		self.assertEqual(data['summary'], "Paper summary.")
+		self.assertEqual(data['keywords'], "keyword1, keyword2")
+
+
+	@patch('src.information_extractor.InformationExtractor.get_extracted_data', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_handle_openai_error(self, mock_openai, mock_get_extracted_data):
+		"""
+		Test handling of OpenAI errors during prompt processing.
+		Simulates a scenario where the OpenAI model raises an error.
+		"""
+		# Mock the get_extracted_data method of InformationExtractor to simulate error response
+		mock_get_extracted_data.side_effect = OpenAIError("API limit exceeded")
+		
+		# Assert that an OpenAIError is raised during extraction
+		with self.assertRaises(OpenAIError) as context:
+			InformationExtractor("Sample text", 'fake_api_key').get_extracted_data()
+		self.assertEqual(str(context.exception), "API limit exceeded")
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_combined_extraction_retries_invalid_fields(self, mock_openai, mock_run_prompt):
+		"""
+		Test the combined extraction mode with a single prompt, where only the fields
+		that fail validation are extracted again with their own prompt.
+		"""
+		combined_response = (
+			'```json\n{"title": "Test Title", "authors": "John Doe", "publication_date": "Not given", '
+			'"abstract": "Abstract content.", "findings": "", "methodology": "Methodology details.", '
+			'"summary": "Paper summary.", "keywords": ["keyword1", "keyword2"]}\n```'
+		)
+		mock_run_prompt.side_effect = [combined_response, "2023/01/01", "Key finding one."]
+
+		data = InformationExtractor("Sample text", 'fake_api_key').get_extracted_data(combined=True)
+
+		# One combined call plus one retry for the invalid date and one for the empty findings
+		self.assertEqual(mock_run_prompt.call_count, 3)
+		self.assertEqual(data['title'], "Test Title")
+		self.assertEqual(data['publication_date'], "2023/01/01")
+		self.assertEqual(data['findings'], "Key finding one.")
+		self.assertEqual(data['keywords'], ["keyword1", "keyword2"])
+		self.assertIn('utc_timestamp', data)
+
+
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_parse_combined_response_invalid_json(self, mock_openai):
+		"""
+		Test that a combined response which is not valid JSON yields no fields.
+		"""
+		extractor = InformationExtractor("Sample text", 'fake_api_key')
+		self.assertEqual(extractor.parse_combined_response("An error occurred: timeout"), {})
+		self.assertEqual(extractor.parse_combined_response('{"title": "Test Title",'), {})
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_date_precision_of_combined_and_metadata_dates(self, mock_openai, mock_run_prompt):
+		"""
+		Test that dates of a combined answer and of the metadata keep the precision they were given with.
+		"""
+		mock_run_prompt.return_value = (
+			'{"title": "Test Title", "authors": "John Doe", "publication_date": "March 2023", '
+			'"abstract": "Abstract.", "findings": "Findings.", "methodology": "Methodology.", '
+			'"summary": "Summary.", "keywords": ["keyword1"]}'
+		)
+
+		data = InformationExtractor("Sample text", 'fake_api_key').get_extracted_data(combined=True)
+		self.assertEqual(data['publication_date'], "2023/03/01")
+		self.assertEqual(data['date_precision'], 'month')
+
+		metadata = {'publication_date': {'value': "2021", 'confidence': 0.95}}
+		data = InformationExtractor("Sample text", 'fake_api_key', metadata=metadata).get_extracted_data(combined=True)
+		self.assertEqual(data['publication_date'], "2021/01/01")
+		self.assertEqual(data['date_precision'], 'year')
+
+
+	@patch('src.information_extractor.InformationExtractor.arun_prompt', new_callable=AsyncMock)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_aget_extracted_data_concurrency_limit(self, mock_openai, mock_arun_prompt):
+		"""
+		Test that the async extraction returns every field and never runs
+		more prompts at the same time than the concurrency limit.
+		"""
+		running, peak = 0, 0
+
+		async def fake_prompt(prompt_template, text=None):
+			nonlocal running, peak
+			running += 1
+			peak = max(peak, running)
+			await asyncio.sleep(0.01)
+			running -= 1
+			return prompt_template.template.split(' ')[0]
+
+		mock_arun_prompt.side_effect = fake_prompt
+
+		extractor = InformationExtractor("Sample text", 'fake_api_key')
+		data = asyncio.run(extractor.aget_extracted_data(max_concurrency=3))
+
+		self.assertEqual(set(data), {'utc_timestamp', 'date_precision'} | set(InformationExtractor.FIELD_PROMPTS))
+		self.assertIsNone(data['date_precision'])
+		self.assertEqual(data['title'], "Extract")
+		self.assertEqual(data['summary'], "Generate")
+		self.assertEqual(peak, 3)
+
+
+	@patch('src.information_extractor.LLMChain', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_run_prompt_uses_cache(self, mock_openai, mock_llm_chain):
+		"""
+		Test that repeated prompts on the same text are answered from the cache
+		and that errors are never cached.
+		"""
+		mock_llm_chain.return_value.invoke.side_effect = [OpenAIError("API limit exceeded"), {'text': " Test Title "}]
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			cache = ResponseCache(os.path.join(temp_dir, 'cache.sqlite'))
+			extractor = InformationExtractor("Sample text", 'fake_api_key', cache=cache)
+
+			self.assertEqual(extractor.extract_title(), ExtractionFailure('title', 'OpenAIError', "API limit exceeded"))
+			self.assertEqual(extractor.extract_title(), "Test Title")
+			self.assertEqual(extractor.extract_title(), "Test Title")
+			self.assertEqual(mock_llm_chain.return_value.invoke.call_count, 2)
+			self.assertEqual(cache.stats()['hits'], 1)
+			cache.close()
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_chunked_extraction(self, mock_openai, mock_run_prompt):
+		"""
+		Test that fields needing the whole paper are extracted by map-reduce over the chunks,
+		while the other fields only read the first chunk.
+		"""
+		mock_run_prompt.side_effect = lambda self, prompt_template, text=None: f"answer to: {text}"
+		text = "Title line\nFirst part.\n1 Introduction\nSecond part.\n2 Methods\nThird part."
+
+		extractor = InformationExtractor(text, 'fake_api_key', chunker=TextChunker(max_tokens=6))
+		chunks = extractor.get_chunks()
+		self.assertEqual(len(chunks), 3)
+
+		# The title only reads the first chunk
+		self.assertEqual(extractor.extract_title(), f"answer to: {chunks[0]}")
+
+		# The summary is mapped over every chunk and the partial answers are reduced
+		mock_run_prompt.reset_mock()
+		extractor.chunker.max_tokens = 1000
+		extractor.generate_summary()
+		texts = [call.kwargs['text'] for call in mock_run_prompt.call_args_list]
+		self.assertEqual(texts[:3], chunks)
+		self.assertEqual(texts[3], "\n\n".join(f"answer to: {chunk}" for chunk in chunks))
+		self.assertIn("partial answers", mock_run_prompt.call_args_list[3].args[1].template)
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_map_reduce_rounds_are_bounded(self, mock_openai, mock_run_prompt):
+		"""
+		Test that partial answers too long to ever fit a single reduce prompt are cut
+		to fit one after the last round instead of being reduced forever.
+		"""
+		mock_run_prompt.side_effect = lambda self, prompt_template, text=None: ' '.join(['word'] * 40)
+
+		extractor = InformationExtractor("Sample text", 'fake_api_key', chunker=TextChunker(max_tokens=50))
+		answer = extractor.map_reduce('summary', ["first chunk", "second chunk", "third chunk"])
+
+		self.assertEqual(answer, ' '.join(['word'] * 40))
+		texts = [call.kwargs['text'] for call in mock_run_prompt.call_args_list]
+		self.assertEqual(len(texts), 3 + 3 * (InformationExtractor.MAX_REDUCE_ROUNDS - 1) + 1)
+		self.assertLessEqual(extractor.chunker.count_tokens(texts[-1]), 50)
+
+
+	@patch('src.information_extractor.InformationExtractor.arun_prompt', new_callable=AsyncMock)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_amap_reduce_shares_concurrency_limit(self, mock_openai, mock_arun_prompt):
+		"""
+		Test that the chunk prompts of map-reduce fields count against the concurrency limit.
+		"""
+		running, peak = 0, 0
+
+		async def fake_prompt(prompt_template, text=None):
+			nonlocal running, peak
+			running += 1
+			peak = max(peak, running)
+			await asyncio.sleep(0.01)
+			running -= 1
+			return "answer"
+
+		mock_arun_prompt.side_effect = fake_prompt
+		text = '\n'.join(f"{index} Section\nSome words of part {index}." for index in range(1, 11))
+
+		extractor = InformationExtractor(text, 'fake_api_key', chunker=TextChunker(max_tokens=8))
+		asyncio.run(extractor.aget_extracted_data(max_concurrency=2))
+
+		self.assertGreater(mock_arun_prompt.call_count, len(InformationExtractor.FIELD_PROMPTS))
+		self.assertEqual(peak, 2)
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_section_targeted_extraction(self, mock_openai, mock_run_prompt):
+		"""
+		Test that fields only read their relevant sections, falling back to the whole text
+		when the document has no matching section.
+		"""
+		mock_run_prompt.side_effect = lambda self, prompt_template, text=None: text
+		abstract = "Abstract\n" + "We study things. " * 5
+		methods = "2 Methods\n" + "We counted things. " * 5
+		text = "Title\n" + abstract + "\n" + methods
+		sections = {
+			'front matter': (0, 6),
+			'abstract': (6, 6 + len(abstract) + 1),
+			'methods': (6 + len(abstract) + 1, len(text))
+		}
+
+		extractor = InformationExtractor(text, 'fake_api_key', sections=sections)
+
+		self.assertEqual(extractor.extract_abstract(), abstract.strip())
+		self.assertEqual(extractor.extract_methodology(), methods.strip())
+		self.assertIsNone(extractor.generate_summary())
+		self.assertIsNone(extractor.extract_title())
+
+
+	@patch('src.information_extractor.InformationExtractor.run_prompt', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_metadata_fast_path(self, mock_openai, mock_run_prompt):
+		"""
+		Test that the LLM is only called for fields whose metadata confidence is below the threshold.
+		"""
+		mock_run_prompt.return_value = "Published on 2023/02/01"
+		metadata = {
+			'title': {'value': "Test Title", 'confidence': 0.95},
+			'publication_date': {'value': "2023/01/01", 'confidence': 0.4}
+		}
+
+		extractor = InformationExtractor("Sample text", 'fake_api_key', metadata=metadata, metadata_threshold=0.8)
+		data = extractor.get_extracted_data()
+
+		self.assertEqual(data['title'], "Test Title")
+		self.assertEqual(data['publication_date'], "2023/02/01")
+		self.assertEqual(mock_run_prompt.call_count, len(InformationExtractor.FIELD_PROMPTS) - 1)
+
+
+	@patch('src.information_extractor.LLMChain', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_run_prompt_records_metrics(self, mock_openai, mock_llm_chain):
+		"""
+		Test that every prompt is recorded under its field, including cache hits and failed calls.
+		"""
+		mock_llm_chain.return_value.invoke.side_effect = [{'text': "Test Title"}, OpenAIError("API limit exceeded")]
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			cache = ResponseCache(os.path.join(temp_dir, 'cache.sqlite'))
+			metrics = DocumentMetrics('paper.pdf')
+			extractor = InformationExtractor("Sample text", 'fake_api_key', cache=cache, metrics=metrics)
+
+			extractor.extract_title()
+			extractor.extract_title()
+			extractor.extract_abstract()
+			cache.close()
+
+		self.assertEqual(metrics.fields['title']['calls'], 2)
+		self.assertEqual(metrics.fields['title']['cache_hits'], 1)
+		self.assertEqual(metrics.fields['abstract']['calls'], 1)
+		self.assertEqual(metrics.fields['abstract']['cache_hits'], 0)
+
+
+	@patch('src.information_extractor.LLMChain', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_chains_are_reused_across_documents(self, mock_openai, mock_llm_chain):
+		"""
+		Test that the chain of each prompt is built once and reused after set_raw_text.
+		"""
+		mock_llm_chain.return_value.invoke.return_value = {'text': "Test Title"}
+
+		extractor = InformationExtractor("First document", 'fake_api_key')
+		extractor.extract_title()
+		extractor.set_raw_text("Second document")
+		extractor.extract_title()
+		extractor.extract_abstract()
+
+		self.assertEqual(mock_llm_chain.call_count, 2)
+		self.assertEqual(mock_llm_chain.return_value.invoke.call_args.args[0], {'text': "Second document"})
+		mock_openai.assert_called_once()
+
+
+	@patch('src.information_extractor.time.sleep')
+	@patch('src.information_extractor.LLMChain', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_run_prompt_retries_rate_limits(self, mock_openai, mock_llm_chain, mock_sleep):
+		"""
+		Test that rate limited calls are retried after the delay asked by the API and that
+		calls still failing after every retry are returned as structured failures.
+		"""
+		request = httpx.Request('POST', 'https://api.openai.com/v1/completions')
+		response = httpx.Response(429, headers={'retry-after-ms': '50'}, request=request)
+		rate_limit_error = RateLimitError("Rate limit reached", response=response, body=None)
+		mock_llm_chain.return_value.invoke.side_effect = [rate_limit_error, {'text': "Test Title"}] + [rate_limit_error] * 3
+
+		limiter = RateLimiter(max_retries=2)
+		extractor = InformationExtractor("Sample text", 'fake_api_key', rate_limiter=limiter)
+
+		self.assertEqual(extractor.extract_title(), "Test Title")
+		self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 0.05)
+
+		failure = extractor.extract_abstract()
+		self.assertIsInstance(failure, ExtractionFailure)
+		self.assertEqual((failure.field, failure.error_type, failure.attempts), ('abstract', 'RateLimitError', 3))
+		self.assertEqual(mock_llm_chain.return_value.invoke.call_count, 5)
+
+		# The limiter leaves retries to itself
+		self.assertEqual(mock_openai.call_args.kwargs['max_retries'], 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import openai
+import tempfile
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.llm_backends import CassetteLLM, SyntheticLLM, create_llm
+from src.information_extractor import InformationExtractor, ExtractionFailure
+from src.rate_limiter import RateLimiter
+
+
+class TestLLMBackends(unittest.TestCase):
+	"""
+	Test cases for the offline LLM backends.
+	"""
+
+	def test_record_and_replay_cassette(self):
+		"""
+		Tests that recorded responses are replayed without the recording LLM,
+		and that prompts missing from the cassette fail in replay mode.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			cassette_path = os.path.join(temp_dir, 'cassette.jsonl')
+
+			recorder = CassetteLLM(cassette_path=cassette_path, record=True, llm=SyntheticLLM(latency_mean=0))
+			extractor = InformationExtractor("Sample text", 'fake_api_key', llm=recorder)
+			recorded = extractor.get_extracted_data()
+
+			with open(cassette_path) as f:
+				entries = [json.loads(line) for line in f]
+			self.assertEqual(len(entries), len(InformationExtractor.FIELD_PROMPTS))
+			self.assertEqual(len({entry['key'] for entry in entries}), len(entries))
+
+			extractor = InformationExtractor("Sample text", 'fake_api_key', llm=create_llm('replay', cassette_path=cassette_path))
+			replayed = extractor.get_extracted_data()
+			self.assertEqual({**replayed, 'utc_timestamp': None}, {**recorded, 'utc_timestamp': None})
+
+			with self.assertRaises(KeyError):
+				CassetteLLM(cassette_path=cassette_path).invoke("Unknown prompt")
+
+			# Recording with a rate limiter leaves the retries to it
+			self.assertEqual(create_llm('record', openai_api_key='fake_api_key', cassette_path=cassette_path, rate_limiter=RateLimiter()).llm.max_retries, 0)
+			self.assertGreater(create_llm('record', openai_api_key='fake_api_key', cassette_path=cassette_path).llm.max_retries, 0)
+
+
+	def test_synthetic_responses_and_failures(self):
+		"""
+		Tests that synthetic responses fit the prompts, and that failures follow the seed and the
+		number of times a prompt was sent, so that retries can succeed.
+		"""
+		llm = SyntheticLLM(latency_mean=0)
+		self.assertEqual(llm.invoke("Extract the publication date, format as YYYY/MM/DD:\ntext"), "2024/01/01")
+		self.assertEqual(llm.invoke("Some prompt"), SyntheticLLM(latency_mean=0).invoke("Some prompt"))
+
+		outcomes = []
+		for _ in range(2):
+			llm = SyntheticLLM(latency_mean=0, failure_rates={'rate_limit': 0.5}, seed=3)
+			attempts = []
+			for _ in range(20):
+				try:
+					llm.invoke("Some prompt")
+					attempts.append('ok')
+				except openai.RateLimitError:
+					attempts.append('rate_limit')
+			outcomes.append(attempts)
+
+		self.assertEqual(outcomes[0], outcomes[1])
+		self.assertEqual(set(outcomes[0]), {'ok', 'rate_limit'})
+
+		with self.assertRaises(openai.APITimeoutError):
+			SyntheticLLM(latency_mean=0, failure_rates={'timeout': 1.0}).invoke("Some prompt")
+
+
+	def test_synthetic_failures_are_retried(self):
+		"""
+		Tests that synthetic rate limits go through the retries of the extractor.
+		"""
+		llm = SyntheticLLM(latency_mean=0, failure_rates={'rate_limit': 0.3}, retry_after=0.0)
+		limiter = RateLimiter(max_retries=10, base_delay=0.0)
+		extractor = InformationExtractor("Sample text", 'fake_api_key', llm=llm, rate_limiter=limiter)
+
+		extracted_data = extractor.get_extracted_data()
+		self.assertEqual(ExtractionFailure.find(extracted_data), [])
+		self.assertTrue(all(isinstance(keyword, str) for keyword in extracted_data['keywords']))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import fitz
+import tempfile
+import unittest
+import subprocess
+from unittest.mock import patch
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.search_index import SearchIndex
+from src.embedding_index import EmbeddingIndex, HashingEmbedder
+from src import main
+
+# The command line is run in a new interpreter from the src directory, as `python src/main.py` would
+MAIN_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'main.py'))
+
+# Prints the output of a command followed by the heavy packages it imported
+RUN_COMMAND = """
+import sys
+import json
+sys.argv = ['main.py'] + sys.argv[1:]
+sys.path.insert(0, {src_dir!r})
+import main
+main.main()
+print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}} & {{'langchain', 'langchain_community', 'langgraph', 'openai', 'google'}})))
+"""
+
+
+class TestMain(unittest.TestCase):
+	"""
+	Test cases for the command line.
+	"""
+
+	def setUp(self):
+		"""
+		Creates a temporary directory with two PDF files.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		for name in ('first', 'second'):
+			pdf = fitz.open()
+			pdf.new_page().insert_text((72, 72), f"Text of the {name} paper.")
+			pdf.save(os.path.join(self.temp_dir.name, f"{name}.pdf"))
+			pdf.close()
+
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+
+	def run_command(self, *args) -> tuple:
+		"""
+		Runs the command line in a new interpreter, so that imports of previous tests do not count.
+
+		:returns: tuple, JSON lines printed by the command and heavy packages it imported.
+		"""
+		code = RUN_COMMAND.format(src_dir=os.path.dirname(MAIN_PATH))
+		output = subprocess.run([sys.executable, '-c', code, *args], capture_output=True, text=True, check=True).stdout
+		lines = [json.loads(line) for line in output.splitlines()]
+
+		return lines[:-1], lines[-1]
+
+
+	def test_ingest_only(self):
+		"""
+		Tests that ingest-only extracts the text of every PDF file without importing the LLM or BigQuery stacks.
+		"""
+		output_dir = os.path.join(self.temp_dir.name, 'text')
+		documents, imported = self.run_command('ingest-only', self.temp_dir.name, '--output-dir', output_dir)
+
+		self.assertEqual([os.path.basename(document['file_path']) for document in documents], ['first.pdf', 'second.pdf'])
+		self.assertEqual(documents[0]['page_count'], 1)
+		with open(os.path.join(output_dir, 'first.txt')) as f:
+			self.assertIn("Text of the first paper.", f.read())
+		self.assertEqual(imported, [])
+
+
+	@patch('src.llm_backends.create_llm')
+	@patch('src.storage_backends.create_storer')
+	@patch('src.text_processing_flow.TextProcessingFlow')
+	def test_run_reads_extraction_options(self, mock_flow, mock_create_storer, mock_create_llm):
+		"""
+		Tests that run configures the extraction, cache, chunking and page workers from the environment.
+		"""
+		environment = {
+			'COMBINED_EXTRACTION': 'true', 'EXTRACTION_CONCURRENCY': '4', 'CACHE_PATH': os.path.join(self.temp_dir.name, 'responses.sqlite'),
+			'CACHE_MAX_ENTRIES': '10', 'CACHE_TTL_SECONDS': '60', 'CHUNK_TOKENS': '1000', 'METADATA_THRESHOLD': '0.9', 'PAGE_WORKERS': '2'
+		}
+		with patch.dict(os.environ, environment, clear=True):
+			main.run(os.path.join(self.temp_dir.name, 'first.pdf'), bypass_cache=True)
+
+		arguments = mock_flow.call_args.kwargs
+		self.assertTrue(arguments['combined_extraction'])
+		self.assertEqual(arguments['extraction_concurrency'], 4)
+		self.assertEqual((arguments['cache'].max_entries, arguments['cache'].ttl_seconds, arguments['cache'].bypass), (10, 60.0, True))
+		self.assertEqual(arguments['chunker'].max_tokens, 1000)
+		self.assertEqual(arguments['metadata_threshold'], 0.9)
+		self.assertEqual(arguments['page_workers'], 2)
+		mock_flow.return_value.run.assert_called_once()
+		mock_flow.return_value.close.assert_called_once()
+
+
+	def test_dry_run(self):
+		"""
+		Tests that dry-run lists the pending PDF files and their tokens without importing the LLM or BigQuery stacks.
+		"""
+		lines, imported = self.run_command('dry-run', os.path.join(self.temp_dir.name, 'first.pdf'))
+
+		self.assertEqual(lines[0]['status'], 'pending')
+		self.assertGreater(lines[0]['tokens'], 0)
+		self.assertEqual(lines[-1], {'files': 1, 'pending': 1, 'skipped': 0, 'tokens': lines[0]['tokens']})
+		self.assertEqual(imported, [])
+
+
+	def test_search(self):
+		"""
+		Tests that search prints the matching papers of the index without importing the LLM or BigQuery stacks.
+		"""
+		index_path = os.path.join(self.temp_dir.name, 'search.sqlite')
+		search_index = SearchIndex(index_path)
+		search_index.add('/papers/first.pdf', {'title': "Graph Neural Networks", 'keywords': ['graphs']})
+		search_index.add('/papers/second.pdf', {'title': "Protein Folding", 'keywords': ['biology']})
+		search_index.close()
+
+		papers, imported = self.run_command('search', 'graph', '--index', index_path)
+
+		self.assertEqual([paper['file_path'] for paper in papers], ['/papers/first.pdf'])
+		self.assertEqual(imported, [])
+
+
+	def test_similar(self):
+		"""
+		Tests that similar prints the papers closest to an indexed paper or a text without importing the LLM or BigQuery stacks.
+		"""
+		index_path = os.path.join(self.temp_dir.name, 'embeddings')
+		embedding_index = EmbeddingIndex(index_path, dimensions=64)
+		embedder = HashingEmbedder(dimensions=64)
+		for name, text in (('first', "graph neural networks"), ('second', "graph neural networks for molecules"), ('third', "protein folding")):
+			embedding_index.add(os.path.join(self.temp_dir.name, f"{name}.pdf"), embedder.embed([text])[0])
+		embedding_index.close()
+
+		papers, imported = self.run_command('similar', os.path.join(self.temp_dir.name, 'first.pdf'), '--k', '1', '--index', index_path)
+		self.assertEqual([os.path.basename(paper['file_path']) for paper in papers], ['second.pdf'])
+		self.assertEqual(imported, [])
+
+		papers, imported = self.run_command('similar', '--text', "protein folding", '--index', index_path)
+		self.assertEqual(os.path.basename(papers[0]['file_path']), 'third.pdf')
+		self.assertAlmostEqual(papers[0]['similarity'], 1.0, places=5)
+		self.assertEqual(len(papers), 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import httpx
+import openai
+import unittest
+from unittest.mock import patch
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.rate_limiter import RateLimiter
+
+
+def make_rate_limit_error(headers: dict) -> openai.RateLimitError:
+	"""
+	Builds a rate limit error as raised by the OpenAI client for a 429 response.
+	"""
+	request = httpx.Request('POST', 'https://api.openai.com/v1/completions')
+	response = httpx.Response(429, headers=headers, request=request)
+
+	return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class TestRateLimiter(unittest.TestCase):
+	"""
+	Test cases for the RateLimiter class.
+	"""
+
+	@patch('src.rate_limiter.time.monotonic')
+	def test_buckets_limit_requests_and_tokens(self, mock_monotonic):
+		"""
+		Tests that calls wait once either bucket is empty, until enough of it is refilled.
+		"""
+		mock_monotonic.return_value = 0.0
+		limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=600)
+
+		self.assertEqual(limiter.reserve(100), 0.0)
+		self.assertEqual(limiter.reserve(100), 0.0)
+
+		# Out of requests, one request is earned every 30 seconds
+		self.assertAlmostEqual(limiter.reserve(100), 30.0)
+
+		mock_monotonic.return_value = 60.0
+		self.assertEqual(limiter.reserve(600), 0.0)
+
+		# Enough requests after 30 more seconds, but only 300 tokens, 300 tokens are earned every 30 seconds
+		mock_monotonic.return_value = 90.0
+		self.assertAlmostEqual(limiter.reserve(500), 20.0)
+
+		# The actual usage of a call gives back the tokens reserved in excess
+		limiter.record_usage(estimated_tokens=600, used_tokens=400)
+		self.assertEqual(limiter.reserve(500), 0.0)
+
+
+	@patch('src.rate_limiter.time.monotonic', return_value=0.0)
+	def test_rate_limit_pauses_and_slows_down(self, mock_monotonic):
+		"""
+		Tests that a rate limit response pauses every caller and halves the request rate,
+		which recovers with successful calls.
+		"""
+		limiter = RateLimiter(requests_per_minute=60)
+		error = make_rate_limit_error({'retry-after': '5'})
+
+		self.assertTrue(limiter.is_retryable(error))
+		self.assertFalse(limiter.is_retryable(ValueError("Invalid prompt")))
+		self.assertEqual(limiter.get_retry_after(error), 5.0)
+		self.assertEqual(limiter.get_retry_after(make_rate_limit_error({'retry-after-ms': '250'})), 0.25)
+
+		limiter.record_rate_limit(limiter.get_retry_after(error))
+		self.assertEqual(limiter.rate_factor, 0.5)
+		self.assertAlmostEqual(limiter.reserve(1), 5.0)
+
+		for _ in range(20):
+			limiter.record_success()
+		self.assertEqual(limiter.rate_factor, 1.0)
+
+
+	def test_backoff_delay(self):
+		"""
+		Tests that the backoff delay is jittered, capped and never shorter than asked by the API.
+		"""
+		limiter = RateLimiter(base_delay=1.0, max_delay=10.0)
+
+		for attempt in range(1, 10):
+			delay = limiter.get_backoff_delay(attempt)
+			self.assertGreaterEqual(delay, 0.0)
+			self.assertLessEqual(delay, min(10.0, 2 ** (attempt - 1)))
+
+		self.assertGreaterEqual(limiter.get_backoff_delay(1, retry_after=20.0), 20.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+	"""
+	Test cases for the ResponseCache class.
+	"""
+
+	def setUp(self):
+		"""
+		Creates a temporary directory for the cache database.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.db_path = os.path.join(self.temp_dir.name, 'cache.sqlite')
+
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+
+	def test_get_and_set(self):
+		"""
+		Tests storing a response and reading it back, counting hits and misses.
+		"""
+		cache = ResponseCache(self.db_path)
+		key = ResponseCache.make_key('model', 'Extract the title:\n{text}', 'Sample text')
+
+		self.assertIsNone(cache.get(key))
+		cache.set(key, 'Test Title')
+		self.assertEqual(cache.get(key), 'Test Title')
+		self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+		cache.close()
+
+		# Responses persist across instances
+		cache = ResponseCache(self.db_path)
+		self.assertEqual(cache.get(key), 'Test Title')
+		cache.close()
+
+
+	def test_make_key_distinguishes_parts(self):
+		"""
+		Tests that keys depend on model name, template and text.
+		"""
+		key = ResponseCache.make_key('model', 'template', 'text')
+		self.assertNotEqual(key, ResponseCache.make_key('other-model', 'template', 'text'))
+		self.assertNotEqual(key, ResponseCache.make_key('model', 'other template', 'text'))
+		self.assertNotEqual(ResponseCache.make_key('ab', 'c', ''), ResponseCache.make_key('a', 'bc', ''))
+
+
+	@patch('src.response_cache.time.time')
+	def test_ttl_and_size_eviction(self, mock_time):
+		"""
+		Tests that expired and least recently used responses are evicted.
+		"""
+		mock_time.return_value = 1000.0
+		cache = ResponseCache(self.db_path, max_entries=2, ttl_seconds=60)
+		cache.set('a', 'A')
+		mock_time.return_value = 1001.0
+		cache.set('b', 'B')
+		mock_time.return_value = 1002.0
+		cache.get('a')
+		mock_time.return_value = 1003.0
+		cache.set('c', 'C')
+
+		# 'b' was the least recently used entry
+		self.assertIsNone(cache.get('b'))
+		self.assertEqual(cache.get('a'), 'A')
+
+		mock_time.return_value = 1070.0
+		self.assertIsNone(cache.get('a'))
+		self.assertEqual(cache.evict_expired(), 1)
+		self.assertEqual(cache.stats()['entries'], 0)
+		cache.close()
+
+
+	def test_bypass(self):
+		"""
+		Tests that a bypassed cache neither reads nor stores responses.
+		"""
+		cache = ResponseCache(self.db_path, bypass=True)
+		cache.set('a', 'A')
+		self.assertIsNone(cache.get('a'))
+		self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'entries': 0})
+		cache.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
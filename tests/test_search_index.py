@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.search_index import SearchIndex
+
+
+class TestSearchIndex(unittest.TestCase):
+	"""
+	Test cases for the SearchIndex class.
+	"""
+
+	def setUp(self):
+		"""
+		Creates an index of two papers in a temporary directory.
+		"""
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.db_path = os.path.join(self.temp_dir.name, 'search.sqlite')
+
+		self.index = SearchIndex(self.db_path)
+		self.index.add('/papers/graphs.pdf', {
+			'title': "Graph Neural Networks for Molecules",
+			'authors': "Jane Doe",
+			'publication_date': '2024/01/01',
+			'abstract': "We learn molecular properties with message passing.",
+			'summary': "Message passing networks predict properties of molecules.",
+			'keywords': ['graph learning', 'chemistry']
+		})
+		self.index.add('/papers/proteins.pdf', {
+			'title': "Protein Structure Prediction",
+			'abstract': "Attention models predict protein structures, unlike graph networks.",
+			'summary': "Transformers fold proteins.",
+			'keywords': 'biology, transformers'
+		})
+
+
+	def tearDown(self):
+		self.index.close()
+		self.temp_dir.cleanup()
+
+
+	def test_search_ranks_by_field_weights(self):
+		"""
+		Tests that papers matching every term are found, stemmed, with matches in the title ranked first.
+		"""
+		papers = self.index.search("graph network")
+		self.assertEqual([paper['file_path'] for paper in papers], ['/papers/graphs.pdf', '/papers/proteins.pdf'])
+		self.assertGreater(papers[0]['score'], papers[1]['score'])
+		self.assertEqual(papers[0]['authors'], "Jane Doe")
+		self.assertIn('[', papers[0]['excerpt'])
+
+		self.assertEqual(self.index.search("graph proteins")[0]['file_path'], '/papers/proteins.pdf')
+		self.assertEqual(self.index.search("graph", field='keywords')[0]['file_path'], '/papers/graphs.pdf')
+		self.assertEqual(len(self.index.search("graph", field='keywords')), 1)
+		self.assertEqual(self.index.search("transf", prefix=True)[0]['file_path'], '/papers/proteins.pdf')
+
+
+	def test_queries_are_escaped(self):
+		"""
+		Tests that FTS5 operators and punctuation in queries are searched as plain terms.
+		"""
+		self.assertEqual(self.index.search('"); DROP TABLE papers; --'), [])
+		self.assertEqual(self.index.search("NOT graph OR"), [])
+		self.assertEqual(self.index.search("   "), [])
+		with self.assertRaises(ValueError):
+			self.index.search("graph", field='authors')
+
+
+	def test_updates_replace_papers(self):
+		"""
+		Tests that indexing a paper again replaces its previous version, also after reopening the index.
+		"""
+		self.index.add('/papers/graphs.pdf', {'title': "Hypergraph Networks", 'keywords': []})
+		self.index.close()
+
+		self.index = SearchIndex(self.db_path)
+		self.assertEqual(self.index.count(), 2)
+		self.assertEqual(self.index.search("molecules"), [])
+		self.assertEqual(self.index.search("hypergraph")[0]['file_path'], '/papers/graphs.pdf')
+
+
+if __name__ == '__main__':
+	unittest.main()
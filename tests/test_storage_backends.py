@@ -0,0 +1,83 @@
+import os
+import sys
+import datetime
+import tempfile
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.storage_backends import LocalStorer, ParquetStorer, DuckDBStorer, create_storer, pyarrow, duckdb
+from tests.fixtures import make_extracted_data
+
+
+class TestStorageBackends(unittest.TestCase):
+	"""
+	Test cases for the local Parquet and DuckDB storage backends.
+	"""
+
+	@unittest.skipUnless(pyarrow, "pyarrow is not installed")
+	def test_parquet_storer_writes_partitions(self):
+		"""
+		Test that rows are written in batches to Parquet files partitioned by ingest date,
+		with the types of the schema.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			with ParquetStorer(temp_dir, max_rows=2) as storer:
+				for index in range(3):
+					self.assertEqual(storer.store_data(make_extracted_data(f"Title {index}")), [])
+
+			files = sorted(os.listdir(os.path.join(temp_dir, 'ingest_date=2025-01-01')))
+			self.assertEqual(len(files), 2)
+			self.assertTrue(all(name.endswith('.parquet') for name in files))
+
+			table = pyarrow.parquet.read_table(os.path.join(temp_dir, 'ingest_date=2025-01-01'))
+			self.assertEqual(table.num_rows, 3)
+			self.assertEqual(table.schema.field('keywords').type, pyarrow.list_(pyarrow.string()))
+			self.assertEqual(table.column('publication_date')[0].as_py(), datetime.datetime(2023, 1, 1))
+
+
+	@unittest.skipUnless(duckdb, "duckdb is not installed")
+	def test_duckdb_storer_inserts_rows(self):
+		"""
+		Test that rows are inserted into the DuckDB table, and that rows which do not match
+		the schema are rejected with their errors.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			db_path = os.path.join(temp_dir, 'papers.duckdb')
+			with create_storer('duckdb', table_id='papers', output_path=db_path) as storer:
+				self.assertIsInstance(storer, DuckDBStorer)
+				storer.store_data(make_extracted_data('Title'))
+
+				failed_rows = storer.store_data({**make_extracted_data('Invalid'), 'publication_date': 'unknown'})
+				self.assertEqual(len(failed_rows), 1)
+				self.assertEqual(failed_rows[0]['row']['title'], 'Invalid')
+				self.assertEqual(failed_rows[0]['errors'][0]['reason'], 'invalid')
+
+			connection = duckdb.connect(db_path)
+			rows = connection.execute("SELECT title, keywords FROM papers").fetchall()
+			connection.close()
+			self.assertEqual(rows, [('Title', ['keyword1', 'keyword2'])])
+
+
+	def test_create_storer_rejects_unknown_backend(self):
+		"""
+		Test that an unknown storage backend is reported.
+		"""
+		with self.assertRaises(ValueError):
+			create_storer('unknown')
+
+
+	def test_incomplete_storer_cannot_be_created(self):
+		"""
+		Test that a local backend missing a method of the interface fails when it is created.
+		"""
+		class IncompleteStorer(LocalStorer):
+			def write_rows(self, rows):
+				pass
+
+		with self.assertRaises(TypeError):
+			IncompleteStorer()
+
+
+if __name__ == '__main__':
+	unittest.main()
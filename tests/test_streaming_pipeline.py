@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import unittest
+import threading
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.streaming_pipeline import PipelineStage, StreamingPipeline
+
+
+class TestStreamingPipeline(unittest.TestCase):
+	"""
+	Test cases for the StreamingPipeline class.
+	"""
+
+	def test_run_passes_items_through_every_stage(self):
+		"""
+		Tests that every item goes through the stages in order, failed items leaving with their error
+		and finished items skipping the remaining stages.
+		"""
+		def check(item):
+			if item == 3:
+				raise ValueError("Invalid item")
+			return item
+
+		stages = [
+			PipelineStage('check', check, workers=2),
+			PipelineStage('double', lambda item: item * 2, workers=3),
+			PipelineStage('increment', lambda item: item + 1)
+		]
+		pipeline = StreamingPipeline(stages, queue_size=2, is_finished=lambda item: item == 8)
+		results = sorted((item, str(error) if error else "") for item, error in pipeline.run(range(6)))
+
+		self.assertEqual(results, [(1, ""), (3, ""), (3, "Invalid item"), (5, ""), (8, ""), (11, "")])
+		self.assertEqual([stage.processed for stage in stages], [6, 5, 4])
+		self.assertEqual(list(StreamingPipeline(stages).run([])), [])
+
+
+	def test_run_bounds_items_in_flight(self):
+		"""
+		Tests that a slow stage pauses the stages feeding it, so that items do not pile up in memory.
+		"""
+		lock = threading.Lock()
+		in_flight = [0, 0]
+
+		def produce(item):
+			with lock:
+				in_flight[0] += 1
+				in_flight[1] = max(in_flight[1], in_flight[0])
+			return item
+
+		def consume(item):
+			time.sleep(0.005)
+			with lock:
+				in_flight[0] -= 1
+			return item
+
+		stages = [PipelineStage('produce', produce, workers=2), PipelineStage('consume', consume)]
+		results = list(StreamingPipeline(stages, queue_size=3).run(range(50)))
+
+		self.assertEqual(sorted(item for item, _ in results), list(range(50)))
+		# Items in the queue, in the consumer and held by blocked producers
+		self.assertLessEqual(in_flight[1], 3 + 1 + 2)
+
+
+	def test_run_keeps_every_stage_busy(self):
+		"""
+		Tests that stages work on different items at the same time, a batch taking about as long as its slowest stage.
+		"""
+		def wait(item):
+			time.sleep(0.02)
+			return item
+
+		stages = [PipelineStage(name, wait) for name in ('ingest', 'extract', 'store')]
+		start_time = time.perf_counter()
+		results = list(StreamingPipeline(stages, queue_size=2).run(range(10)))
+		elapsed_seconds = time.perf_counter() - start_time
+
+		self.assertEqual(len(results), 10)
+		self.assertLess(elapsed_seconds, 3 * 10 * 0.02 * 0.7)
+		self.assertGreater(stages[1].get_stats(elapsed_seconds)['utilization'], 0.5)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import unittest
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.text_chunker import TextChunker
+
+
+class TestTextChunker(unittest.TestCase):
+	"""
+	Test cases for the TextChunker class.
+	"""
+
+	def setUp(self):
+		"""
+		Builds a sample paper with several sections.
+		"""
+		self.text = (
+			"A Study of Things\n"
+			"Jane Doe\n"
+			"Abstract\n"
+			"We study things in depth.\n"
+			"1 Introduction\n"
+			"Things are everywhere and deserve attention.\n"
+			"2 Methods\n"
+			"We counted things carefully with a method.\n"
+			"3 Results\n"
+			"There are many things."
+		)
+
+
+	def test_count_tokens(self):
+		"""
+		Tests that words and punctuation marks are counted as tokens.
+		"""
+		self.assertEqual(TextChunker.count_tokens("We study things, in depth."), 7)
+
+
+	def test_split_sections(self):
+		"""
+		Tests that a new section starts at every heading.
+		"""
+		sections = TextChunker().split_sections(self.text)
+		self.assertEqual([section.split('\n')[0] for section in sections], [
+			"A Study of Things", "Abstract", "1 Introduction", "2 Methods", "3 Results"
+		])
+
+
+	def test_chunk_respects_sections_and_budget(self):
+		"""
+		Tests that chunks stay within the token budget and are cut at section boundaries.
+		"""
+		chunker = TextChunker(max_tokens=20)
+		chunks = chunker.chunk(self.text)
+
+		self.assertGreater(len(chunks), 1)
+		self.assertTrue(all(chunker.count_tokens(chunk) <= 20 for chunk in chunks))
+		self.assertTrue(all(chunk.split('\n')[0] in self.text.split('\n') for chunk in chunks))
+		self.assertEqual('\n'.join(chunks), self.text)
+
+
+	def test_chunk_splits_oversized_sections(self):
+		"""
+		Tests that a section larger than the budget is split by words.
+		"""
+		chunker = TextChunker(max_tokens=5)
+		chunks = chunker.chunk("one two three four five six seven eight nine ten eleven")
+
+		self.assertEqual(chunks, ["one two three four five", "six seven eight nine ten", "eleven"])
+
+
+	def test_truncate(self):
+		"""
+		Tests that a text is cut to its first words within the budget.
+		"""
+		chunker = TextChunker()
+		self.assertEqual(chunker.truncate("one two, three four", 3), "one two,")
+		self.assertEqual(chunker.truncate("one two", 4), "one two")
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,125 +1,359 @@
-import os
-import sys
-import unittest
-from langgraph.graph import START, END
-from unittest.mock import MagicMock, patch
-
-# Add the root of the project directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.text_processing_flow import TextProcessingFlow
-
-class TestTextProcessingFlow(unittest.TestCase):
-
-	def setUp(self):
-		"""
-		Sets up the test case with necessary mocks and initialize
-		the TextProcessingFlow instance.
-		"""
-		self.file_path = "dummy/path/to/file.pdf"
-		self.openai_api_key = 'dummy_api_key'
-		self.project_id = 'dummy_project_id'
-		self.dataset_id = 'dummy_dataset_id'
-		self.table_id = 'dummy_table_id'
-		
-		self.flow = TextProcessingFlow(
-			file_path=self.file_path,
-			openai_api_key=self.openai_api_key,
-			project_id=self.project_id,
-			dataset_id=self.dataset_id,
-			table_id=self.table_id
-		)
-
-
-	@patch('src.text_processing_flow.DocumentIngestor.process_text', return_value="Mocked PDF content")
-	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
-	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
-	def test_ingest_document_success(self, mock_process, mock_extract, mock_store):
-		"""
-		Tests that the ingest_document function processes the document correctly.
-		"""
-		state = {'pdf_content': ""}
-		result = self.flow.ingest_document(state)
-		self.assertEqual(result['pdf_content'], "Mocked PDF content")
-		self.assertEqual(state['pdf_content'], "Mocked PDF content")
-
-
-	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
-	@patch('src.information_extractor.OpenAI', autospec=True)
-	def test_extract_information_success(self, mock_openai, mock_extract):
-		"""
-		Tests that the extract_information method extracts data successfully.
-		"""
-		state = {'pdf_content': "Mocked PDF content", 'extracted_data': {}}
-		result = self.flow.extract_information(state)
-		self.assertEqual(result['extracted_data']['title'], "Mocked Title")
-		self.assertEqual(state['extracted_data']['title'], "Mocked Title")
-
-
-	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
-	@patch('src.data_storer.Client', autospec=True)
-	def test_store_information_success(self, mock_client, mock_store):
-		"""
-		Tests that store_information succeeds in storing data.
-		"""
-		state = {'extracted_data': {'title': 'Mocked Title'}}
-		self.flow.store_information(state)
-		mock_store.assert_called_once()
-		mock_client.assert_called_once()
-
-
-	@patch('src.text_processing_flow.DataStorer.store_data', side_effect=Exception("Mocked storage error"))
-	@patch('src.data_storer.Client', autospec=True)
-	def test_store_information_failure(self, mock_client, mock_store):
-		"""
-		Tests that store_information handles errors during storage.
-		"""
-		state = {'extracted_data': {'title': 'Mocked Title'}}
-		self.flow.store_information(state)
-		mock_store.assert_called_once()
-		mock_client.assert_called_once()
-
-
-	def test_create_graph_nodes(self):
-		"""
-		Tests that nodes are correctly added to the graph.
-		"""
-		original_workflow = MagicMock()
-		modified_workflow = self.flow.create_graph_nodes(original_workflow)
-		modified_workflow.add_node.assert_any_call('ingest_document', self.flow.ingest_document)
-		modified_workflow.add_node.assert_any_call('extract_information', self.flow.extract_information)
-		modified_workflow.add_node.assert_any_call('store_information', self.flow.store_information)
-
-
-	def test_create_graph_edges(self):
-		"""
-		Tests that edges are correctly connected in the graph.
-		"""
-		original_workflow = MagicMock()
-		modified_workflow = self.flow.create_graph_edges(original_workflow)
-		modified_workflow.add_edge.assert_any_call(START, 'ingest_document')
-		modified_workflow.add_edge.assert_any_call('ingest_document', 'extract_information')
-		modified_workflow.add_edge.assert_any_call('extract_information', 'store_information')
-		modified_workflow.add_edge.assert_any_call('store_information', END)
-
-
-	@patch('src.text_processing_flow.DocumentIngestor.process_text', return_value="Mocked PDF content")
-	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
-	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
-	@patch('src.data_storer.Client', autospec=True)
-	def test_full_workflow_execution(self, mock_client, mock_process, mock_extract, mock_store):
-		"""
-		Tests the full workflow execution.
-		"""
-		initial_state = {'pdf_content': "", 'extracted_data': {}}
-		config = {'configurable': {'thread_id': 'my_thread'}}
-		self.flow.workflow.invoke(input=initial_state, config=config)
-  
-		self.assertEqual(self.flow.workflow.get_state(config).values['pdf_content'], "Mocked PDF content")
-		self.assertIn('title', self.flow.workflow.get_state(config).values['extracted_data'])
-		self.assertEqual(self.flow.workflow.get_state(config).values['extracted_data']['title'], "Mocked Title")
-		mock_store.assert_called_once()
-		mock_client.assert_called_once()
-
-
-if __name__ == '__main__':
-	unittest.main()
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+import threading
+from langgraph.graph import START, END
+from unittest.mock import MagicMock, patch
+
+# Add the root of the project directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.text_processing_flow import TextProcessingFlow
+from src.information_extractor import ExtractionFailure
+from src.duplicate_detector import DuplicateDetector
+from src.search_index import SearchIndex
+from src.embedding_index import EmbeddingIndex
+
+class TestTextProcessingFlow(unittest.TestCase):
+
+	def setUp(self):
+		"""
+		Sets up the test case with necessary mocks and initialize
+		the TextProcessingFlow instance.
+		"""
+		self.file_path = "dummy/path/to/file.pdf"
+		self.openai_api_key = 'dummy_api_key'
+		self.project_id = 'dummy_project_id'
+		self.dataset_id = 'dummy_dataset_id'
+		self.table_id = 'dummy_table_id'
+		
+		self.flow = TextProcessingFlow(
+			file_path=self.file_path,
+			openai_api_key=self.openai_api_key,
+			project_id=self.project_id,
+			dataset_id=self.dataset_id,
+			table_id=self.table_id
+		)
+
+
+	@patch('src.text_processing_flow.DocumentIngestor.process_text', return_value="Mocked PDF content")
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
+	def test_ingest_document_success(self, mock_process, mock_extract, mock_store):
+		"""
+		Tests that the ingest_document function processes the document correctly.
+		"""
+		state = {'pdf_content': ""}
+		result = self.flow.ingest_document(state)
+		self.assertEqual(result['pdf_content'], "Mocked PDF content")
+		self.assertEqual(state['pdf_content'], "Mocked PDF content")
+
+
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_extract_information_success(self, mock_openai, mock_extract):
+		"""
+		Tests that the extract_information method extracts data successfully.
+		"""
+		state = {'pdf_content': "Mocked PDF content", 'extracted_data': {}}
+		result = self.flow.extract_information(state)
+		self.assertEqual(result['extracted_data']['title'], "Mocked Title")
+		self.assertEqual(state['extracted_data']['title'], "Mocked Title")
+
+
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_information_success(self, mock_client, mock_store):
+		"""
+		Tests that store_information succeeds in storing data.
+		"""
+		state = {'extracted_data': {'title': 'Mocked Title'}}
+		self.flow.store_information(state)
+		mock_store.assert_called_once()
+		mock_client.assert_called_once()
+
+
+	@patch('src.text_processing_flow.DataStorer.store_data', side_effect=Exception("Mocked storage error"))
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_information_failure(self, mock_client, mock_store):
+		"""
+		Tests that store_information handles errors during storage.
+		"""
+		state = {'extracted_data': {'title': 'Mocked Title'}}
+		self.flow.store_information(state)
+		mock_store.assert_called_once()
+		mock_client.assert_called_once()
+
+
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	def test_store_information_skips_failed_fields(self, mock_client, mock_store):
+		"""
+		Tests that rows with fields that could not be extracted are never stored,
+		and that a rerun extracts them again.
+		"""
+		state = {'extracted_data': {'title': 'Mocked Title', 'abstract': ExtractionFailure('abstract', 'RateLimitError', "Rate limit reached")}}
+		self.assertEqual(self.flow.store_information(state), {'stored': False})
+		mock_store.assert_not_called()
+		self.assertEqual(self.flow.get_last_completed_node({'pdf_content': "Mocked PDF content", **state}), 'ingest_document')
+
+
+	def test_create_graph_nodes(self):
+		"""
+		Tests that nodes are correctly added to the graph.
+		"""
+		original_workflow = MagicMock()
+		modified_workflow = self.flow.create_graph_nodes(original_workflow)
+		modified_workflow.add_node.assert_any_call('ingest_document', self.flow.ingest_document)
+		modified_workflow.add_node.assert_any_call('extract_information', self.flow.extract_information)
+		modified_workflow.add_node.assert_any_call('store_information', self.flow.store_information)
+
+
+	def test_create_graph_edges(self):
+		"""
+		Tests that edges are correctly connected in the graph.
+		"""
+		original_workflow = MagicMock()
+		modified_workflow = self.flow.create_graph_edges(original_workflow)
+		modified_workflow.add_edge.assert_any_call(START, 'ingest_document')
+		modified_workflow.add_edge.assert_any_call('ingest_document', 'extract_information')
+		modified_workflow.add_edge.assert_any_call('extract_information', 'store_information')
+		modified_workflow.add_edge.assert_any_call('store_information', END)
+
+
+	@patch('src.text_processing_flow.DocumentIngestor.process_text', return_value="Mocked PDF content")
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=None)
+	@patch('src.data_storer.Client', autospec=True)
+	def test_full_workflow_execution(self, mock_client, mock_process, mock_extract, mock_store):
+		"""
+		Tests the full workflow execution.
+		"""
+		initial_state = {'pdf_content': "", 'extracted_data': {}}
+		config = {'configurable': {'thread_id': 'my_thread'}}
+		self.flow.workflow.invoke(input=initial_state, config=config)
+  
+		self.assertEqual(self.flow.workflow.get_state(config).values['pdf_content'], "Mocked PDF content")
+		self.assertIn('title', self.flow.workflow.get_state(config).values['extracted_data'])
+		self.assertEqual(self.flow.workflow.get_state(config).values['extracted_data']['title'], "Mocked Title")
+		mock_store.assert_called_once()
+		mock_client.assert_called_once()
+
+
+	@patch('src.text_processing_flow.DocumentIngestor.ingest', return_value={'pdf_content': "Mocked PDF content", 'sections': {}, 'metadata': {}})
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', side_effect=[Exception("Mocked storage error"), None])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_run_resumes_from_checkpoint(self, mock_openai, mock_client, mock_store, mock_extract, mock_ingest):
+		"""
+		Tests that a rerun with a persistent checkpoint only repeats the failed storage
+		and that documents already stored are skipped.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_path = os.path.join(temp_dir, 'paper.pdf')
+			with open(file_path, 'wb') as f:
+				f.write(b'%PDF-1.7 mocked')
+
+			flow_arguments = dict(
+				file_path=file_path,
+				openai_api_key=self.openai_api_key,
+				project_id=self.project_id,
+				dataset_id=self.dataset_id,
+				table_id=self.table_id,
+				checkpoint_path=os.path.join(temp_dir, 'checkpoints.sqlite')
+			)
+
+			# The first run fails when storing the data
+			flow = TextProcessingFlow(**flow_arguments)
+			self.assertFalse(flow.run()['stored'])
+			flow.close()
+			with self.assertRaises(sqlite3.ProgrammingError):
+				flow.checkpointer.conn.execute('SELECT 1')
+
+			# A new flow, as after a crash, resumes at the storage node
+			flow = TextProcessingFlow(**flow_arguments)
+			self.assertTrue(flow.run()['stored'])
+			mock_ingest.assert_called_once()
+			mock_extract.assert_called_once()
+			self.assertEqual(mock_store.call_count, 2)
+
+			# Only a checkpoint without the text of the stored document is left in the file
+			config = flow.get_config(file_path)
+			self.assertEqual(len(list(flow.checkpointer.list(config))), 1)
+			self.assertNotIn('pdf_content', flow.workflow.get_state(config).values)
+
+			# The document is already stored
+			flow.run()
+			self.assertEqual(flow.skipped_documents, 1)
+			self.assertEqual(mock_store.call_count, 2)
+
+			# Its data is stored again without its text once it is marked as not stored
+			mock_store.side_effect = None
+			mock_store.return_value = []
+			flow.mark_not_stored(config)
+			self.assertTrue(flow.run()['stored'])
+			self.assertEqual(mock_store.call_count, 3)
+			mock_ingest.assert_called_once()
+			flow.close()
+
+
+	@patch('src.text_processing_flow.DocumentIngestor.get_content_hash', return_value='hash')
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_finished_documents_are_released_from_memory(self, mock_openai, mock_client, mock_store, mock_extract, mock_hash):
+		"""
+		Tests that the in-memory checkpoints of a finished document are replaced by its state without
+		its text, which is still enough to skip it, and that a known content hash is not computed again.
+		"""
+		self.assertTrue(self.flow.run(pdf_content="Mocked PDF content")['stored'])
+		config = self.flow.get_config(self.file_path)
+		self.assertEqual(len(list(self.flow.checkpointer.list(config))), 1)
+		self.assertNotIn('pdf_content', self.flow.workflow.get_state(config).values)
+
+		self.flow.run(pdf_content="Mocked PDF content")
+		self.assertEqual(self.flow.skipped_documents, 1)
+		mock_store.assert_called_once()
+
+		mock_hash.reset_mock()
+		document = self.flow.start_document(self.file_path, content_hash='hash')
+		self.assertEqual(document['values']['extracted_data'], {'title': 'Mocked Title'})
+		mock_hash.assert_not_called()
+
+
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_near_duplicates_reuse_extracted_data(self, mock_openai, mock_client, mock_store, mock_extract):
+		"""
+		Tests that a near-duplicate of a stored paper reuses its extracted data without being extracted,
+		stored or indexed again, while a different paper goes through the whole workflow.
+		"""
+		flow = TextProcessingFlow(
+			file_path=self.file_path,
+			openai_api_key=self.openai_api_key,
+			project_id=self.project_id,
+			dataset_id=self.dataset_id,
+			table_id=self.table_id,
+			duplicate_detector=DuplicateDetector(':memory:'),
+			search_index=SearchIndex(':memory:')
+		)
+		words = [f"word{index % 997} term{index % 89}" for index in range(2000)]
+		preprint = " ".join(words)
+		camera_ready = " ".join(words[:1900] + ["revised"] * 20 + words[1920:])
+
+		self.assertTrue(flow.run(file_path='preprint.pdf', pdf_content=preprint)['stored'])
+		final_state = flow.run(file_path='camera_ready.pdf', pdf_content=camera_ready)
+		self.assertTrue(final_state['stored'])
+		self.assertEqual(final_state['duplicate_of'], os.path.abspath('preprint.pdf'))
+		self.assertEqual(flow.duplicate_detector.get_link(os.path.abspath('camera_ready.pdf'))[0], os.path.abspath('preprint.pdf'))
+		self.assertEqual(final_state['extracted_data'], {'title': 'Mocked Title'})
+		mock_extract.assert_called_once()
+		mock_store.assert_called_once()
+
+		flow.run(file_path='other.pdf', pdf_content=" ".join(reversed(words)))
+		self.assertEqual(mock_extract.call_count, 2)
+		self.assertEqual(flow.search_index.count(), 2)
+		self.assertEqual(flow.search_index.search("mocked title")[0]['title'], 'Mocked Title')
+
+
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data')
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_stored_papers_are_embedded(self, mock_openai, mock_client, mock_store, mock_extract):
+		"""
+		Tests that the title, abstract and summary of every paper stored are added to the embedding index,
+		and that papers rejected by the storer are not.
+		"""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			flow = TextProcessingFlow(
+				file_path=self.file_path,
+				openai_api_key=self.openai_api_key,
+				project_id=self.project_id,
+				dataset_id=self.dataset_id,
+				table_id=self.table_id,
+				embedding_index=EmbeddingIndex(temp_dir, dimensions=64)
+			)
+			mock_extract.return_value = {'title': 'Graph Networks', 'abstract': 'Message passing on molecules.', 'summary': 'Graphs.'}
+			self.assertTrue(flow.run(file_path='graphs.pdf', pdf_content="First document")['stored'])
+			mock_extract.return_value = {'title': 'Protein Folding', 'abstract': 'Transformers fold proteins.', 'summary': 'Proteins.'}
+			self.assertTrue(flow.run(file_path='proteins.pdf', pdf_content="Second document")['stored'])
+			mock_store.return_value = [{'row': {}, 'errors': [{'reason': 'invalid'}], 'key': 'rejected.pdf'}]
+			self.assertFalse(flow.run(file_path='rejected.pdf', pdf_content="Third document")['stored'])
+
+			self.assertEqual(flow.embedding_index.count(), 2)
+			vector = flow.embedder.embed(["Message passing graph networks"])[0]
+			self.assertEqual(flow.embedding_index.search(vector, k=1)[0][0], os.path.abspath('graphs.pdf'))
+			flow.embedding_index.close()
+
+
+	@patch('src.text_processing_flow.InformationExtractor.get_extracted_data', return_value={'title': 'Mocked Title'})
+	@patch('src.text_processing_flow.DataStorer.store_data', return_value=[])
+	@patch('src.data_storer.Client', autospec=True)
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_clients_are_reused_across_documents(self, mock_openai, mock_client, mock_store, mock_extract):
+		"""
+		Tests that the LLM, extractor and BigQuery clients are created once and reused for every document.
+		"""
+		for pdf_content in ("First document", "Second document"):
+			state = {'pdf_content': pdf_content, 'extracted_data': {}}
+			self.flow.extract_information(state)
+			self.flow.store_information(state)
+
+		mock_openai.assert_called_once()
+		mock_client.assert_called_once()
+		self.assertEqual(mock_store.call_count, 2)
+		self.assertEqual(self.flow.get_information_extractor().raw_text, "Second document")
+
+		# Other threads get their own extractor sharing the same LLM and chains
+		extractors = []
+		thread = threading.Thread(target=lambda: extractors.append(self.flow.get_information_extractor()))
+		thread.start()
+		thread.join()
+		self.assertIsNot(extractors[0], self.flow.get_information_extractor())
+		self.assertIs(extractors[0].llm, self.flow.get_information_extractor().llm)
+		mock_openai.assert_called_once()
+
+		prompt_template = extractors[0].get_prompt_template('title')
+		self.assertIs(extractors[0].get_chain(prompt_template), self.flow.get_information_extractor().get_chain(prompt_template))
+
+
+	@patch('src.text_processing_flow.InformationExtractor.aget_extracted_data')
+	@patch('src.information_extractor.OpenAI', autospec=True)
+	def test_async_extraction_reuses_one_event_loop(self, mock_openai, mock_aextract):
+		"""
+		Tests that concurrent extraction runs every document in the same long-lived event loop,
+		which close stops.
+		"""
+		loops = []
+
+		async def fake_aextract(max_concurrency):
+			loops.append(asyncio.get_running_loop())
+			return {'title': 'Mocked Title'}
+
+		mock_aextract.side_effect = fake_aextract
+		self.flow.extraction_concurrency = 4
+
+		for pdf_content in ("First document", "Second document"):
+			state = {'pdf_content': pdf_content, 'extracted_data': {}}
+			self.assertEqual(self.flow.extract_information(state)['extracted_data'], {'title': 'Mocked Title'})
+		thread = threading.Thread(target=lambda: self.flow.extract_information({'pdf_content': "Third document", 'extracted_data': {}}))
+		thread.start()
+		thread.join()
+
+		self.assertEqual(len(loops), 3)
+		self.assertTrue(all(loop is self.flow.event_loop for loop in loops))
+
+		self.flow.close()
+		self.assertTrue(loops[0].is_closed())
+		self.assertIsNone(self.flow.event_loop)
+
+
+if __name__ == '__main__':
+	unittest.main()